@@ -0,0 +1,48 @@
+"""add exchange rates history
+
+Revision ID: 5c3e9a7d2b41
+Revises: 1ed27c661017
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5c3e9a7d2b41"
+down_revision: Union[str, None] = "1ed27c661017"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "exchangerates_history",
+        sa.Column("base_currency_id", sa.Integer(), nullable=False),
+        sa.Column("target_currency_id", sa.Integer(), nullable=False),
+        sa.Column("rate", sa.Numeric(precision=12, scale=4), nullable=True),
+        sa.Column("effective_at", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["base_currency_id"], ["currencies.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["target_currency_id"], ["currencies.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_exchangerates_history_pair_effective_at",
+        "exchangerates_history",
+        ["base_currency_id", "target_currency_id", "effective_at"],
+    )
+    # время установки существующих курсов неизвестно, поэтому в истории они действуют с момента миграции
+    op.execute(
+        "INSERT INTO exchangerates_history (base_currency_id, target_currency_id, rate, effective_at) "
+        "SELECT base_currency_id, target_currency_id, rate, now() FROM exchangerates"
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_exchangerates_history_pair_effective_at", table_name="exchangerates_history")
+    op.drop_table("exchangerates_history")
@@ -0,0 +1,56 @@
+"""add exchange rates ohlc
+
+Revision ID: 8f1b6d0e4a27
+Revises: 5c3e9a7d2b41
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "8f1b6d0e4a27"
+down_revision: Union[str, None] = "5c3e9a7d2b41"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "exchangerates_ohlc",
+        sa.Column("base_currency_id", sa.Integer(), nullable=False),
+        sa.Column("target_currency_id", sa.Integer(), nullable=False),
+        sa.Column("interval", sa.String(length=6), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("open", sa.Numeric(precision=12, scale=4), nullable=False),
+        sa.Column("high", sa.Numeric(precision=12, scale=4), nullable=False),
+        sa.Column("low", sa.Numeric(precision=12, scale=4), nullable=False),
+        sa.Column("close", sa.Numeric(precision=12, scale=4), nullable=False),
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["base_currency_id"], ["currencies.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["target_currency_id"], ["currencies.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "base_currency_id", "target_currency_id", "interval", "bucket_start", name="unique_ohlc_bucket"
+        ),
+    )
+    # свечи по уже записанной истории курсов
+    for interval in ("minute", "hour", "day"):
+        op.execute(
+            "INSERT INTO exchangerates_ohlc "
+            "(base_currency_id, target_currency_id, interval, bucket_start, open, high, low, close) "
+            f"SELECT base_currency_id, target_currency_id, '{interval}', "
+            f"timezone('UTC', date_trunc('{interval}', timezone('UTC', effective_at))) AS bucket_start, "
+            "(array_agg(rate ORDER BY effective_at, id))[1], max(rate), min(rate), "
+            "(array_agg(rate ORDER BY effective_at DESC, id DESC))[1] "
+            "FROM exchangerates_history WHERE rate IS NOT NULL "
+            "GROUP BY base_currency_id, target_currency_id, bucket_start"
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("exchangerates_ohlc")
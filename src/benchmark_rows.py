@@ -0,0 +1,83 @@
+"""
+Консольная команда для замера чтения страницы обменных курсов из БД: объектами ORM ExchangeRate (как было)
+и строками только нужных столбцов (DaoExchangeRepository.find_all). В обоих случаях замеряется путь
+от запроса до списка ExchangeRateDTO: время на страницу и пик выделенной памяти (tracemalloc).
+Читаются курсы из БД, заданной настройками приложения (.env), в БД ничего не записывается.
+Запуск из корня проекта:
+python -m src.benchmark_rows
+python -m src.benchmark_rows --limit 1000 --repeat 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import select
+
+from src.dao import DaoCurrencyRepository, DaoExchangeRepository
+from src.dto import ErrorResponse
+from src.model import ExchangeRate, db_helper
+from src.service import ExchangeRateService
+
+
+async def read_entities(limit: int) -> list:
+    async with db_helper.session_factory() as session:
+        stmt = select(ExchangeRate).order_by(ExchangeRate.id).limit(limit)
+        exchange_rates = list((await session.execute(stmt)).scalars().all())
+        return await ExchangeRateService.get_exchange_rate_dto_list(
+            exchange_rates=exchange_rates,
+            dao_currency_obj=DaoCurrencyRepository(session=session),
+        )
+
+
+async def read_rows(limit: int) -> list:
+    async with db_helper.session_factory() as session:
+        exchange_rates = await DaoExchangeRepository(session=session).find_all(limit=limit)
+        if isinstance(exchange_rates, ErrorResponse):
+            raise SystemExit(exchange_rates.message)
+        return await ExchangeRateService.get_exchange_rate_dto_list(
+            exchange_rates=exchange_rates,
+            dao_currency_obj=DaoCurrencyRepository(session=session),
+        )
+
+
+async def measure(read, limit: int, repeat: int) -> tuple[float, float, int]:
+    """
+    Функция замеряет чтение страницы repeat раз
+    :return: кортеж (медиана времени в мс, лучшее время в мс, пик памяти в КиБ)
+    """
+    timings = []
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        await read(limit)
+        timings.append((time.perf_counter() - started_at) * 1000)
+
+    tracemalloc.start()
+    await read(limit)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), min(timings), peak // 1024
+
+
+async def main(limit: int, repeat: int) -> None:
+    page = await read_rows(limit)
+    if isinstance(page, ErrorResponse):
+        raise SystemExit(page.message)
+    if page != await read_entities(limit):
+        raise SystemExit("страницы, прочитанные объектами ORM и строками, различаются")
+
+    print(f"курсов на странице: {len(page)}, повторов: {repeat}")
+    print(f"{'чтение':<16}{'медиана, мс':>14}{'лучшее, мс':>14}{'пик памяти, КиБ':>18}")
+    for name, read in (("объекты ORM", read_entities), ("строки", read_rows)):
+        median, best, peak = await measure(read, limit, repeat)
+        print(f"{name:<16}{median:>14.2f}{best:>14.2f}{peak:>18}")
+    await db_helper.engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замер чтения обменных курсов объектами ORM и строками")
+    parser.add_argument("--limit", type=int, default=1000, help="число курсов на странице")
+    parser.add_argument("--repeat", type=int, default=50, help="число повторов")
+    args = parser.parse_args()
+    asyncio.run(main(limit=args.limit, repeat=args.repeat))
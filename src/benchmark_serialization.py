@@ -0,0 +1,131 @@
+"""
+Консольная команда для замера стоимости сериализации ответов с DTO в расчёте на один элемент списка.
+Сравнивает прежний путь (создание DTO с валидацией, jsonable_encoder FastAPI, JSONResponse)
+и текущий (DTO без валидации через model_construct, DTOResponse). БД не нужна, данные генерируются.
+Запуск из корня проекта:
+python -m src.benchmark_serialization
+python -m src.benchmark_serialization --items 10000 --repeat 5
+"""
+import argparse
+import decimal
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from src.controller.responses import DTOResponse
+from src.dto import CurrencyDTO, ExchangeRateDTO, ExchangeDTO
+
+
+def make_currencies(count: int) -> list[CurrencyDTO]:
+    """
+    Функция создаёт валюты, как их хранит справочник валют
+    :param count: число валют
+    :return: список объектов класса CurrencyDTO
+    """
+    return [
+        CurrencyDTO(currency_id=index, name=f"Currency {index}", code=f"C{index:02d}"[-3:], sign="¤")
+        for index in range(count)
+    ]
+
+
+def make_rows(count: int, currencies: list[CurrencyDTO]) -> list[tuple[int, CurrencyDTO, CurrencyDTO, decimal.Decimal]]:
+    """
+    Функция создаёт строки обменных курсов, как их возвращает БД
+    :param count: число курсов
+    :param currencies: список валют
+    :return: список кортежей (id, базовая валюта, целевая валюта, курс)
+    """
+    return [
+        (
+            index,
+            currencies[index % len(currencies)],
+            currencies[(index + 1) % len(currencies)],
+            decimal.Decimal(index % 10000 + 1).scaleb(-4),
+        )
+        for index in range(count)
+    ]
+
+
+def serialize_exchange_rates_before(rows: list) -> bytes:
+    dtos = [
+        ExchangeRateDTO(exchange_rate_id=row_id, base_currency=base, target_currency=target, rate=rate)
+        for row_id, base, target, rate in rows
+    ]
+    return JSONResponse(content=jsonable_encoder(dtos)).body
+
+
+def serialize_exchange_rates_after(rows: list) -> bytes:
+    dtos = [
+        ExchangeRateDTO.model_construct(
+            exchange_rate_id=row_id, base_currency=base, target_currency=target, rate=float(rate)
+        )
+        for row_id, base, target, rate in rows
+    ]
+    return DTOResponse(content=dtos).body
+
+
+def serialize_exchanges_before(rows: list) -> bytes:
+    dtos = [
+        ExchangeDTO(
+            base_currency=base, target_currency=target, rate=float(rate), amount=10, converted_amount=float(rate * 10)
+        )
+        for _, base, target, rate in rows
+    ]
+    return JSONResponse(content=jsonable_encoder(dtos)).body
+
+
+def serialize_exchanges_after(rows: list) -> bytes:
+    dtos = [
+        ExchangeDTO.model_construct(
+            base_currency=base, target_currency=target, rate=float(rate), amount=10, converted_amount=float(rate * 10)
+        )
+        for _, base, target, rate in rows
+    ]
+    return DTOResponse(content=dtos).body
+
+
+def serialize_currencies_before(currencies: list[CurrencyDTO]) -> bytes:
+    return JSONResponse(content=jsonable_encoder(currencies)).body
+
+
+def serialize_currencies_after(currencies: list[CurrencyDTO]) -> bytes:
+    return DTOResponse(content=currencies).body
+
+
+def measure(function, data, items: int, repeat: int) -> float:
+    """
+    Функция замеряет лучшее из repeat время вызова
+    :return: время на один элемент в микросекундах
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        function(data)
+        best = min(best, time.perf_counter() - started_at)
+    return best / items * 1_000_000
+
+
+def main(items: int, repeat: int) -> None:
+    currencies = make_currencies(min(items, 1000))
+    rows = make_rows(items, currencies)
+    cases = (
+        ("GET /currencies", serialize_currencies_before, serialize_currencies_after, currencies),
+        ("GET /exchangeRates", serialize_exchange_rates_before, serialize_exchange_rates_after, rows),
+        ("POST /exchange/batch", serialize_exchanges_before, serialize_exchanges_after, rows),
+    )
+    print(f"{'ответ':<24}{'до, мкс':>12}{'после, мкс':>14}{'ускорение':>12}")
+    for name, before, after, data in cases:
+        if before(data) != after(data):
+            raise SystemExit(f"{name}: ответы до и после различаются")
+        before_cost = measure(before, data, len(data), repeat)
+        after_cost = measure(after, data, len(data), repeat)
+        print(f"{name:<24}{before_cost:>12.2f}{after_cost:>14.2f}{before_cost / after_cost:>11.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замер стоимости сериализации ответов с DTO")
+    parser.add_argument("--items", type=int, default=1000, help="число элементов в ответе")
+    parser.add_argument("--repeat", type=int, default=10, help="число повторов, берётся лучший")
+    args = parser.parse_args()
+    main(items=args.items, repeat=args.repeat)
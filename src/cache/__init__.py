@@ -0,0 +1,74 @@
+__all__ = (
+    "RateGraph",
+    "RatePath",
+    "RateMatrix",
+    "QuoteCache",
+    "CurrencyRegistry",
+    "SharedRateTable",
+    "CacheBackend",
+    "MemoryCacheBackend",
+    "RespCacheBackend",
+    "DataVersion",
+    "RenderedPage",
+    "RenderedPageCache",
+    "RateBroadcaster",
+    "RateSubscription",
+    "RateEvent",
+    "ChangeNotifier",
+    "NotificationTransport",
+    "PostgresNotifyTransport",
+    "InProcessBus",
+    "InProcessTransport",
+    "rate_graph",
+    "rate_matrix",
+    "quote_cache",
+    "currency_registry",
+    "shared_rate_table",
+    "change_notifier",
+    "cache_backend",
+    "data_version",
+    "rendered_pages",
+    "rate_broadcaster",
+    "currency_key",
+    "exchange_rate_key",
+    "quote_at_key",
+    "quote_at_version_key",
+    "events",
+)
+
+
+from src.cache.rate_graph import RateGraph
+from src.cache.rate_graph import RatePath
+from src.cache.rate_graph import rate_graph
+from src.cache.rate_matrix import RateMatrix
+from src.cache.rate_matrix import rate_matrix
+from src.cache.quote_cache import QuoteCache
+from src.cache.quote_cache import quote_cache
+from src.cache.currency_registry import CurrencyRegistry
+from src.cache.currency_registry import currency_registry
+from src.cache.shared_rate_table import SharedRateTable
+from src.cache.shared_rate_table import shared_rate_table
+from src.cache.backend import CacheBackend
+from src.cache.backend import MemoryCacheBackend
+from src.cache.backend import RespCacheBackend
+from src.cache.backend import cache_backend
+from src.cache.backend import currency_key
+from src.cache.backend import exchange_rate_key
+from src.cache.backend import quote_at_key
+from src.cache.backend import quote_at_version_key
+from src.cache.data_version import DataVersion
+from src.cache.data_version import data_version
+from src.cache.rendered_pages import RenderedPage
+from src.cache.rendered_pages import RenderedPageCache
+from src.cache.rendered_pages import rendered_pages
+from src.cache.rate_broadcaster import RateBroadcaster
+from src.cache.rate_broadcaster import RateSubscription
+from src.cache.rate_broadcaster import RateEvent
+from src.cache.rate_broadcaster import rate_broadcaster
+from src.cache.notifications import ChangeNotifier
+from src.cache.notifications import NotificationTransport
+from src.cache.notifications import PostgresNotifyTransport
+from src.cache.notifications import InProcessBus
+from src.cache.notifications import InProcessTransport
+from src.cache.notifications import change_notifier
+from src.cache import events
@@ -0,0 +1,554 @@
+import abc
+import asyncio
+import datetime
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable
+from urllib.parse import urlsplit, unquote
+
+from src.model import settings
+
+
+_FAILED = object()
+
+
+class CacheBackend(abc.ABC):
+    """
+    Кэш значений (bytes) по строковым ключам, общий для путей чтения валют, обменных курсов и расчётов конвертации.
+    Реализации: MemoryCacheBackend (в памяти процесса, LRU и время жизни) и RespCacheBackend (сервер
+    с протоколом Redis, общий для нескольких серверов приложения). Выбирается настройкой cache_backend.
+
+    Кэш не обязателен для работы: если он недоступен, чтение возвращает промах, а запись не выполняется.
+    Методы get_or_load и get_many_or_load защищают от одновременной загрузки одного ключа (cache stampede):
+    пока значение загружается, остальные запросы этого ключа в процессе ждут результата этой загрузки
+    """
+
+    # True - записи кэша общие для всех процессов и серверов приложения, и изменивший данные узел сам удаляет их;
+    # False - кэш в памяти процесса, его записи удаляются изменениями других процессов только через уведомления
+    shared = False
+
+    def __init__(self, ttl: float):
+        """
+        :param ttl: время жизни записи по умолчанию в секундах
+        """
+        self.ttl = ttl
+        self._loading: dict[str, asyncio.Future] = {}
+        self._deleted_while_loading: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.shared_loads = 0
+        self.errors = 0
+
+    @abc.abstractmethod
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        """
+        Метод читает значения нескольких ключей за одно обращение
+        :param keys: список ключей
+        :return: список значений в порядке ключей, None - ключа нет в кэше
+        """
+
+    @abc.abstractmethod
+    async def set_many(self, items: dict[str, bytes], ttl: float | None = None) -> None:
+        """
+        Метод записывает несколько значений за одно обращение
+        :param items: словарь {ключ: значение}
+        :param ttl: время жизни записей в секундах, None - время жизни по умолчанию
+        :return: None
+        """
+
+    def delete(self, keys: Iterable[str]) -> None:
+        """
+        Метод удаляет ключи из кэша. Вызывается из src.cache.events после commit изменений,
+        поэтому синхронный: удаление гарантированно выполняется раньше следующего чтения из кэша в этом процессе.
+        Значения ключей, которые в этот момент загружаются, могли быть прочитаны до изменения, поэтому в кэш
+        они не записываются
+        :param keys: ключи
+        :return: None
+        """
+        keys = list(keys)
+        self._deleted_while_loading.update(key for key in keys if key in self._loading)
+        self._delete(keys)
+
+    @abc.abstractmethod
+    def _delete(self, keys: list[str]) -> None:
+        """
+        Метод удаляет ключи из хранилища кэша
+        :param keys: ключи
+        :return: None
+        """
+
+    def clear(self) -> None:
+        """
+        Метод удаляет все записи кэша этого процесса. Общий кэш на сервере не очищается: его записи
+        удаляет сам изменивший данные узел, поэтому пропущенные уведомления на него не влияют
+        """
+
+    async def close(self) -> None:
+        """
+        Метод освобождает ресурсы кэша
+        """
+
+    def stats(self) -> dict:
+        """
+        Метод возвращает счётчики кэша
+        :return: словарь со счётчиками
+        """
+        return {
+            "backend": type(self).__name__,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "sharedLoads": self.shared_loads,
+            "errors": self.errors,
+        }
+
+    async def get(self, key: str) -> bytes | None:
+        """
+        :param key: ключ
+        :return: значение или None, если ключа нет в кэше
+        """
+        return (await self.get_many([key]))[0]
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[bytes | None]],
+        ttl: float | None = None,
+    ) -> bytes | None:
+        """
+        Метод возвращает значение из кэша, а при промахе загружает его и записывает в кэш
+        :param key: ключ
+        :param loader: асинхронная функция загрузки значения; None - значение не кэшируется (например, ошибка БД)
+        :param ttl: время жизни записи в секундах, None - время жизни по умолчанию
+        :return: значение или None, если загрузка его не вернула
+        """
+        values = await self.get_many_or_load(
+            [key], lambda missing_keys: self._load_one(missing_keys[0], loader), ttl=ttl
+        )
+        return values[0]
+
+    async def get_many_or_load(
+        self,
+        keys: list[str],
+        loader: Callable[[list[str]], Awaitable[dict[str, bytes]]],
+        ttl: float | None = None,
+    ) -> list[bytes | None]:
+        """
+        Метод читает значения нескольких ключей одним обращением к кэшу, а отсутствующие загружает
+        одним вызовом loader и записывает в кэш одним обращением. Ключи, которые уже загружаются
+        другим запросом в этом процессе, не загружаются повторно
+        :param keys: список ключей
+        :param loader: асинхронная функция, которая по списку ключей возвращает словарь {ключ: значение};
+        ключей, которых нет в словаре, не кэшируются
+        :param ttl: время жизни записей в секундах, None - время жизни по умолчанию
+        :return: список значений в порядке ключей, None - значение не загружено
+        """
+        found, generations = await self._get_many_versioned(keys)
+        values = dict(zip(keys, found))
+        generations = dict(zip(keys, generations))
+        missing_keys = [key for key, value in values.items() if value is None]
+        self.hits += len(keys) - len(missing_keys)
+        self.misses += len(missing_keys)
+        if not missing_keys:
+            return [values[key] for key in keys]
+
+        waiting = {key: self._loading[key] for key in missing_keys if key in self._loading}
+        to_load = [key for key in missing_keys if key not in waiting]
+        if to_load:
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key in to_load}
+            self._loading.update(futures)
+            self.loads += len(to_load)
+            loaded = {}
+            try:
+                loaded = await loader(to_load)
+            finally:
+                for key, future in futures.items():
+                    self._loading.pop(key, None)
+                    # при ошибке загрузки ожидающие запросы загружают значение сами
+                    future.set_result(loaded.get(key, _FAILED) if loaded else _FAILED)
+            values.update((key, loaded.get(key)) for key in to_load)
+            items = {key: value for key, value in loaded.items() if key not in self._deleted_while_loading}
+            self._deleted_while_loading.difference_update(to_load)
+            if items:
+                await self._set_many_versioned(items, generations, ttl=ttl)
+
+        if waiting:
+            self.shared_loads += len(waiting)
+            failed_keys = []
+            for key, future in waiting.items():
+                values[key] = await future
+                if values[key] is _FAILED:
+                    failed_keys.append(key)
+            if failed_keys:
+                values.update(zip(failed_keys, await self.get_many_or_load(failed_keys, loader, ttl=ttl)))
+        return [values[key] for key in keys]
+
+    async def _get_many_versioned(self, keys: list[str]) -> tuple[list[bytes | None], list[bytes | None]]:
+        """
+        Метод читает значения вместе с поколениями ключей (см. RespCacheBackend). Поколение, прочитанное
+        до загрузки значения, передаётся в _set_many_versioned при его записи. Кэшу в памяти процесса
+        поколения не нужны: удаление во время загрузки отслеживается в delete
+        :param keys: список ключей
+        :return: кортеж (список значений, список поколений) в порядке ключей
+        """
+        return await self.get_many(keys), [None] * len(keys)
+
+    async def _set_many_versioned(
+        self,
+        items: dict[str, bytes],
+        generations: dict[str, bytes | None],
+        ttl: float | None = None,
+    ) -> None:
+        """
+        Метод записывает загруженные значения с поколениями ключей, прочитанными до загрузки
+        :param items: словарь {ключ: значение}
+        :param generations: словарь {ключ: поколение}
+        :param ttl: время жизни записей в секундах, None - время жизни по умолчанию
+        :return: None
+        """
+        await self.set_many(items, ttl=ttl)
+
+    @staticmethod
+    async def _load_one(key: str, loader: Callable[[], Awaitable[bytes | None]]) -> dict[str, bytes]:
+        """
+        Метод приводит функцию загрузки одного значения к виду loader для get_many_or_load
+        """
+        value = await loader()
+        return {} if value is None else {key: value}
+
+
+class MemoryCacheBackend(CacheBackend):
+    """
+    Кэш в памяти процесса: ограниченный по размеру, вытеснение по LRU и по времени жизни записи.
+    Подходит для одного сервера; на нескольких серверах записи сбрасываются уведомлениями (src.cache.notifications)
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        """
+        :param max_size: максимальное число записей
+        :param ttl: время жизни записи по умолчанию в секундах
+        """
+        super().__init__(ttl=ttl)
+        self.max_size = max_size
+        self._entries: OrderedDict[str, tuple[bytes, float]] = OrderedDict()
+        self.evictions = 0
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        now = time.monotonic()
+        values = []
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] <= now:
+                del self._entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                values.append(None)
+            else:
+                self._entries.move_to_end(key)
+                values.append(entry[0])
+        return values
+
+    async def set_many(self, items: dict[str, bytes], ttl: float | None = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        for key, value in items.items():
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _delete(self, keys: list[str]) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "size": len(self._entries), "maxSize": self.max_size, "evictions": self.evictions}
+
+
+class RespError(Exception):
+    """
+    Ошибка, которую вернул сервер кэша
+    """
+
+
+class RespCacheBackend(CacheBackend):
+    """
+    Кэш на сервере с протоколом Redis (RESP): Redis, Valkey, KeyDB и т.п. Общий для всех серверов приложения.
+    Клиент держит одно соединение на процесс; команды одного обращения отправляются пачкой (pipelining),
+    пакетное чтение - одной командой MGET. Удаления из delete() копятся и отправляются первыми
+    в следующей пачке команд, а также отдельной фоновой задачей, поэтому следующее чтение из этого процесса
+    не вернёт удалённое значение. При ошибке соединения оно закрывается и открывается заново при следующем обращении.
+
+    Загрузка значения на другом сервере могла начаться до изменения данных и закончиться после удаления ключа -
+    тогда она записала бы в кэш старое значение. Поэтому у каждого ключа есть поколение (ключ generation:...
+    без времени жизни): удаление увеличивает его командой INCR, значение записывается вместе с поколением,
+    прочитанным до загрузки, а при чтении значение другого поколения считается промахом
+    """
+
+    shared = True
+
+    def __init__(self, url: str, ttl: float, key_prefix: str = "", timeout: float = 1.0):
+        """
+        :param url: адрес сервера вида redis://[:пароль@]хост[:порт][/номер БД]
+        :param ttl: время жизни записи по умолчанию в секундах
+        :param key_prefix: префикс всех ключей на сервере
+        :param timeout: сколько секунд ждать подключения и ответа сервера
+        """
+        super().__init__(ttl=ttl)
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.username = unquote(parts.username) if parts.username else None
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.lstrip("/") or 0)
+        self.key_prefix = key_prefix
+        self.timeout = timeout
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._lock = asyncio.Lock()
+        self._pending_deletes: set[str] = set()
+        self._flush_task: asyncio.Task | None = None
+
+    async def get_many(self, keys: list[str]) -> list[bytes | None]:
+        return (await self._get_many_versioned(keys))[0]
+
+    async def set_many(self, items: dict[str, bytes], ttl: float | None = None) -> None:
+        # без прочитанного поколения значение считается записанным до первого удаления ключа
+        await self._set_many_versioned(items, {}, ttl=ttl)
+
+    async def _get_many_versioned(self, keys: list[str]) -> tuple[list[bytes | None], list[bytes | None]]:
+        try:
+            replies = await self.execute([
+                (b"MGET", *(self.key_prefix + key for key in keys), *map(self._generation_key, keys))
+            ])
+        except (ConnectionError, RespError):
+            return [None] * len(keys), [None] * len(keys)
+        generations = [generation or b"0" for generation in replies[0][len(keys):]]
+        values = []
+        for value, generation in zip(replies[0][:len(keys)], generations):
+            if value is not None:
+                value_generation, _, value = value.partition(b":")
+                if value_generation != generation:
+                    value = None
+            values.append(value)
+        return values, generations
+
+    async def _set_many_versioned(
+        self,
+        items: dict[str, bytes],
+        generations: dict[str, bytes | None],
+        ttl: float | None = None,
+    ) -> None:
+        milliseconds = max(int((self.ttl if ttl is None else ttl) * 1000), 1)
+        try:
+            await self.execute([
+                (b"SET", self.key_prefix + key, (generations.get(key) or b"0") + b":" + value, b"PX", milliseconds)
+                for key, value in items.items()
+            ])
+        except (ConnectionError, RespError):
+            pass
+
+    def _generation_key(self, key: str) -> str:
+        """
+        :param key: ключ
+        :return: ключ поколения на сервере кэша
+        """
+        return f"{self.key_prefix}generation:{key}"
+
+    def _delete(self, keys: list[str]) -> None:
+        self._pending_deletes.update(keys)
+        if self._pending_deletes and (self._flush_task is None or self._flush_task.done()):
+            try:
+                self._flush_task = asyncio.get_running_loop().create_task(self._flush())
+            except RuntimeError:
+                pass    # нет цикла событий - удаления отправятся со следующей пачкой команд
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        self._disconnect()
+
+    async def execute(self, commands: list[tuple]) -> list:
+        """
+        Метод отправляет пачку команд одним пакетом и читает ответы на них
+        :param commands: список команд, каждая - кортеж из имени команды и аргументов (bytes, str или int)
+        :return: список ответов в порядке команд; ответ с ошибкой - объект RespError
+        """
+        async with self._lock:
+            deletes = sorted(self._pending_deletes)
+            self._pending_deletes.clear()
+            if deletes:
+                commands = [
+                    (b"DEL", *(self.key_prefix + key for key in deletes)),
+                    *((b"INCR", self._generation_key(key)) for key in deletes),
+                    *commands,
+                ]
+            try:
+                if self._writer is None:
+                    await self._connect()
+                replies = await asyncio.wait_for(self._roundtrip(commands), timeout=self.timeout)
+            except (OSError, EOFError, asyncio.TimeoutError, asyncio.IncompleteReadError, RespError) as exc:
+                # удаления не должны потеряться, иначе в кэше останется устаревшее значение
+                self._pending_deletes.update(deletes)
+                self._disconnect()
+                self.errors += 1
+                raise ConnectionError(str(exc)) from exc
+            except BaseException:
+                # отмена задачи: в соединении могут остаться непрочитанные ответы, которые следующая пачка команд
+                # приняла бы за свои, поэтому оно закрывается
+                self._pending_deletes.update(deletes)
+                self._disconnect()
+                raise
+
+        if deletes:
+            replies = replies[len(deletes) + 1:]
+        for reply in replies:
+            if isinstance(reply, RespError):
+                self.errors += 1
+                raise reply
+        return replies
+
+    async def _flush(self) -> None:
+        """
+        Фоновая отправка накопленных удалений
+        """
+        try:
+            await self.execute([])
+        except (ConnectionError, RespError):
+            pass
+
+    async def _connect(self) -> None:
+        """
+        Метод открывает соединение и выполняет AUTH и SELECT, если они нужны
+        """
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), timeout=self.timeout
+        )
+        commands = []
+        if self.password is not None:
+            commands.append((b"AUTH", self.username, self.password) if self.username else (b"AUTH", self.password))
+        if self.db:
+            commands.append((b"SELECT", self.db))
+        if commands:
+            for reply in await asyncio.wait_for(self._roundtrip(commands), timeout=self.timeout):
+                if isinstance(reply, RespError):
+                    raise reply
+
+    def _disconnect(self) -> None:
+        """
+        Метод закрывает соединение
+        """
+        if self._writer is not None:
+            self._writer.close()
+        self._reader, self._writer = None, None
+
+    async def _roundtrip(self, commands: list[tuple]) -> list:
+        """
+        Метод записывает команды в соединение одним пакетом и читает столько же ответов
+        """
+        if not commands:
+            return []
+        self._writer.write(b"".join(self._encode(command) for command in commands))
+        await self._writer.drain()
+        return [await self._read_reply() for _ in commands]
+
+    @staticmethod
+    def _encode(command: tuple) -> bytes:
+        """
+        Метод кодирует команду в формат RESP (массив bulk-строк)
+        """
+        parts = [b"*%d\r\n" % len(command)]
+        for argument in command:
+            if isinstance(argument, str):
+                argument = argument.encode()
+            elif isinstance(argument, int):
+                argument = str(argument).encode()
+            parts.append(b"$%d\r\n%b\r\n" % (len(argument), argument))
+        return b"".join(parts)
+
+    async def _read_reply(self):
+        """
+        Метод читает один ответ сервера
+        :return: str для простой строки, int, bytes или None для bulk-строки, list для массива, RespError для ошибки
+        """
+        line = await self._reader.readuntil(b"\r\n")
+        prefix, body = line[:1], line[1:-2]
+        if prefix == b"+":
+            return body.decode()
+        if prefix == b"-":
+            return RespError(body.decode(errors="replace"))
+        if prefix == b":":
+            return int(body)
+        if prefix == b"$":
+            length = int(body)
+            if length < 0:
+                return None
+            return (await self._reader.readexactly(length + 2))[:-2]
+        if prefix == b"*":
+            length = int(body)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+        raise RespError(f"Неизвестный ответ сервера кэша: {line!r}")
+
+
+def currency_key(code: str) -> str:
+    """
+    :param code: код валюты
+    :return: ключ кэша валюты
+    """
+    return f"currency:{code}"
+
+
+def exchange_rate_key(base_currency_code: str, target_currency_code: str) -> str:
+    """
+    :param base_currency_code: код базовой валюты
+    :param target_currency_code: код целевой валюты
+    :return: ключ кэша обменного курса
+    """
+    return f"exchange_rate:{base_currency_code}{target_currency_code}"
+
+
+def quote_at_key(currency_from: str, currency_to: str, at: datetime.datetime, version: str) -> str:
+    """
+    :param currency_from: из какой валюты перевод
+    :param currency_to: в какую валюту перевод
+    :param at: момент времени с часовым поясом
+    :param version: версия расчётов на момент времени - значение ключа quote_at_version_key()
+    :return: ключ кэша пути конвертации на момент времени
+    """
+    return f"quote_at:{version}:{currency_from}{currency_to}:{at.astimezone(datetime.timezone.utc).isoformat()}"
+
+
+def quote_at_version_key() -> str:
+    """
+    Ключ версии расчётов на момент времени. История курсов не меняется, кроме каскадного удаления вместе с валютой,
+    поэтому удаление валюты удаляет этот ключ: следующее обращение создаёт новую версию, и все записи quote_at
+    (в том числе пути через удалённую валюту) становятся промахом
+    :return: ключ кэша версии расчётов на момент времени
+    """
+    return "quote_at_version"
+
+
+def _get_backend() -> CacheBackend:
+    """
+    :return: кэш по настройке cache_backend
+    """
+    if settings.cache_backend == "redis":
+        return RespCacheBackend(
+            url=settings.cache_redis_url,
+            ttl=settings.cache_ttl,
+            key_prefix=settings.cache_key_prefix,
+            timeout=settings.cache_timeout,
+        )
+    return MemoryCacheBackend(max_size=settings.cache_max_size, ttl=settings.cache_ttl)
+
+
+cache_backend = _get_backend()
@@ -0,0 +1,207 @@
+import asyncio
+import time
+from bisect import bisect_right
+
+from src.cache.shared_rate_table import SharedRateTable, shared_rate_table
+from src.dto import CurrencyDTO, ErrorResponse
+from src.model import settings
+
+
+class CurrencyRegistry:
+    """
+    Справочник валют, который хранится в памяти процесса: код валюты -> id -> готовый неизменяемый CurrencyDTO.
+    Загружается из БД одним запросом при старте приложения, после чего DAO отвечают на запросы чтения
+    валют без обращения к БД. Методы DAO, добавляющие и удаляющие валюты, обновляют справочник сразу после commit.
+    Через ttl секунд справочник перечитывается, чтобы увидеть изменения, сделанные другими процессами.
+    Если используется общая для воркеров таблица shared_table, справочник строится из неё, а из БД читается,
+    только если раздел валют в ней пуст или загружен из БД больше ttl секунд назад. Изменения таблицы,
+    сделанные другими воркерами, применяются к справочнику по одному из её журнала изменений
+    """
+
+    def __init__(self, ttl: float, shared_table: SharedRateTable | None = None):
+        """
+        :param ttl: через сколько секунд справочник считается устаревшим и перечитывается из БД
+        :param shared_table: общая для воркеров таблица валют и курсов или None
+        """
+        self.ttl = ttl
+        self._shared_table = shared_table
+        self._shared_version = 0
+        self._reload_from_db = False
+        self._by_code: dict[str, CurrencyDTO] = {}
+        self._by_id: dict[int, CurrencyDTO] = {}
+        self._all: list[CurrencyDTO] | None = None
+        self._ids: list[int] = []
+        self._loaded_at: float | None = None
+        self._version = 0
+        self._lock = asyncio.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        """
+        True, если справочник ещё не загружен, был сброшен, устарел по времени или изменилась общая таблица
+        """
+        if self._shared_table is not None and self._shared_table.version() != self._shared_version:
+            return True
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    async def ensure_loaded(self, dao_currency_obj) -> ErrorResponse | None:
+        """
+        Метод загружает справочник из БД, если он устарел. Одновременные запросы ждут одну загрузку
+        :param dao_currency_obj: объект класса DaoCurrencyRepository
+        :return: None или ErrorResponse, если справочник не удалось загрузить
+        """
+        if not self.is_stale:
+            return None
+
+        async with self._lock:
+            if not self.is_stale:
+                return None
+
+            if self._load_shared():
+                return None
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at <= self.ttl:
+                # общая таблица изменилась, но раздел валют в ней пуст или не поместился - свои данные ещё свежие
+                self._shared_version = self._shared_table.version()
+                return None
+
+            version = self._version
+            rows = await dao_currency_obj.find_all_rows()
+            if isinstance(rows, ErrorResponse):
+                return rows
+
+            self._by_code = {}
+            self._by_id = {}
+            for currency_id, code, full_name, sign in rows:
+                self._put(CurrencyDTO.model_construct(currency_id=currency_id, name=full_name, code=code, sign=sign))
+            # если во время загрузки справочник менялся, то загруженные данные могли устареть - перечитаем их в следующий раз
+            self._loaded_at = time.monotonic() if version == self._version else None
+            self._version += 1
+            self._reload_from_db = False
+            if self._shared_table is not None:
+                # другие воркеры построят справочник из общей таблицы, этот - тоже, при следующем обращении
+                self._shared_table.publish_currencies(list(self._by_id.values()))
+            return None
+
+    def _load_shared(self) -> bool:
+        """
+        Метод применяет к справочнику изменения общей для воркеров таблицы или, если это невозможно,
+        строит справочник из неё заново, если раздел валют в ней не устарел
+        :return: True, если справочник обновлён
+        """
+        if self._shared_table is None or self._reload_from_db:
+            return False
+        if self._apply_shared_changes():
+            return True
+        snapshot = self._shared_table.read()
+        if (snapshot is None or not snapshot.currencies_loaded_at
+                or time.time() - snapshot.currencies_loaded_at > self.ttl):
+            return False
+
+        self._by_code = {}
+        self._by_id = {}
+        for currency in snapshot.currencies:
+            self._put(currency)
+        # возраст справочника считается от загрузки раздела из БД, а не от чтения общей таблицы
+        self._loaded_at = time.monotonic() - max(time.time() - snapshot.currencies_loaded_at, 0.0)
+        self._shared_version = snapshot.version
+        self._version += 1
+        return True
+
+    def _apply_shared_changes(self) -> bool:
+        """
+        Метод применяет к справочнику изменения валют из общей таблицы после версии, из которой он построен.
+        Свои изменения воркер уже применил, поэтому валюта, которая в справочнике уже такая же, пропускается
+        :return: True, если все изменения применены
+        """
+        if not self._shared_version or self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            return False
+        changes = self._shared_table.changes_since(self._shared_version)
+        if changes is None:
+            return False
+
+        for change in changes:
+            if change.kind == "currency" and self._by_id.get(change.currency_id) != change.currency:
+                self.add(change.currency)
+            elif change.kind == "currency_removed" and change.currency_id in self._by_id:
+                self.remove(self._by_id[change.currency_id].code)
+            self._shared_version = change.version
+        return True
+
+    def invalidate(self) -> None:
+        """
+        Метод помечает справочник устаревшим, при следующем обращении он будет перечитан из БД
+        (а не из общей для воркеров таблицы)
+        """
+        self._loaded_at = None
+        self._reload_from_db = True
+
+    def get_by_code(self, code: str) -> CurrencyDTO | None:
+        """
+        :param code: код валюты
+        :return: объект класса CurrencyDTO или None, если валюты нет в справочнике
+        """
+        return self._by_code.get(code)
+
+    def get_by_id(self, currency_id: int) -> CurrencyDTO | None:
+        """
+        :param currency_id: айди валюты
+        :return: объект класса CurrencyDTO или None, если валюты нет в справочнике
+        """
+        return self._by_id.get(currency_id)
+
+    def all(self) -> list[CurrencyDTO]:
+        """
+        Метод возвращает все валюты справочника, отсортированные по id. Список строится один раз после изменения
+        :return: список объектов класса CurrencyDTO
+        """
+        if self._all is None:
+            self._ids = sorted(self._by_id)
+            self._all = [self._by_id[currency_id] for currency_id in self._ids]
+        return self._all
+
+    def page(self, limit: int | None, after_id: int | None = None) -> list[CurrencyDTO]:
+        """
+        Метод возвращает страницу валют, отсортированных по id (пагинация по ключу)
+        :param limit: размер страницы или None - все валюты после after_id
+        :param after_id: айди последней валюты предыдущей страницы или None для первой страницы
+        :return: список объектов класса CurrencyDTO, не больше limit
+        """
+        currencies = self.all()
+        start = 0 if after_id is None else bisect_right(self._ids, after_id)
+        if limit is None:
+            return currencies[start:]
+        return currencies[start:start + limit]
+
+    def add(self, currency: CurrencyDTO) -> None:
+        """
+        Метод добавляет валюту в справочник
+        :param currency: объект класса CurrencyDTO
+        :return: None
+        """
+        self._put(currency)
+        self._version += 1
+
+    def remove(self, code: str) -> None:
+        """
+        Метод удаляет валюту из справочника
+        :param code: код валюты
+        :return: None
+        """
+        currency = self._by_code.pop(code, None)
+        if currency is not None:
+            self._by_id.pop(currency.currency_id, None)
+            self._all = None
+        self._version += 1
+
+    def _put(self, currency: CurrencyDTO) -> None:
+        """
+        Метод записывает валюту в индексы по коду и по id
+        :param currency: объект класса CurrencyDTO
+        :return: None
+        """
+        self._by_code[currency.code] = currency
+        self._by_id[currency.currency_id] = currency
+        self._all = None
+
+
+currency_registry = CurrencyRegistry(ttl=settings.currency_registry_ttl, shared_table=shared_rate_table)
@@ -0,0 +1,70 @@
+import time
+import uuid
+
+from src.cache.notifications import ChangeNotifier, change_notifier
+from src.cache.shared_rate_table import SharedRateTable, shared_rate_table
+from src.model import settings
+
+
+class DataVersion:
+    """
+    Номер версии данных валют и обменных курсов, из которого строится ETag ответов GET.
+    Увеличивается функциями src.cache.events, то есть после каждого изменения, сделанного методами DAO
+    этого процесса, и после каждого изменения, полученного от другого узла (src.cache.notifications).
+    Изменения других воркеров этого сервера учитываются через номер версии общей таблицы shared_table.
+    Эпоха - случайная строка, разная у каждого процесса, поэтому ETag после перезапуска процесса не совпадёт
+    со старым при том же номере.
+
+    Номер версии в памяти процесса отражает изменения других процессов, только если включена общая таблица
+    или уведомления, поэтому без них ETag не выдаётся. Изменения, сделанные в обход приложения (скриптом
+    или запросом к БД), номер версии не меняют, поэтому в ETag входит и номер периода длиной max_age секунд:
+    ETag сменяется не реже чем раз в max_age секунд, и такие изменения видны не позже, чем через max_age
+    """
+
+    def __init__(
+        self,
+        shared_table: SharedRateTable | None = None,
+        notifier: ChangeNotifier | None = None,
+        max_age: float = 60.0,
+    ):
+        """
+        :param shared_table: общая для воркеров таблица валют и курсов или None
+        :param notifier: уведомления об изменениях между узлами или None
+        :param max_age: сколько секунд ETag остаётся действительным без изменений данных
+        """
+        self.epoch = uuid.uuid4().hex[:12]
+        self.counter = 0
+        self.max_age = max_age
+        self._shared_table = shared_table
+        self._notifier = notifier
+
+    @property
+    def enabled(self) -> bool:
+        """
+        True, если изменения других процессов меняют номер версии: используется общая таблица
+        или уведомления подключены (пока соединения нет, ETag не выдаётся)
+        """
+        return ((self._shared_table is not None and self._shared_table.enabled)
+                or (self._notifier is not None and self._notifier.enabled))
+
+    def bump(self) -> None:
+        """
+        Метод увеличивает номер версии. Вызывается после каждого изменения данных
+        :return: None
+        """
+        self.counter += 1
+
+    def etag(self) -> str | None:
+        """
+        Метод возвращает сильный ETag текущей версии данных. Значение вычисляется без обращения к БД
+        :return: ETag в кавычках, как в заголовке ответа, или None, если ETag не выдаётся (см. enabled)
+        """
+        if not self.enabled:
+            return None
+        shared_version = self._shared_table.version() if self._shared_table is not None else 0
+        # номер периода по time.time() одинаков у всех процессов сервера
+        period = int(time.time() // self.max_age)
+        return f'"{self.epoch}.{self.counter}.{shared_version}.{period}"'
+
+
+data_version = DataVersion(shared_table=shared_rate_table, notifier=change_notifier, max_age=settings.cache_ttl)
@@ -0,0 +1,232 @@
+"""
+Здесь описаны функции, которые DAO вызывает после успешного commit изменений в валютах и обменных курсах.
+Они поддерживают в актуальном состоянии всё, что хранится в памяти процесса:
+справочник валют, граф обменных курсов и кэш курсов, общую для воркеров таблицу в разделяемой памяти
+и кэш чтения cache_backend, а также увеличивают номер версии данных для ETag
+и рассылают изменения обменных курсов подписчикам (src.cache.rate_broadcaster).
+Каждое изменение рассылается другим узлам (src.cache.notifications), которые применяют его через apply_notification
+"""
+from decimal import Decimal
+
+from src.cache.backend import cache_backend, currency_key, exchange_rate_key, quote_at_version_key
+from src.cache.currency_registry import currency_registry
+from src.cache.data_version import data_version
+from src.cache.notifications import change_notifier
+from src.cache.quote_cache import quote_cache
+from src.cache.rate_broadcaster import rate_broadcaster
+from src.cache.rate_graph import rate_graph
+from src.cache.shared_rate_table import shared_rate_table
+from src.dto import CurrencyDTO
+
+
+def currency_created(currency: CurrencyDTO, publish: bool = True) -> None:
+    """
+    Функция вызывается после добавления валюты
+    :param currency: объект класса CurrencyDTO новой валюты
+    :param publish: разослать ли изменение другим узлам
+    :return: None
+    """
+    currency_registry.add(currency)
+    shared_rate_table.put_currency(currency)
+    cache_backend.delete([currency_key(currency.code)])
+    data_version.bump()
+    if publish:
+        change_notifier.publish("currency_created", currency=currency.model_dump())
+
+
+def exchange_rate_created(
+    base_currency: CurrencyDTO,
+    target_currency: CurrencyDTO,
+    rate: Decimal,
+    publish: bool = True,
+    exchange_rate_id: int | None = None,
+) -> None:
+    """
+    Функция вызывается после добавления обменного курса
+    :param base_currency: объект класса CurrencyDTO базовой валюты
+    :param target_currency: объект класса CurrencyDTO целевой валюты
+    :param rate: обменный курс
+    :param publish: разослать ли изменение другим узлам
+    :param exchange_rate_id: айди обменного курса
+    :return: None
+    """
+    rate_graph.add_rate(base_currency, target_currency, rate)
+    quote_cache.invalidate_new_pair(base_currency.code, target_currency.code)
+    shared_rate_table.put_rate(base_currency.currency_id, target_currency.currency_id, rate)
+    cache_backend.delete([exchange_rate_key(base_currency.code, target_currency.code)])
+    data_version.bump()
+    rate_broadcaster.publish_rate("created", exchange_rate_id, base_currency, target_currency, rate)
+    if publish:
+        change_notifier.publish(
+            "exchange_rate_created",
+            base_currency=base_currency.model_dump(),
+            target_currency=target_currency.model_dump(),
+            rate=str(rate),
+            exchange_rate_id=exchange_rate_id,
+        )
+
+
+def exchange_rate_updated(
+    base_currency_code: str,
+    target_currency_code: str,
+    rate: Decimal,
+    publish: bool = True,
+    exchange_rate_id: int | None = None,
+) -> None:
+    """
+    Функция вызывается после изменения обменного курса
+    :param base_currency_code: код базовой валюты
+    :param target_currency_code: код целевой валюты
+    :param rate: новый обменный курс
+    :param publish: разослать ли изменение другим узлам
+    :param exchange_rate_id: айди обменного курса
+    :return: None
+    """
+    rate_graph.update_rate(base_currency_code, target_currency_code, rate)
+    quote_cache.invalidate_pair(base_currency_code, target_currency_code)
+    cache_backend.delete([exchange_rate_key(base_currency_code, target_currency_code)])
+    base_currency, target_currency = _get_currencies(base_currency_code, target_currency_code)
+    if base_currency is not None and target_currency is not None:
+        shared_rate_table.put_rate(base_currency.currency_id, target_currency.currency_id, rate)
+        rate_broadcaster.publish_rate("updated", exchange_rate_id, base_currency, target_currency, rate)
+    else:
+        shared_rate_table.invalidate_rates()
+    data_version.bump()
+    if publish:
+        change_notifier.publish(
+            "exchange_rate_updated",
+            base_currency_code=base_currency_code,
+            target_currency_code=target_currency_code,
+            rate=str(rate),
+            exchange_rate_id=exchange_rate_id,
+        )
+
+
+def exchange_rate_deleted(
+    base_currency_code: str,
+    target_currency_code: str,
+    publish: bool = True,
+    exchange_rate_id: int | None = None,
+) -> None:
+    """
+    Функция вызывается после удаления обменного курса
+    :param base_currency_code: код базовой валюты
+    :param target_currency_code: код целевой валюты
+    :param publish: разослать ли изменение другим узлам
+    :param exchange_rate_id: айди удалённого обменного курса
+    :return: None
+    """
+    rate_graph.remove_rate(base_currency_code, target_currency_code)
+    quote_cache.invalidate_pair(base_currency_code, target_currency_code)
+    cache_backend.delete([exchange_rate_key(base_currency_code, target_currency_code)])
+    base_currency, target_currency = _get_currencies(base_currency_code, target_currency_code)
+    if base_currency is not None and target_currency is not None:
+        shared_rate_table.remove_rate(base_currency.currency_id, target_currency.currency_id)
+        rate_broadcaster.publish_rate("deleted", exchange_rate_id, base_currency, target_currency, None)
+    else:
+        shared_rate_table.invalidate_rates()
+    data_version.bump()
+    if publish:
+        change_notifier.publish(
+            "exchange_rate_deleted",
+            base_currency_code=base_currency_code,
+            target_currency_code=target_currency_code,
+            exchange_rate_id=exchange_rate_id,
+        )
+
+
+def currency_deleted(code: str, publish: bool = True) -> None:
+    """
+    Функция вызывается после удаления валюты (вместе с ней в БД каскадно удаляются и её обменные курсы)
+    :param code: код валюты
+    :param publish: разослать ли изменение другим узлам
+    :return: None
+    """
+    currency = currency_registry.get_by_code(code)
+    currency_registry.remove(code)
+    rate_graph.remove_currency(code)
+    quote_cache.invalidate_currency(code)
+    # история курсов валюты удалена каскадно: расчёты на прошлые моменты времени с ней больше не верны
+    cache_backend.delete([currency_key(code), quote_at_version_key()])
+    if currency is not None:
+        shared_rate_table.remove_currency(currency.currency_id)
+    else:
+        shared_rate_table.invalidate_rates()
+    data_version.bump()
+    rate_broadcaster.publish_currency_deleted(code)
+    if publish:
+        change_notifier.publish("currency_deleted", code=code)
+
+
+def apply_notification(kind: str, data: dict) -> None:
+    """
+    Функция применяет изменение, полученное от другого узла. Если уведомление не удалось разобрать,
+    выполняется полная пересинхронизация
+    :param kind: вид изменения (имя функции этого модуля)
+    :param data: данные изменения
+    :return: None
+    """
+    try:
+        if kind == "currency_created":
+            currency_created(CurrencyDTO(**data["currency"]), publish=False)
+        elif kind == "exchange_rate_created":
+            exchange_rate_created(
+                CurrencyDTO(**data["base_currency"]),
+                CurrencyDTO(**data["target_currency"]),
+                Decimal(data["rate"]),
+                publish=False,
+                exchange_rate_id=data.get("exchange_rate_id"),
+            )
+        elif kind == "exchange_rate_updated":
+            exchange_rate_updated(
+                data["base_currency_code"],
+                data["target_currency_code"],
+                Decimal(data["rate"]),
+                publish=False,
+                exchange_rate_id=data.get("exchange_rate_id"),
+            )
+        elif kind == "exchange_rate_deleted":
+            exchange_rate_deleted(
+                data["base_currency_code"],
+                data["target_currency_code"],
+                publish=False,
+                exchange_rate_id=data.get("exchange_rate_id"),
+            )
+        elif kind == "currency_deleted":
+            currency_deleted(data["code"], publish=False)
+        else:
+            resync()
+    except (KeyError, TypeError, ArithmeticError, ValueError):
+        resync()
+
+
+def resync() -> None:
+    """
+    Функция сбрасывает всё, что хранится в памяти процесса: справочник валют и граф обменных курсов
+    будут перечитаны из БД при следующем обращении. Вызывается, когда уведомления могли быть пропущены
+    :return: None
+    """
+    currency_registry.invalidate()
+    rate_graph.invalidate()
+    quote_cache.clear()
+    cache_backend.clear()
+    shared_rate_table.invalidate_rates()
+    data_version.bump()
+    rate_broadcaster.publish_resync()
+
+
+change_notifier.on_message = apply_notification
+change_notifier.on_resync = resync
+
+
+def _get_currencies(
+    base_currency_code: str,
+    target_currency_code: str,
+) -> tuple[CurrencyDTO | None, CurrencyDTO | None]:
+    """
+    Функция возвращает валюты пары из справочника валют, чтобы записать курс в общую таблицу по айди валют
+    :param base_currency_code: код базовой валюты
+    :param target_currency_code: код целевой валюты
+    :return: кортеж объектов класса CurrencyDTO (или None, если валюты нет в справочнике)
+    """
+    return currency_registry.get_by_code(base_currency_code), currency_registry.get_by_code(target_currency_code)
@@ -0,0 +1,309 @@
+import abc
+import asyncio
+import json
+import uuid
+from typing import AsyncIterator, Callable
+
+import asyncpg
+
+from src.model import settings
+
+
+class NotificationTransport(abc.ABC):
+    """
+    Транспорт уведомлений об изменениях между узлами (процессами) приложения.
+    Реализации: PostgresNotifyTransport (LISTEN/NOTIFY PostgreSQL) и InProcessTransport (шина в памяти процесса)
+    """
+
+    @abc.abstractmethod
+    async def connect(self) -> None:
+        """
+        Метод подключается к транспорту и подписывается на уведомления
+        """
+
+    @abc.abstractmethod
+    async def close(self) -> None:
+        """
+        Метод отключается от транспорта
+        """
+
+    @abc.abstractmethod
+    async def publish(self, payload: str) -> None:
+        """
+        Метод отправляет уведомление всем подписанным узлам, в том числе этому
+        :param payload: текст уведомления
+        """
+
+    @abc.abstractmethod
+    def messages(self) -> AsyncIterator[str]:
+        """
+        Асинхронный генератор полученных уведомлений. При потере соединения бросает ConnectionError
+        """
+
+
+class PostgresNotifyTransport(NotificationTransport):
+    """
+    Транспорт уведомлений через LISTEN/NOTIFY PostgreSQL. Использует отдельное соединение asyncpg вне пула SQLAlchemy
+    """
+
+    def __init__(self, dsn: str, channel: str):
+        """
+        :param dsn: адрес БД в формате asyncpg (postgresql://...)
+        :param channel: имя канала LISTEN/NOTIFY
+        """
+        self.dsn = dsn
+        self.channel = channel
+        self._connection: asyncpg.Connection | None = None
+        self._queue: asyncio.Queue[str | None] | None = None
+
+    async def connect(self) -> None:
+        self._queue = asyncio.Queue()
+        self._connection = await asyncpg.connect(self.dsn)
+        # None в очереди - признак потери соединения
+        self._connection.add_termination_listener(lambda connection: self._queue.put_nowait(None))
+        await self._connection.add_listener(
+            self.channel, lambda connection, pid, channel, payload: self._queue.put_nowait(payload)
+        )
+
+    async def close(self) -> None:
+        if self._connection is not None:
+            connection, self._connection = self._connection, None
+            try:
+                await connection.close(timeout=5)
+            except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError, asyncio.TimeoutError):
+                connection.terminate()
+
+    async def publish(self, payload: str) -> None:
+        if self._connection is None:
+            raise ConnectionError("Нет соединения с БД")
+        try:
+            await self._connection.execute("SELECT pg_notify($1, $2)", self.channel, payload)
+        except (OSError, asyncpg.PostgresError, asyncpg.InterfaceError) as exc:
+            raise ConnectionError(str(exc)) from exc
+
+    async def messages(self) -> AsyncIterator[str]:
+        while True:
+            payload = await self._queue.get()
+            if payload is None:
+                raise ConnectionError("Соединение с БД потеряно")
+            yield payload
+
+
+class InProcessBus:
+    """
+    Шина уведомлений в памяти процесса: несколько InProcessTransport с одной шиной ведут себя как узлы,
+    подписанные на один канал. Нужна для тестов без PostgreSQL
+    """
+
+    def __init__(self):
+        self.subscribers: set[asyncio.Queue] = set()
+
+    def disconnect_all(self) -> None:
+        """
+        Метод имитирует потерю соединения у всех подписчиков
+        """
+        for queue in self.subscribers:
+            queue.put_nowait(None)
+        self.subscribers.clear()
+
+
+class InProcessTransport(NotificationTransport):
+    """
+    Транспорт уведомлений через шину InProcessBus
+    """
+
+    def __init__(self, bus: InProcessBus):
+        """
+        :param bus: объект класса InProcessBus
+        """
+        self.bus = bus
+        self._queue: asyncio.Queue[str | None] | None = None
+
+    async def connect(self) -> None:
+        self._queue = asyncio.Queue()
+        self.bus.subscribers.add(self._queue)
+
+    async def close(self) -> None:
+        self.bus.subscribers.discard(self._queue)
+
+    async def publish(self, payload: str) -> None:
+        if self._queue not in self.bus.subscribers:
+            raise ConnectionError("Нет подключения к шине")
+        for queue in self.bus.subscribers:
+            queue.put_nowait(payload)
+
+    async def messages(self) -> AsyncIterator[str]:
+        while True:
+            payload = await self._queue.get()
+            if payload is None:
+                raise ConnectionError("Подключение к шине потеряно")
+            yield payload
+
+
+class ChangeNotifier:
+    """
+    Рассылка и приём уведомлений об изменениях валют и обменных курсов между узлами приложения.
+    Уведомления, отправленные этим узлом, при получении пропускаются (по node_id).
+    При потере соединения узел переподключается с экспоненциальной задержкой, а после переподключения
+    выполняет полную пересинхронизацию (resync), так как пока соединения не было, уведомления могли быть пропущены.
+    Если отправки накопилось больше max_batch, вместо них отправляется одно уведомление "resync"
+    """
+
+    def __init__(
+        self,
+        transport: NotificationTransport | None,
+        backoff_initial: float = 0.5,
+        backoff_max: float = 30.0,
+        max_batch: int = 100,
+    ):
+        """
+        :param transport: транспорт уведомлений или None, если уведомления не используются
+        :param backoff_initial: первая задержка перед переподключением в секундах
+        :param backoff_max: максимальная задержка перед переподключением в секундах
+        :param max_batch: сколько накопленных уведомлений отправлять по одному
+        """
+        self.transport = transport
+        self.node_id = uuid.uuid4().hex
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.max_batch = max_batch
+        self.on_message: Callable[[str, dict], None] | None = None
+        self.on_resync: Callable[[], None] | None = None
+        self.connected = asyncio.Event()
+        self._outgoing: list[dict] = []
+        self._has_outgoing = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def enabled(self) -> bool:
+        """
+        True, если уведомления других узлов доходят до этого узла: транспорт задан и подключён.
+        Пока соединения нет, изменения других узлов не видны, поэтому данным в памяти процесса доверять нельзя;
+        после переподключения выполняется resync, и лишь затем enabled снова становится True
+        """
+        return self.transport is not None and self.connected.is_set()
+
+    def publish(self, kind: str, **data) -> None:
+        """
+        Метод ставит уведомление в очередь на отправку. Вызывается после commit изменений
+        :param kind: вид изменения (имя функции из src.cache.events)
+        :param data: данные изменения: коды валют и новые значения
+        :return: None
+        """
+        if self._task is None:
+            return
+        self._outgoing.append({"node": self.node_id, "kind": kind, "data": data})
+        self._has_outgoing.set()
+
+    def start(self) -> None:
+        """
+        Метод запускает задачу приёма и отправки уведомлений, если задан транспорт
+        """
+        if self.transport is not None and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        """
+        Метод останавливает задачу приёма и отправки уведомлений
+        """
+        if self._task is not None:
+            task, self._task = self._task, None
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self) -> None:
+        """
+        Цикл приёма уведомлений с переподключением
+        """
+        delay = self.backoff_initial
+        first_connection = True
+        while True:
+            try:
+                await self.transport.connect()
+                if not first_connection and self.on_resync is not None:
+                    self.on_resync()
+                first_connection = False
+                delay = self.backoff_initial
+                self.connected.set()
+                sender = asyncio.create_task(self._send())
+                try:
+                    async for payload in self.transport.messages():
+                        self._receive(payload)
+                finally:
+                    # до переподключения задача отправки должна вернуть неотправленные уведомления в очередь
+                    sender.cancel()
+                    await asyncio.gather(sender, return_exceptions=True)
+            except (ConnectionError, OSError, asyncpg.PostgresError, asyncpg.InterfaceError, asyncio.TimeoutError):
+                pass
+            finally:
+                self.connected.clear()
+                await self.transport.close()
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.backoff_max)
+
+    async def _send(self) -> None:
+        """
+        Задача отправки накопленных уведомлений. Если отправить не удалось или задача отменена
+        (соединение потеряно, узел останавливается), неотправленные уведомления возвращаются в начало очереди.
+        Уведомление, отправка которого прервана отменой, тоже возвращается: его могут получить дважды,
+        но не потеряют
+        """
+        while True:
+            await self._has_outgoing.wait()
+            self._has_outgoing.clear()
+            batch, self._outgoing = self._outgoing, []
+            if len(batch) > self.max_batch:
+                batch = [{"node": self.node_id, "kind": "resync", "data": {}}]
+            for index, message in enumerate(batch):
+                try:
+                    await self.transport.publish(json.dumps(message))
+                except ConnectionError:
+                    self._outgoing[:0] = batch[index:]
+                    self._has_outgoing.set()
+                    return
+                except asyncio.CancelledError:
+                    self._outgoing[:0] = batch[index:]
+                    self._has_outgoing.set()
+                    raise
+
+    def _receive(self, payload: str) -> None:
+        """
+        Метод обрабатывает полученное уведомление
+        :param payload: текст уведомления
+        :return: None
+        """
+        try:
+            message = json.loads(payload)
+            node, kind, data = message["node"], message["kind"], message["data"]
+        except (ValueError, TypeError, KeyError):
+            return
+        if node == self.node_id:
+            return
+        if kind == "resync":
+            if self.on_resync is not None:
+                self.on_resync()
+        elif self.on_message is not None:
+            self.on_message(kind, data)
+
+
+def _get_transport() -> NotificationTransport | None:
+    """
+    :return: транспорт уведомлений по настройке notifications_transport
+    """
+    if settings.notifications_transport == "postgres":
+        return PostgresNotifyTransport(
+            dsn=settings.data_base_url.replace("postgresql+asyncpg://", "postgresql://", 1),
+            channel=settings.notifications_channel,
+        )
+    return None
+
+
+change_notifier = ChangeNotifier(
+    transport=_get_transport(),
+    backoff_initial=settings.notifications_backoff_initial,
+    backoff_max=settings.notifications_backoff_max,
+)
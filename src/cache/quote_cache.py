@@ -0,0 +1,193 @@
+import time
+from collections import OrderedDict
+
+from src.cache.rate_graph import RateGraph, RatePath, rate_graph
+from src.model import settings
+
+
+class QuoteCache:
+    """
+    Ограниченный по размеру кэш найденных путей конвертации (курс и путь: прямой, обратный или кросс-курс).
+    Ключ кэша - пара (из какой валюты, в какую валюту). Вытеснение - по LRU и по времени жизни записи.
+    Для каждой записи запоминается, через какие курсы и валюты проходит её путь, поэтому при изменении
+    курса или удалении валюты сбрасываются только те записи, на которые это изменение влияет
+    """
+
+    def __init__(self, graph: RateGraph, max_size: int, ttl: float):
+        """
+        :param graph: граф обменных курсов, в котором ищутся пути при промахе кэша
+        :param max_size: максимальное число записей
+        :param ttl: время жизни записи в секундах
+        """
+        self._graph = graph
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[str, str], tuple[RatePath, float]] = OrderedDict()
+        self._keys_by_pair: dict[tuple[str, str], set[tuple[str, str]]] = {}
+        self._keys_by_currency: dict[str, set[tuple[str, str]]] = {}
+        self._generation = graph.generation
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        graph.subscribe(self._on_graph_change)
+
+    def find_path(self, currency_from: str, currency_to: str) -> RatePath | None:
+        """
+        Метод возвращает путь конвертации из кэша, а при промахе ищет его в графе и кэширует
+        :param currency_from: из какой валюты перевод (базовая валюта)
+        :param currency_to: в какую валюту перевод (целевая валюта)
+        :return: объект класса RatePath или None, если путь не найден
+        """
+        if self._generation != self._graph.generation:
+            # граф перезагружен из БД - любая запись могла устареть
+            self.clear()
+            self._generation = self._graph.generation
+
+        key = (currency_from, currency_to)
+        entry = self._entries.get(key)
+        if entry is not None:
+            rate_path, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return rate_path
+            self._remove(key)
+            self.evictions += 1
+
+        self.misses += 1
+        rate_path = self._graph.find_path(currency_from=currency_from, currency_to=currency_to)
+        if rate_path is not None:
+            self._put(key, rate_path)
+        return rate_path
+
+    def invalidate_pair(self, base_currency_code: str, target_currency_code: str) -> None:
+        """
+        Метод сбрасывает записи, путь которых проходит через курс этой пары валют (в любую сторону).
+        Вызывается при изменении и удалении курса
+        :param base_currency_code: код базовой валюты
+        :param target_currency_code: код целевой валюты
+        :return: None
+        """
+        self._invalidate(self._keys_by_pair.get(self._pair(base_currency_code, target_currency_code), ()))
+
+    def invalidate_new_pair(self, base_currency_code: str, target_currency_code: str) -> None:
+        """
+        Метод сбрасывает записи, которые может улучшить новый курс: записи этой пары валют
+        и все кросс-курсы (новый курс может дать более короткий путь или путь без обратных курсов)
+        :param base_currency_code: код базовой валюты
+        :param target_currency_code: код целевой валюты
+        :return: None
+        """
+        keys = set(self._keys_by_pair.get(self._pair(base_currency_code, target_currency_code), ()))
+        keys.update(key for key, (rate_path, _) in self._entries.items() if rate_path.kind == "cross")
+        self._invalidate(keys)
+
+    def invalidate_currency(self, code: str) -> None:
+        """
+        Метод сбрасывает записи, путь которых проходит через валюту
+        :param code: код валюты
+        :return: None
+        """
+        self._invalidate(self._keys_by_currency.get(code, ()))
+
+    def _on_graph_change(self, kind: str, code_from: str, code_to: str | None) -> None:
+        """
+        Метод сбрасывает записи, на которые влияет изменение, применённое графом из общей для воркеров таблицы
+        :param kind: вид изменения (см. RateGraph.subscribe)
+        :param code_from: код базовой валюты курса или код удалённой валюты
+        :param code_to: код целевой валюты курса или None
+        :return: None
+        """
+        if kind == "currency_removed":
+            self.invalidate_currency(code_from)
+        elif kind == "rate_added":
+            self.invalidate_new_pair(code_from, code_to)
+        else:
+            self.invalidate_pair(code_from, code_to)
+
+    def clear(self) -> None:
+        """
+        Метод очищает кэш
+        :return: None
+        """
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._keys_by_pair.clear()
+        self._keys_by_currency.clear()
+
+    def stats(self) -> dict:
+        """
+        Метод возвращает счётчики кэша для подбора его размера
+        :return: словарь со счётчиками
+        """
+        return {
+            "size": len(self._entries),
+            "maxSize": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+    @staticmethod
+    def _pair(code_from: str, code_to: str) -> tuple[str, str]:
+        """
+        Метод возвращает ключ курса без учёта направления
+        """
+        return (code_from, code_to) if code_from < code_to else (code_to, code_from)
+
+    def _put(self, key: tuple[str, str], rate_path: RatePath) -> None:
+        """
+        Метод добавляет запись в кэш и вытесняет самую давно использованную запись, если кэш заполнен
+        :param key: пара (из какой валюты, в какую валюту)
+        :param rate_path: объект класса RatePath
+        :return: None
+        """
+        self._entries[key] = (rate_path, time.monotonic() + self.ttl)
+        codes = rate_path.codes
+        for code_from, code_to in zip(codes, codes[1:]):
+            self._keys_by_pair.setdefault(self._pair(code_from, code_to), set()).add(key)
+        for code in codes:
+            self._keys_by_currency.setdefault(code, set()).add(key)
+
+        if len(self._entries) > self.max_size:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def _remove(self, key: tuple[str, str]) -> None:
+        """
+        Метод удаляет запись из кэша и из индексов по курсам и валютам
+        :param key: пара (из какой валюты, в какую валюту)
+        :return: None
+        """
+        rate_path, _ = self._entries.pop(key)
+        codes = rate_path.codes
+        for code_from, code_to in zip(codes, codes[1:]):
+            pair = self._pair(code_from, code_to)
+            keys = self._keys_by_pair.get(pair)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_pair[pair]
+        for code in codes:
+            keys = self._keys_by_currency.get(code)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_currency[code]
+
+    def _invalidate(self, keys) -> None:
+        """
+        Метод сбрасывает переданные записи
+        :param keys: ключи записей
+        :return: None
+        """
+        for key in list(keys):
+            self._remove(key)
+            self.invalidations += 1
+
+
+quote_cache = QuoteCache(graph=rate_graph, max_size=settings.quote_cache_max_size, ttl=settings.quote_cache_ttl)
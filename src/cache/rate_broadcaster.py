@@ -0,0 +1,199 @@
+import asyncio
+from decimal import Decimal
+from typing import NamedTuple
+
+import pydantic_core
+
+from src.dto import CurrencyDTO, ExchangeRateDTO
+from src.model import settings
+
+
+class RateEvent(NamedTuple):
+    """
+    Сообщение об изменении обменного курса, сериализованное один раз для всех подписчиков
+    """
+    text: str       # JSON для WebSocket
+    sse: bytes      # то же сообщение в формате Server-Sent Events
+
+
+class RateSubscription:
+    """
+    Подписка одного соединения на изменения обменных курсов. Сообщения копятся в ограниченной очереди;
+    если клиент не успевает их получать и очередь переполнена, подписка отключается,
+    а в очередь кладётся None - признак того, что соединение нужно закрыть
+    """
+
+    def __init__(self, pairs: frozenset[str] | None, queue_size: int):
+        """
+        :param pairs: коды валютных пар (например "USDEUR") или None - все пары
+        :param queue_size: максимальное число сообщений в очереди
+        """
+        self.pairs = pairs
+        self.queue: asyncio.Queue[RateEvent | None] = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+
+class RateBroadcaster:
+    """
+    Рассылка изменений обменных курсов подписчикам (SSE и WebSocket, src.controller.subscriptions_controller).
+    Функции src.cache.events вызывают publish_rate после commit добавления, изменения и удаления курса
+    (publish_currency_deleted - после удаления валюты) в этом процессе и после применения изменения,
+    полученного от другого узла. Сообщение сериализуется один раз и кладётся в очереди подписчиков
+    этой пары без ожидания; медленные подписчики отключаются
+    """
+
+    def __init__(self, queue_size: int):
+        """
+        :param queue_size: размер очереди сообщений каждой подписки
+        """
+        self.queue_size = queue_size
+        self._subscriptions_by_pair: dict[str, set[RateSubscription]] = {}
+        self._subscriptions_to_all: set[RateSubscription] = set()
+        self.subscriptions = 0
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, pairs: frozenset[str] | None = None) -> RateSubscription:
+        """
+        Метод создаёт подписку
+        :param pairs: коды валютных пар (например "USDEUR") или None - все пары
+        :return: объект класса RateSubscription
+        """
+        subscription = RateSubscription(pairs=pairs, queue_size=self.queue_size)
+        if pairs is None:
+            self._subscriptions_to_all.add(subscription)
+        else:
+            for pair in pairs:
+                self._subscriptions_by_pair.setdefault(pair, set()).add(subscription)
+        self.subscriptions += 1
+        return subscription
+
+    def unsubscribe(self, subscription: RateSubscription) -> None:
+        """
+        Метод удаляет подписку. Повторный вызов ничего не делает
+        :param subscription: объект класса RateSubscription
+        :return: None
+        """
+        if subscription.pairs is None:
+            if subscription not in self._subscriptions_to_all:
+                return
+            self._subscriptions_to_all.discard(subscription)
+        else:
+            removed = False
+            for pair in subscription.pairs:
+                subscriptions = self._subscriptions_by_pair.get(pair)
+                if subscriptions is not None and subscription in subscriptions:
+                    removed = True
+                    subscriptions.discard(subscription)
+                    if not subscriptions:
+                        del self._subscriptions_by_pair[pair]
+            if not removed:
+                return
+        self.subscriptions -= 1
+
+    def publish_rate(
+        self,
+        event: str,
+        exchange_rate_id: int | None,
+        base_currency: CurrencyDTO,
+        target_currency: CurrencyDTO,
+        rate: Decimal | None,
+    ) -> None:
+        """
+        Метод рассылает изменение обменного курса подписчикам этой пары и подписчикам всех пар
+        :param event: "created", "updated" или "deleted"
+        :param exchange_rate_id: айди обменного курса или None, если он неизвестен
+        :param base_currency: объект класса CurrencyDTO базовой валюты
+        :param target_currency: объект класса CurrencyDTO целевой валюты
+        :param rate: обменный курс или None для удалённого курса
+        :return: None
+        """
+        pair = base_currency.code + target_currency.code
+        subscriptions = [*self._subscriptions_by_pair.get(pair, ()), *self._subscriptions_to_all]
+        if not subscriptions:
+            return
+
+        if rate is None:
+            exchange_rate = {"id": exchange_rate_id, "baseCurrency": base_currency, "targetCurrency": target_currency}
+        else:
+            exchange_rate = ExchangeRateDTO.model_construct(
+                exchange_rate_id=exchange_rate_id,
+                base_currency=base_currency,
+                target_currency=target_currency,
+                rate=float(rate),
+            )
+        self._send(subscriptions, {"event": event, "exchangeRate": exchange_rate})
+
+    def publish_currency_deleted(self, code: str) -> None:
+        """
+        Метод сообщает подписчикам пар с этой валютой и подписчикам всех пар об удалении валюты
+        (вместе с ней удалены и все её обменные курсы)
+        :param code: код валюты
+        :return: None
+        """
+        subscriptions = set(self._subscriptions_to_all)
+        for pair, pair_subscriptions in self._subscriptions_by_pair.items():
+            if pair[:3] == code or pair[3:] == code:
+                subscriptions.update(pair_subscriptions)
+        if subscriptions:
+            self._send(subscriptions, {"event": "currencyDeleted", "code": code})
+
+    def publish_resync(self) -> None:
+        """
+        Метод сообщает всем подписчикам, что изменения могли быть пропущены
+        (src.cache.events.resync) и курсы нужно перечитать
+        :return: None
+        """
+        subscriptions = set(self._subscriptions_to_all)
+        for pair_subscriptions in self._subscriptions_by_pair.values():
+            subscriptions.update(pair_subscriptions)
+        if subscriptions:
+            self._send(subscriptions, {"event": "resync"})
+
+    def _send(self, subscriptions, message: dict) -> None:
+        """
+        Метод сериализует сообщение и кладёт его в очереди подписок
+        :param subscriptions: подписки
+        :param message: сообщение
+        :return: None
+        """
+        data = pydantic_core.to_json(message, by_alias=True)
+        rate_event = RateEvent(text=data.decode(), sse=b"data: " + data + b"\n\n")
+        self.published += 1
+        for subscription in subscriptions:
+            try:
+                subscription.queue.put_nowait(rate_event)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self._drop(subscription)
+
+    def _drop(self, subscription: RateSubscription) -> None:
+        """
+        Метод отключает подписку, которая не успевает получать сообщения: очередь очищается,
+        и в неё кладётся None, чтобы соединение закрылось
+        :param subscription: объект класса RateSubscription
+        :return: None
+        """
+        self.unsubscribe(subscription)
+        subscription.dropped = True
+        while not subscription.queue.empty():
+            subscription.queue.get_nowait()
+        subscription.queue.put_nowait(None)
+        self.dropped += 1
+
+    def stats(self) -> dict:
+        """
+        Метод возвращает счётчики рассылки
+        :return: словарь со счётчиками
+        """
+        return {
+            "subscriptions": self.subscriptions,
+            "queueSize": self.queue_size,
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+        }
+
+
+rate_broadcaster = RateBroadcaster(queue_size=settings.rate_subscription_queue_size)
@@ -0,0 +1,484 @@
+import asyncio
+import time
+from decimal import Decimal
+from typing import NamedTuple
+
+from src.cache.shared_rate_table import SharedChange, SharedRateTable, shared_rate_table
+from src.dto import CurrencyDTO, ErrorResponse
+from src.model import settings
+from src.money import Rate
+
+
+class RatePath(NamedTuple):
+    """
+    Найденный в графе путь конвертации из одной валюты в другую.
+    kind - вид курса: "direct" (прямой), "reverse" (обратный) или "cross" (кросс-курс через другие валюты)
+    """
+    base_currency: CurrencyDTO
+    target_currency: CurrencyDTO
+    rate: Rate
+    codes: tuple[str, ...]
+    kind: str
+
+
+class RateGraph:
+    """
+    Граф обменных курсов, который хранится в памяти процесса.
+    Вершины графа - валюты, рёбра - обменные курсы: каждый курс из БД даёт прямое ребро
+    и обратное ребро с курсом 1 / rate (если в БД нет собственного курса для обратной пары).
+    Курсы хранятся точными дробями из целых чисел (src.money.Rate), курс цепочки - их произведение.
+    Граф загружается из БД одним запросом, после чего курс для любой достижимой пары валют
+    находится без обращения к БД.
+    Методы DAO, изменяющие курсы и валюты, обновляют граф сразу после commit.
+    Если используется общая для воркеров таблица shared_table, граф строится из неё, а из БД читается,
+    только если разделы валют и курсов в ней пусты или загружены из БД больше ttl секунд назад.
+    Изменения таблицы, сделанные другими воркерами, применяются к графу по одному из её журнала изменений;
+    целиком граф перестраивается, только если разделы перезагружены из БД или журнал не содержит всех изменений
+    """
+
+    def __init__(self, max_hops: int, ttl: float, pivots: list[str], shared_table: SharedRateTable | None = None):
+        """
+        :param max_hops: максимальное число обменов в цепочке конвертации
+        :param ttl: через сколько секунд граф считается устаревшим и перечитывается из БД
+        :param pivots: коды валют, через которые в первую очередь ищется кросс-курс (в порядке приоритета)
+        :param shared_table: общая для воркеров таблица валют и курсов или None
+        """
+        self.max_hops = max_hops
+        self.ttl = ttl
+        self.pivots = list(pivots)
+        self._pivot_rank = {code: rank for rank, code in enumerate(self.pivots)}
+        self._currencies: dict[str, CurrencyDTO] = {}
+        self._rates: dict[tuple[str, str], Rate] = {}
+        self._edges: dict[str, dict[str, tuple[Rate, bool]]] = {}
+        self._loaded_at: float | None = None
+        self._version = 0
+        self._topology_version = 0
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self._shared_table = shared_table
+        self._shared_version = 0
+        self._shared_currencies: dict[int, CurrencyDTO] = {}
+        self._reload_from_db = False
+        self._listeners = []
+
+    @property
+    def version(self) -> int:
+        """
+        Номер версии графа, увеличивается при каждом изменении
+        """
+        return self._version
+
+    @property
+    def topology_version(self) -> int:
+        """
+        Номер версии набора вершин и рёбер графа, не меняется при изменении значения курса
+        """
+        return self._topology_version
+
+    @property
+    def generation(self) -> int:
+        """
+        Номер загрузки графа, увеличивается при каждой полной перезагрузке (из БД или из общей таблицы)
+        и при сбросе графа, но не при применении отдельных изменений
+        """
+        return self._generation
+
+    @property
+    def is_stale(self) -> bool:
+        """
+        True, если граф ещё не загружен, был сброшен, устарел по времени или изменилась общая таблица
+        """
+        if self._shared_table is not None and self._shared_table.version() != self._shared_version:
+            return True
+        return self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl
+
+    async def ensure_loaded(self, dao_exchange_obj) -> ErrorResponse | None:
+        """
+        Метод загружает граф из БД, если он устарел. Одновременные запросы ждут одну загрузку
+        :param dao_exchange_obj: объект класса DaoExchangeRepository
+        :return: None или ErrorResponse, если граф не удалось загрузить
+        """
+        if not self.is_stale:
+            return None
+
+        async with self._lock:
+            if not self.is_stale:
+                return None
+
+            if self._load_shared():
+                return None
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at <= self.ttl:
+                # общая таблица изменилась, но курсов в ней нет или они не поместились - свои данные ещё свежие
+                self._shared_version = self._shared_table.version()
+                return None
+
+            version = self._version
+            rows = await dao_exchange_obj.find_all_rows()
+            if isinstance(rows, ErrorResponse):
+                return rows
+
+            self._build(rows)
+            # если во время загрузки граф менялся, то загруженные данные могли устареть - перечитаем их в следующий раз
+            self._loaded_at = time.monotonic() if version == self._version else None
+            self._version += 1
+            self._topology_version += 1
+            self._generation += 1
+            self._reload_from_db = False
+            if self._shared_table is not None:
+                # другие воркеры построят граф из общей таблицы, этот - тоже, при следующем обращении
+                self._shared_table.publish_rates([(row[1], row[5], row[0]) for row in rows])
+            return None
+
+    def _load_shared(self) -> bool:
+        """
+        Метод применяет к графу изменения общей для воркеров таблицы или, если это невозможно,
+        строит граф из неё заново, если разделы валют и курсов в ней не устарели
+        :return: True, если граф обновлён
+        """
+        if self._shared_table is None or self._reload_from_db:
+            return False
+        if self._apply_shared_changes():
+            return True
+        snapshot = self._shared_table.read()
+        if snapshot is None or not snapshot.currencies_loaded_at or not snapshot.rates_loaded_at:
+            return False
+        loaded_at = min(snapshot.currencies_loaded_at, snapshot.rates_loaded_at)
+        if time.time() - loaded_at > self.ttl:
+            return False
+
+        currencies = {currency.currency_id: currency for currency in snapshot.currencies}
+        rows = []
+        for base_id, target_id, rate in snapshot.rates:
+            base_currency, target_currency = currencies.get(base_id), currencies.get(target_id)
+            if base_currency is None or target_currency is None:
+                return False
+            rows.append((
+                rate,
+                base_id, base_currency.code, base_currency.name, base_currency.sign,
+                target_id, target_currency.code, target_currency.name, target_currency.sign,
+            ))
+
+        self._build(rows)
+        self._shared_currencies = currencies
+        # возраст графа считается от загрузки курсов из БД, а не от чтения общей таблицы
+        self._loaded_at = time.monotonic() - max(time.time() - loaded_at, 0.0)
+        self._shared_version = snapshot.version
+        self._version += 1
+        self._topology_version += 1
+        self._generation += 1
+        return True
+
+    def _apply_shared_changes(self) -> bool:
+        """
+        Метод применяет к графу изменения общей таблицы после версии, из которой граф построен.
+        Свои изменения воркер уже применил, поэтому курс, который в графе уже такой же, пропускается.
+        Изменение значения курса увеличивает только version, добавление и удаление курса или валюты -
+        ещё и topology_version; о каждом применённом изменении сообщается подписчикам (subscribe)
+        :return: True, если все изменения применены
+        """
+        if not self._shared_version or self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            return False
+        changes = self._shared_table.changes_since(self._shared_version)
+        if changes is None:
+            return False
+
+        for change in changes:
+            if not self._apply_shared_change(change):
+                return False
+            self._shared_version = change.version
+        return True
+
+    def _apply_shared_change(self, change: SharedChange) -> bool:
+        """
+        Метод применяет к графу одно изменение общей таблицы
+        :param change: объект класса SharedChange
+        :return: True, если изменение применено, False - если валюты курса неизвестны и граф нужно построить заново
+        """
+        if change.kind == "currency":
+            self._shared_currencies[change.currency_id] = change.currency
+            return True
+        if change.kind == "currency_removed":
+            currency = self._shared_currencies.pop(change.currency_id, None)
+            if currency is not None and currency.code in self._currencies:
+                self.remove_currency(currency.code)
+                self._notify("currency_removed", currency.code, None)
+            return True
+
+        base_currency = self._shared_currencies.get(change.base_currency_id)
+        target_currency = self._shared_currencies.get(change.target_currency_id)
+        if base_currency is None or target_currency is None:
+            return False
+        pair = (base_currency.code, target_currency.code)
+        if change.kind == "rate_removed":
+            if pair in self._rates:
+                self.remove_rate(*pair)
+                self._notify("rate_removed", *pair)
+        elif pair not in self._rates:
+            self.add_rate(base_currency, target_currency, change.rate)
+            self._notify("rate_added", *pair)
+        elif self._rates[pair] != Rate.from_value(change.rate):
+            self.update_rate(*pair, change.rate)
+            self._notify("rate_updated", *pair)
+        return True
+
+    def subscribe(self, listener) -> None:
+        """
+        Метод подписывает функцию на изменения, которые граф применил из общей таблицы
+        (изменения самого воркера в графе делает src.cache.events, он же сбрасывает зависящие от них кэши)
+        :param listener: функция listener(kind, code_from, code_to), kind - "rate_added", "rate_updated",
+        "rate_removed" или "currency_removed" (тогда code_from - код удалённой валюты, code_to - None)
+        :return: None
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, kind: str, code_from: str, code_to: str | None) -> None:
+        """
+        Метод сообщает подписчикам об изменении, применённом из общей таблицы
+        """
+        for listener in self._listeners:
+            listener(kind, code_from, code_to)
+
+    def from_rows(self, rows) -> "RateGraph":
+        """
+        Метод строит отдельный граф с теми же настройками поиска из переданных строк, не изменяя этот граф.
+        Используется для расчёта по курсам на прошлый момент времени
+        :param rows: строки в том же виде, что и у DaoExchangeRepository.find_all_rows
+        :return: объект класса RateGraph
+        """
+        graph = RateGraph(max_hops=self.max_hops, ttl=self.ttl, pivots=self.pivots)
+        graph._build(rows)
+        return graph
+
+    def invalidate(self) -> None:
+        """
+        Метод помечает граф устаревшим, при следующем обращении он будет перечитан из БД
+        (а не из общей для воркеров таблицы)
+        """
+        self._loaded_at = None
+        self._reload_from_db = True
+        self._version += 1
+        self._generation += 1
+
+    def add_rate(self, base_currency: CurrencyDTO, target_currency: CurrencyDTO, rate: Decimal) -> None:
+        """
+        Метод добавляет в граф новый обменный курс
+        :param base_currency: объект класса CurrencyDTO базовой валюты
+        :param target_currency: объект класса CurrencyDTO целевой валюты
+        :param rate: обменный курс
+        :return: None
+        """
+        self._add_currency(base_currency)
+        self._add_currency(target_currency)
+        self._set_edge(base_currency.code, target_currency.code, Rate.from_value(rate))
+        self._version += 1
+        self._topology_version += 1
+
+    def update_rate(self, base_currency_code: str, target_currency_code: str, rate: Decimal) -> None:
+        """
+        Метод изменяет обменный курс, который уже есть в графе
+        :param base_currency_code: код базовой валюты
+        :param target_currency_code: код целевой валюты
+        :param rate: новый обменный курс
+        :return: None
+        """
+        if (base_currency_code, target_currency_code) in self._rates:
+            self._set_edge(base_currency_code, target_currency_code, Rate.from_value(rate))
+            self._version += 1
+        else:
+            self.invalidate()
+
+    def remove_rate(self, base_currency_code: str, target_currency_code: str) -> None:
+        """
+        Метод удаляет обменный курс из графа
+        :param base_currency_code: код базовой валюты
+        :param target_currency_code: код целевой валюты
+        :return: None
+        """
+        self._rates.pop((base_currency_code, target_currency_code), None)
+        self._drop_edge(base_currency_code, target_currency_code)
+        self._drop_edge(target_currency_code, base_currency_code)
+        self._version += 1
+        self._topology_version += 1
+
+    def remove_currency(self, code: str) -> None:
+        """
+        Метод удаляет валюту и все её обменные курсы из графа
+        :param code: код валюты
+        :return: None
+        """
+        for neighbour in list(self._edges.get(code, ())):
+            self._rates.pop((code, neighbour), None)
+            self._rates.pop((neighbour, code), None)
+            self._edges[neighbour].pop(code, None)
+        self._edges.pop(code, None)
+        self._currencies.pop(code, None)
+        self._version += 1
+        self._topology_version += 1
+
+    def find_path(self, currency_from: str, currency_to: str) -> RatePath | None:
+        """
+        Метод ищет путь конвертации с наименьшим числом обменов (не больше max_hops).
+        Сначала проверяется прямой или обратный курс, затем кросс-курс через опорные валюты (pivots)
+        в порядке их приоритета - это несколько обращений к словарям рёбер, без обхода графа.
+        Если таких путей нет, граф обходится в ширину (shortest_path_tree)
+        :param currency_from: из какой валюты перевод (базовая валюта)
+        :param currency_to: в какую валюту перевод (целевая валюта)
+        :return: объект класса RatePath или None, если путь не найден
+        """
+        if currency_from not in self._currencies or currency_to not in self._currencies:
+            return None
+
+        edges_from = self._edges[currency_from]
+        if currency_from == currency_to:
+            codes = [currency_from]
+        elif currency_to in edges_from:
+            codes = [currency_from, currency_to]
+        else:
+            codes = None
+            if self.max_hops >= 2:
+                for pivot in self.pivots:
+                    if pivot in edges_from and currency_to in self._edges[pivot] and pivot != currency_to:
+                        codes = [currency_from, pivot, currency_to]
+                        break
+
+        if codes is None:
+            previous = self.shortest_path_tree(currency_from=currency_from, currency_to=currency_to)
+            if currency_to not in previous:
+                return None
+
+            codes = [currency_to]
+            while codes[-1] != currency_from:
+                codes.append(previous[codes[-1]])
+            codes.reverse()
+
+        rate = Rate(1, 1)
+        for code_from, code_to in zip(codes, codes[1:]):
+            rate = rate.chained(self._edges[code_from][code_to][0])
+
+        if len(codes) > 2:
+            kind = "cross"
+        elif len(codes) == 2 and self._edges[currency_from][currency_to][1]:
+            kind = "reverse"
+        else:
+            kind = "direct"
+
+        return RatePath(self._currencies[currency_from], self._currencies[currency_to], rate, tuple(codes), kind)
+
+    def shortest_path_tree(self, currency_from: str, currency_to: str | None = None) -> dict[str, str | None]:
+        """
+        Метод обходит граф в ширину от валюты currency_from не дальше max_hops обменов.
+        Для каждой достижимой валюты запоминается предыдущая валюта на лучшем пути к ней:
+        сначала по числу обменов, затем по приоритету предыдущей валюты среди опорных валют (pivots),
+        затем по числу обратных курсов. Поэтому пути совпадают с путями, которые выбирает find_path
+        :param currency_from: валюта, от которой строятся пути
+        :param currency_to: если передана, обход останавливается на уровне, где она найдена
+        :return: словарь {код валюты: код предыдущей валюты на пути} в порядке обхода
+        """
+        previous = {currency_from: None}
+        inversions = {currency_from: 0}
+        frontier = [currency_from]
+        no_rank = len(self.pivots)
+        for _ in range(self.max_hops):
+            level = {}
+            for code in frontier:
+                rank = self._pivot_rank.get(code, no_rank)
+                for neighbour, (_, is_reverse) in self._edges[code].items():
+                    if neighbour in previous:
+                        continue
+                    cost = (rank, inversions[code] + is_reverse)
+                    if neighbour not in level or cost < level[neighbour][1]:
+                        level[neighbour] = (code, cost)
+            if not level:
+                break
+            for neighbour, (code, (_, cost)) in level.items():
+                previous[neighbour] = code
+                inversions[neighbour] = cost
+            if currency_to in level:
+                break
+            frontier = list(level)
+        return previous
+
+    @property
+    def codes(self) -> list[str]:
+        """
+        Отсортированный список кодов валют, у которых есть хотя бы один обменный курс
+        """
+        return sorted(self._currencies)
+
+    def edges(self):
+        """
+        Генератор по всем рёбрам графа
+        :return: кортежи (код валюты, из которой идёт ребро, код валюты, в которую идёт ребро, курс)
+        """
+        for code_from, edges in self._edges.items():
+            for code_to, (rate, _) in edges.items():
+                yield code_from, code_to, rate
+
+    def _build(self, rows) -> None:
+        """
+        Метод заполняет граф строками, полученными из DaoExchangeRepository.find_all_rows
+        :param rows: строки с данными обменных курсов и их валют
+        :return: None
+        """
+        self._currencies = {}
+        self._rates = {}
+        self._edges = {}
+        for (rate,
+             base_id, base_code, base_name, base_sign,
+             target_id, target_code, target_name, target_sign) in rows:
+            self._add_currency(CurrencyDTO.model_construct(
+                currency_id=base_id, name=base_name, code=base_code, sign=base_sign
+            ))
+            self._add_currency(CurrencyDTO.model_construct(
+                currency_id=target_id, name=target_name, code=target_code, sign=target_sign
+            ))
+            self._set_edge(base_code, target_code, Rate.from_value(rate))
+
+    def _add_currency(self, currency: CurrencyDTO) -> None:
+        """
+        Метод добавляет в граф вершину-валюту
+        :param currency: объект класса CurrencyDTO
+        :return: None
+        """
+        if currency.code not in self._currencies:
+            self._currencies[currency.code] = currency
+            self._edges[currency.code] = {}
+
+    def _set_edge(self, base_currency_code: str, target_currency_code: str, rate: Rate) -> None:
+        """
+        Метод записывает курс из БД в виде прямого ребра и, если нужно, обратного ребра
+        :param base_currency_code: код базовой валюты
+        :param target_currency_code: код целевой валюты
+        :param rate: обменный курс
+        :return: None
+        """
+        self._rates[(base_currency_code, target_currency_code)] = rate
+        self._edges[base_currency_code][target_currency_code] = (rate, False)
+        if (target_currency_code, base_currency_code) not in self._rates:
+            self._edges[target_currency_code][base_currency_code] = (rate.inverted(), True)
+
+    def _drop_edge(self, code_from: str, code_to: str) -> None:
+        """
+        Метод пересчитывает ребро code_from -> code_to после удаления курса:
+        если в БД остался курс для обратной пары, ребро становится обратным, иначе удаляется
+        :param code_from: код валюты, из которой идёт ребро
+        :param code_to: код валюты, в которую идёт ребро
+        :return: None
+        """
+        edges = self._edges.get(code_from)
+        if edges is None:
+            return
+        if (code_from, code_to) in self._rates:
+            edges[code_to] = (self._rates[(code_from, code_to)], False)
+        elif (code_to, code_from) in self._rates:
+            edges[code_to] = (self._rates[(code_to, code_from)].inverted(), True)
+        else:
+            edges.pop(code_to, None)
+
+
+rate_graph = RateGraph(
+    max_hops=settings.exchange_max_hops,
+    ttl=settings.rate_graph_ttl,
+    pivots=settings.exchange_pivot_currencies,
+    shared_table=shared_rate_table,
+)
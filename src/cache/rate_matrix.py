@@ -0,0 +1,118 @@
+import math
+from array import array
+
+from src.cache.rate_graph import RateGraph, rate_graph
+
+
+class RateMatrix:
+    """
+    Матрица кросс-курсов для всех пар валют из графа обменных курсов.
+    Коды валют заменяются целочисленными индексами, курсы рёбер хранятся в массиве array('d').
+    Для каждой валюты один раз строится дерево кратчайших путей (те же пути, что выбирает
+    RateGraph.find_path), после чего строка матрицы считается одним проходом по массивам дерева
+    и запоминается уже округлённой, в том виде, в каком она попадает в ответ.
+    Деревья перестраиваются только при изменении набора курсов, а строки - при изменении значений курсов
+    """
+
+    def __init__(self, graph: RateGraph):
+        """
+        :param graph: граф обменных курсов, по которому считается матрица
+        """
+        self._graph = graph
+        self._topology_version: int | None = None
+        self._version: int | None = None
+        self._codes: list[str] = []
+        self._index: dict[str, int] = {}
+        self._edge_index: dict[tuple[str, str], int] = {}
+        self._weights = array("d")
+        self._trees: dict[int, tuple[array, array, array]] = {}
+        self._rows: dict[int, list[float | None]] = {}
+
+    def get(self, codes: list[str] | None = None) -> tuple[list[str], list[list[float | None]]]:
+        """
+        Метод возвращает матрицу кросс-курсов. Значение в строке i и столбце j - сколько единиц валюты j
+        дают за одну единицу валюты i, None - если путь конвертации не найден
+        :param codes: коды валют, для которых нужна матрица (по умолчанию - все валюты графа).
+        Коды, которых нет в графе, пропускаются
+        :return: кортеж (список кодов валют, матрица курсов в том же порядке)
+        """
+        self._sync()
+
+        if codes is None:
+            # вся матрица - готовые строки целиком, без обхода каждой ячейки
+            return list(self._codes), [list(self._row(i)) for i in range(len(self._codes))]
+
+        selected = [self._index[code] for code in codes if code in self._index]
+        matrix = []
+        for i in selected:
+            row = self._row(i)
+            matrix.append([row[j] for j in selected])
+
+        return [self._codes[i] for i in selected], matrix
+
+    def _sync(self) -> None:
+        """
+        Метод сбрасывает закэшированные деревья и строки матрицы, если граф изменился
+        :return: None
+        """
+        graph = self._graph
+        if graph.topology_version != self._topology_version:
+            self._codes = graph.codes
+            self._index = {code: i for i, code in enumerate(self._codes)}
+            self._edge_index = {}
+            self._trees = {}
+            self._topology_version = graph.topology_version
+            self._version = None
+
+        if graph.version != self._version:
+            weights = array("d", bytes(8 * len(self._edge_index)))
+            for code_from, code_to, rate in graph.edges():
+                edge = self._edge_index.setdefault((code_from, code_to), len(self._edge_index))
+                if edge == len(weights):
+                    weights.append(float(rate))
+                else:
+                    weights[edge] = float(rate)
+            self._weights = weights
+            self._rows = {}
+            self._version = graph.version
+
+    def _tree(self, source: int) -> tuple[array, array, array]:
+        """
+        Метод возвращает дерево кратчайших путей от валюты с индексом source
+        в виде трёх массивов одинаковой длины: валюта, предыдущая валюта на пути, ребро между ними.
+        Валюты в массивах идут в порядке обхода, то есть предыдущая валюта всегда стоит раньше
+        :param source: индекс валюты
+        :return: кортеж (nodes, parents, edges)
+        """
+        tree = self._trees.get(source)
+        if tree is None:
+            previous = self._graph.shortest_path_tree(currency_from=self._codes[source])
+            nodes, parents, edges = array("l"), array("l"), array("l")
+            for code, previous_code in previous.items():
+                if previous_code is None:
+                    continue
+                nodes.append(self._index[code])
+                parents.append(self._index[previous_code])
+                edges.append(self._edge_index[(previous_code, code)])
+            tree = self._trees[source] = (nodes, parents, edges)
+        return tree
+
+    def _row(self, source: int) -> list[float | None]:
+        """
+        Метод возвращает строку матрицы для валюты с индексом source
+        :param source: индекс валюты
+        :return: список курсов, округлённых до 6 знаков, None - если путь конвертации не найден
+        """
+        row = self._rows.get(source)
+        if row is None:
+            rates = array("d", [math.nan]) * len(self._codes)
+            rates[source] = 1.0
+            weights = self._weights
+            nodes, parents, edges = self._tree(source)
+            for node, parent, edge in zip(nodes, parents, edges):
+                rates[node] = rates[parent] * weights[edge]
+            row = self._rows[source] = [None if math.isnan(rate) else round(rate, 6) for rate in rates]
+        return row
+
+
+rate_matrix = RateMatrix(graph=rate_graph)
@@ -0,0 +1,135 @@
+import gzip
+import time
+from collections import OrderedDict
+from typing import Hashable
+
+from src.model import settings
+
+
+class RenderedPage:
+    """
+    Готовое тело ответа страницы списка (JSON в bytes) и сведения для заголовка Link.
+    Вариант тела в gzip сжимается при первом запросе с Accept-Encoding: gzip и хранится вместе с ним
+    """
+
+    __slots__ = ("etag", "body", "page_size", "last_id", "created_at", "_gzip_body")
+
+    def __init__(self, etag: str | None, body: bytes, page_size: int, last_id: int | None):
+        """
+        :param etag: ETag версии данных, из которой построена страница, или None, если ETag не выдаётся
+        :param body: тело ответа
+        :param page_size: сколько элементов в странице
+        :param last_id: айди последнего элемента страницы или None, если страница пустая
+        """
+        self.etag = etag
+        self.body = body
+        self.page_size = page_size
+        self.last_id = last_id
+        self.created_at = time.monotonic()
+        self._gzip_body: bytes | None = None
+
+    def gzip_body(self, min_size: int, compress_level: int) -> bytes | None:
+        """
+        Метод возвращает тело ответа, сжатое gzip
+        :param min_size: тела меньше этого размера в байтах не сжимаются
+        :param compress_level: степень сжатия от 1 до 9
+        :return: сжатое тело или None, если тело слишком маленькое
+        """
+        if len(self.body) < min_size:
+            return None
+        if self._gzip_body is None:
+            # mtime=0 - одинаковые байты при каждом сжатии одного и того же тела
+            self._gzip_body = gzip.compress(self.body, compresslevel=compress_level, mtime=0)
+        return self._gzip_body
+
+
+class RenderedPageCache:
+    """
+    Кэш готовых тел ответов страниц списков GET /currencies и GET /exchangeRates. Страница строится из БД
+    и сериализуется один раз на версию данных (src.cache.data_version), дальше тело отдаётся как есть.
+    Все записи принадлежат одной версии: когда ETag версии меняется (после изменения данных методами DAO
+    этого процесса, других воркеров или других узлов), кэш целиком очищается при следующем обращении.
+    Ключ записи - маршрут и параметры страницы (limit, after_id), число записей ограничено, вытеснение по LRU.
+    Без ETag (изменения других процессов не отслеживаются, src.cache.data_version) страницы не кэшируются.
+    Страница старше max_age секунд считается промахом и строится заново, даже если версия данных не менялась,
+    поэтому изменения, которые версию не меняют (сделанные в обход API), видны не позже, чем через max_age
+    """
+
+    def __init__(self, max_size: int, max_age: float):
+        """
+        :param max_size: максимальное число страниц в кэше
+        :param max_age: сколько секунд страница отдаётся из кэша
+        """
+        self.max_size = max_size
+        self.max_age = max_age
+        self._etag: str | None = None
+        self._entries: OrderedDict[Hashable, RenderedPage] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, etag: str | None) -> RenderedPage | None:
+        """
+        Метод возвращает готовую страницу текущей версии данных
+        :param key: маршрут и параметры страницы
+        :param etag: ETag текущей версии данных или None
+        :return: объект класса RenderedPage или None, если страницы нет в кэше
+        """
+        if etag is None:
+            return None
+        if etag != self._etag:
+            self.clear()
+            self._etag = etag
+        page = self._entries.get(key)
+        if page is not None and time.monotonic() - page.created_at > self.max_age:
+            del self._entries[key]
+            self.expirations += 1
+            page = None
+        if page is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return page
+
+    def put(self, key: Hashable, page: RenderedPage) -> None:
+        """
+        Метод сохраняет готовую страницу. Страница версии, которая уже сменилась, не сохраняется
+        :param key: маршрут и параметры страницы
+        :param page: объект класса RenderedPage
+        :return: None
+        """
+        if page.etag is None or page.etag != self._etag:
+            return
+        self._entries[key] = page
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """
+        Метод очищает кэш
+        :return: None
+        """
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Метод возвращает счётчики кэша
+        :return: словарь со счётчиками
+        """
+        return {
+            "size": len(self._entries),
+            "maxSize": self.max_size,
+            "maxAge": self.max_age,
+            "bytes": sum(len(page.body) for page in self._entries.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+rendered_pages = RenderedPageCache(max_size=settings.rendered_pages_max_size, max_age=settings.cache_ttl)
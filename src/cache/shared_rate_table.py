@@ -0,0 +1,515 @@
+import os
+import struct
+import tempfile
+import time
+from contextlib import contextmanager
+from decimal import Decimal, ROUND_HALF_UP
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from typing import NamedTuple
+
+try:
+    import fcntl
+except ImportError:     # Windows: блокировки файлов fcntl нет, общая таблица не используется
+    fcntl = None
+
+from src.dto import CurrencyDTO
+from src.model import settings
+
+
+class SharedSnapshot(NamedTuple):
+    """
+    Согласованный снимок общей таблицы.
+    currencies_loaded_at и rates_loaded_at - время (time.time()) последней загрузки раздела из БД, 0 - раздел пуст
+    """
+    version: int
+    currencies_loaded_at: float
+    rates_loaded_at: float
+    currencies: list[CurrencyDTO]
+    rates: list[tuple[int, int, Decimal]]
+
+
+class SharedChange(NamedTuple):
+    """
+    Изменение таблицы из журнала изменений. version - номер версии таблицы после изменения, kind - вид изменения:
+    "currency" (валюта добавлена или изменена), "currency_removed" (валюта удалена вместе с её курсами),
+    "rate" (курс добавлен или изменён), "rate_removed" (курс удалён)
+    """
+    version: int
+    kind: str
+    currency: CurrencyDTO | None = None
+    currency_id: int | None = None
+    base_currency_id: int | None = None
+    target_currency_id: int | None = None
+    rate: Decimal | None = None
+
+
+class SharedRateTable:
+    """
+    Таблица валют и обменных курсов в разделяемой памяти (multiprocessing.shared_memory), общая для всех
+    воркеров uvicorn на одном сервере. Справочник валют и граф обменных курсов каждого воркера строятся из неё,
+    а не из БД, поэтому БД читается один раз на сервер, а не один раз на воркер.
+
+    Формат фиксированный: заголовок (магическое число, номер версии, время загрузки разделов валют и курсов из БД,
+    число валют и курсов), затем max_currencies записей валют (id, code, sign, name) и max_rates записей курсов
+    (id базовой валюты, id целевой валюты, курс * 10 ** 4 - курс хранится в столбце Numeric(12, 4),
+    поэтому в целых числах он точный). Читатели разбирают записи прямо из буфера
+    разделяемой памяти, без копирования всей таблицы.
+
+    За записями идёт журнал последних log_size изменений (кольцевой буфер): для каждой версии таблицы - вид изменения
+    и изменённая запись. Воркер, который уже построил справочник и граф из таблицы, читает из журнала только
+    изменения после своей версии (changes_since) и применяет их по одному, а не перестраивает всё заново.
+    Загрузка разделов из БД и очистка раздела записываются в журнал как сброс - после него таблица читается целиком.
+
+    Номер версии работает как seqlock: писатель делает его нечётным на время записи и чётным после неё,
+    читатель повторяет чтение, если номер был нечётным или изменился. Писатели разных процессов
+    выполняются по очереди под блокировкой файла (fcntl.flock). Загрузка разделов из БД переписывает
+    таблицу целиком, а изменение одной валюты или одного курса меняет только его запись (_patch),
+    поэтому блокировка держится микросекунды и почти не задерживает цикл событий воркеров
+    """
+
+    _MAGIC = b"CXRATES2"
+    _HEADER = struct.Struct("<8sQddII")
+    _CURRENCY = struct.Struct("<q12s12s200s")
+    _RATE = struct.Struct("<qqq")
+    _CURRENCY_KEY = struct.Struct("<q")     # запись валюты ищется по id
+    _RATE_KEY = struct.Struct("<qq")        # запись курса ищется по id базовой и целевой валюты
+    _LOG_ENTRY = struct.Struct("<QB")       # номер версии и вид изменения, за ними - изменённая запись или её ключ
+    _LOG_RESET, _LOG_CURRENCY, _LOG_CURRENCY_REMOVED, _LOG_RATE, _LOG_RATE_REMOVED = range(5)
+    _READ_ATTEMPTS = 1000
+
+    def __init__(self, name: str, max_currencies: int, max_rates: int, log_size: int = 256):
+        """
+        :param name: имя блока разделяемой памяти, пустая строка - общая таблица не используется
+        :param max_currencies: сколько валют помещается в таблицу
+        :param max_rates: сколько обменных курсов помещается в таблицу
+        :param log_size: сколько последних изменений хранится в журнале
+        """
+        self.name = name
+        self.max_currencies = max_currencies
+        self.max_rates = max_rates
+        self.log_size = log_size
+        self._currencies_offset = self._HEADER.size
+        self._rates_offset = self._currencies_offset + max_currencies * self._CURRENCY.size
+        self._log_offset = self._rates_offset + max_rates * self._RATE.size
+        self._log_entry_size = self._LOG_ENTRY.size + self._CURRENCY.size
+        self.size = self._log_offset + log_size * self._log_entry_size
+        self._shm: SharedMemory | None = None
+        self._enabled = bool(name) and fcntl is not None
+
+    @property
+    def enabled(self) -> bool:
+        """
+        True, если общая таблица используется
+        """
+        return self._enabled
+
+    def version(self) -> int:
+        """
+        :return: номер версии таблицы, 0 - таблица не используется или ещё не заполнена
+        """
+        buffer = self._buffer()
+        if buffer is None:
+            return 0
+        magic, version, *_ = self._HEADER.unpack_from(buffer)
+        return version if magic == self._MAGIC else 0
+
+    def read(self) -> SharedSnapshot | None:
+        """
+        Метод читает согласованный снимок таблицы
+        :return: объект класса SharedSnapshot или None, если таблица не используется, ещё не заполнена
+        или запись в неё не закончилась за _READ_ATTEMPTS попыток (например, писатель завершился во время записи)
+        """
+        buffer = self._buffer()
+        if buffer is None:
+            return None
+
+        for _ in range(self._READ_ATTEMPTS):
+            magic, version, currencies_loaded_at, rates_loaded_at, currency_count, rate_count = (
+                self._HEADER.unpack_from(buffer)
+            )
+            if magic != self._MAGIC:
+                return None
+            if version % 2:
+                time.sleep(0)
+                continue
+
+            currencies, rates = self._unpack(buffer, currency_count, rate_count)
+            if self._HEADER.unpack_from(buffer)[1] == version:
+                return SharedSnapshot(version, currencies_loaded_at, rates_loaded_at, currencies, rates)
+        return None
+
+    def changes_since(self, version: int) -> list[SharedChange] | None:
+        """
+        Метод читает из журнала все изменения таблицы после версии version
+        :param version: номер версии, до которой изменения уже применены
+        :return: список объектов класса SharedChange в порядке изменений (пустой, если версия не менялась)
+        или None, если изменения нужно получить чтением всей таблицы: журнал уже не содержит всех изменений
+        после version, среди них есть сброс, таблица не используется или запись в неё не закончилась
+        """
+        buffer = self._buffer()
+        if buffer is None or not version or version % 2:
+            return None
+
+        for _ in range(self._READ_ATTEMPTS):
+            magic, current_version, *_ = self._HEADER.unpack_from(buffer)
+            if magic != self._MAGIC or current_version < version:
+                return None
+            if current_version % 2:
+                time.sleep(0)
+                continue
+            if current_version - version > 2 * self.log_size:
+                return None
+
+            changes = []
+            for change_version in range(version + 2, current_version + 2, 2):
+                change = self._read_change(buffer, change_version)
+                if change is None:
+                    changes = None
+                    break
+                changes.append(change)
+            if self._HEADER.unpack_from(buffer)[1] == current_version:
+                return changes
+        return None
+
+    def publish_currencies(self, currencies: list[CurrencyDTO]) -> None:
+        """
+        Метод записывает в таблицу все валюты, загруженные из БД
+        :param currencies: список объектов класса CurrencyDTO
+        :return: None
+        """
+        def replace(state: dict) -> None:
+            state["currencies"] = {currency.currency_id: currency for currency in currencies}
+            state["currencies_loaded_at"] = time.time()
+
+        self._update(replace)
+
+    def publish_rates(self, rates: list[tuple[int, int, Decimal]]) -> None:
+        """
+        Метод записывает в таблицу все обменные курсы, загруженные из БД
+        :param rates: список кортежей (id базовой валюты, id целевой валюты, курс)
+        :return: None
+        """
+        def replace(state: dict) -> None:
+            state["rates"] = {(base_id, target_id): rate for base_id, target_id, rate in rates}
+            state["rates_loaded_at"] = time.time()
+
+        self._update(replace)
+
+    def put_currency(self, currency: CurrencyDTO) -> None:
+        """
+        Метод добавляет или изменяет валюту в таблице, если раздел валют заполнен
+        :param currency: объект класса CurrencyDTO
+        :return: None
+        """
+        record = self._CURRENCY.pack(
+            currency.currency_id, currency.code.encode(), currency.sign.encode(), currency.name.encode()
+        )
+        self._patch(rates=False, key=self._CURRENCY_KEY.pack(currency.currency_id), record=record)
+
+    def remove_currency(self, currency_id: int) -> None:
+        """
+        Метод удаляет валюту и все её обменные курсы из таблицы
+        :param currency_id: айди валюты
+        :return: None
+        """
+        def remove(state: dict) -> None:
+            state["currencies"].pop(currency_id, None)
+            state["rates"] = {pair: rate for pair, rate in state["rates"].items() if currency_id not in pair}
+
+        self._update(remove, log_kind=self._LOG_CURRENCY_REMOVED, log_record=self._CURRENCY_KEY.pack(currency_id))
+
+    def put_rate(self, base_currency_id: int, target_currency_id: int, rate: Decimal) -> None:
+        """
+        Метод добавляет или изменяет обменный курс в таблице, если раздел курсов заполнен
+        :param base_currency_id: айди базовой валюты
+        :param target_currency_id: айди целевой валюты
+        :param rate: обменный курс
+        :return: None
+        """
+        self._patch(
+            rates=True,
+            key=self._RATE_KEY.pack(base_currency_id, target_currency_id),
+            record=self._pack_rate(base_currency_id, target_currency_id, Decimal(rate)),
+        )
+
+    def remove_rate(self, base_currency_id: int, target_currency_id: int) -> None:
+        """
+        Метод удаляет обменный курс из таблицы
+        :param base_currency_id: айди базовой валюты
+        :param target_currency_id: айди целевой валюты
+        :return: None
+        """
+        self._patch(rates=True, key=self._RATE_KEY.pack(base_currency_id, target_currency_id), record=None)
+
+    def invalidate_rates(self) -> None:
+        """
+        Метод очищает раздел курсов, при следующем обращении воркер загрузит курсы из БД
+        :return: None
+        """
+        def clear(state: dict) -> None:
+            state["rates"] = {}
+            state["rates_loaded_at"] = 0.0
+
+        self._update(clear)
+
+    def _update(self, change, log_kind: int = _LOG_RESET, log_record: bytes = b"") -> None:
+        """
+        Метод под блокировкой писателей читает таблицу, применяет к ней изменение и записывает новую версию.
+        Если данные не помещаются в таблицу, соответствующий раздел очищается и читается воркерами из БД
+        :param change: функция, изменяющая словарь с ключами "currencies", "rates",
+        "currencies_loaded_at", "rates_loaded_at"
+        :param log_kind: вид изменения для журнала (по умолчанию - сброс, таблица читается целиком)
+        :param log_record: ключ изменённой записи для журнала
+        :return: None
+        """
+        buffer = self._buffer()
+        if buffer is None:
+            return
+
+        with self._writer_lock():
+            magic, version, currencies_loaded_at, rates_loaded_at, currency_count, rate_count = (
+                self._HEADER.unpack_from(buffer)
+            )
+            if magic != self._MAGIC:
+                version, currencies_loaded_at, rates_loaded_at, currency_count, rate_count = 0, 0.0, 0.0, 0, 0
+            currencies, rates = self._unpack(buffer, currency_count, rate_count)
+            state = {
+                "currencies": {currency.currency_id: currency for currency in currencies},
+                "rates": {(base_id, target_id): rate for base_id, target_id, rate in rates},
+                "currencies_loaded_at": currencies_loaded_at,
+                "rates_loaded_at": rates_loaded_at,
+            }
+            change(state)
+            if len(state["currencies"]) > self.max_currencies:
+                state["currencies"], state["currencies_loaded_at"] = {}, 0.0
+                log_kind = self._LOG_RESET
+            if len(state["rates"]) > self.max_rates:
+                state["rates"], state["rates_loaded_at"] = {}, 0.0
+                log_kind = self._LOG_RESET
+
+            # нечётная версия - идёт запись, читатели ждут её окончания
+            self._HEADER.pack_into(
+                buffer, 0, self._MAGIC, version + 1, currencies_loaded_at, rates_loaded_at, currency_count, rate_count
+            )
+            for index, currency in enumerate(state["currencies"].values()):
+                self._CURRENCY.pack_into(
+                    buffer, self._currencies_offset + index * self._CURRENCY.size, currency.currency_id,
+                    currency.code.encode(), currency.sign.encode(), currency.name.encode(),
+                )
+            for index, ((base_id, target_id), rate) in enumerate(state["rates"].items()):
+                position = self._rates_offset + index * self._RATE.size
+                buffer[position:position + self._RATE.size] = self._pack_rate(base_id, target_id, rate)
+            self._write_change(buffer, version + 2, log_kind, log_record)
+            self._HEADER.pack_into(
+                buffer, 0, self._MAGIC, version + 2, state["currencies_loaded_at"], state["rates_loaded_at"],
+                len(state["currencies"]), len(state["rates"]),
+            )
+
+    def _patch(self, rates: bool, key: bytes, record: bytes | None) -> None:
+        """
+        Метод под блокировкой писателей изменяет одну запись раздела на месте, не переписывая всю таблицу:
+        запись с тем же ключом заменяется, новая запись добавляется в конец раздела, удаляемая запись
+        замещается последней записью раздела. Читатели видят изменение целиком благодаря номеру версии.
+        Раздел, который не загружен из БД, не изменяется; если новая запись не помещается в раздел,
+        он очищается и читается воркерами из БД
+        :param rates: True - раздел курсов, False - раздел валют
+        :param key: начало записи, по которому она ищется (айди валюты или айди валют пары)
+        :param record: новая запись или None, чтобы удалить запись с этим ключом
+        :return: None
+        """
+        buffer = self._buffer()
+        if buffer is None:
+            return
+        if rates:
+            offset, record_size, max_count = self._rates_offset, self._RATE.size, self.max_rates
+            loaded_at_field, count_field = 3, 5
+            log_kind = self._LOG_RATE if record is not None else self._LOG_RATE_REMOVED
+        else:
+            offset, record_size, max_count = self._currencies_offset, self._CURRENCY.size, self.max_currencies
+            loaded_at_field, count_field = 2, 4
+            log_kind = self._LOG_CURRENCY if record is not None else self._LOG_CURRENCY_REMOVED
+
+        with self._writer_lock():
+            header = list(self._HEADER.unpack_from(buffer))
+            magic, version = header[0], header[1]
+            if magic != self._MAGIC or not header[loaded_at_field]:
+                return
+            count = min(header[count_field], max_count)
+            index = self._find_record(buffer, offset, record_size, count, key)
+            if record is None and index is None:
+                return
+
+            # нечётная версия - идёт запись, читатели ждут её окончания
+            self._HEADER.pack_into(buffer, 0, magic, version + 1, *header[2:])
+            if record is None:
+                count -= 1
+                if index != count:
+                    last = offset + count * record_size
+                    buffer[offset + index * record_size:offset + (index + 1) * record_size] = (
+                        buffer[last:last + record_size]
+                    )
+            elif index is not None:
+                buffer[offset + index * record_size:offset + (index + 1) * record_size] = record
+            elif count < max_count:
+                buffer[offset + count * record_size:offset + (count + 1) * record_size] = record
+                count += 1
+            else:
+                count, header[loaded_at_field] = 0, 0.0
+                log_kind = self._LOG_RESET
+            self._write_change(buffer, version + 2, log_kind, key if record is None else record)
+            header[1], header[count_field] = version + 2, count
+            self._HEADER.pack_into(buffer, 0, *header)
+
+    def _write_change(self, buffer, version: int, kind: int, record: bytes) -> None:
+        """
+        Метод записывает изменение в журнал. Вызывается писателем, пока номер версии таблицы нечётный
+        :param buffer: буфер разделяемой памяти
+        :param version: номер версии таблицы после изменения
+        :param kind: вид изменения
+        :param record: изменённая запись (для удаления - её ключ)
+        :return: None
+        """
+        position = self._log_offset + (version // 2 % self.log_size) * self._log_entry_size
+        self._LOG_ENTRY.pack_into(buffer, position, version, kind)
+        position += self._LOG_ENTRY.size
+        buffer[position:position + len(record)] = record
+
+    def _read_change(self, buffer, version: int) -> SharedChange | None:
+        """
+        Метод читает из журнала изменение, после которого у таблицы стала версия version
+        :param buffer: буфер разделяемой памяти
+        :param version: номер версии таблицы после изменения
+        :return: объект класса SharedChange или None, если запись журнала уже перезаписана или это сброс
+        """
+        position = self._log_offset + (version // 2 % self.log_size) * self._log_entry_size
+        entry_version, kind = self._LOG_ENTRY.unpack_from(buffer, position)
+        position += self._LOG_ENTRY.size
+        if entry_version != version:
+            return None
+        if kind == self._LOG_CURRENCY:
+            currency = self._currency_dto(*self._CURRENCY.unpack_from(buffer, position))
+            return SharedChange(version, "currency", currency=currency, currency_id=currency.currency_id)
+        if kind == self._LOG_CURRENCY_REMOVED:
+            (currency_id,) = self._CURRENCY_KEY.unpack_from(buffer, position)
+            return SharedChange(version, "currency_removed", currency_id=currency_id)
+        if kind == self._LOG_RATE:
+            base_id, target_id, scaled_rate = self._RATE.unpack_from(buffer, position)
+            return SharedChange(
+                version, "rate", base_currency_id=base_id, target_currency_id=target_id,
+                rate=Decimal(scaled_rate).scaleb(-4),
+            )
+        if kind == self._LOG_RATE_REMOVED:
+            base_id, target_id = self._RATE_KEY.unpack_from(buffer, position)
+            return SharedChange(version, "rate_removed", base_currency_id=base_id, target_currency_id=target_id)
+        return None
+
+    @staticmethod
+    def _find_record(buffer, offset: int, record_size: int, count: int, key: bytes) -> int | None:
+        """
+        Метод ищет в разделе запись, которая начинается с key
+        :param buffer: буфер разделяемой памяти
+        :param offset: смещение раздела
+        :param record_size: размер записи
+        :param count: число записей в разделе
+        :param key: начало записи
+        :return: номер записи или None, если её нет
+        """
+        # поиск подстроки в копии раздела быстрее разбора каждой записи; совпадение засчитывается
+        # только в начале записи
+        records = bytes(buffer[offset:offset + count * record_size])
+        position = records.find(key)
+        while position != -1:
+            if position % record_size == 0:
+                return position // record_size
+            position = records.find(key, position + 1)
+        return None
+
+    def _pack_rate(self, base_currency_id: int, target_currency_id: int, rate: Decimal) -> bytes:
+        """
+        :return: запись обменного курса
+        """
+        return self._RATE.pack(
+            base_currency_id, target_currency_id, int(rate.scaleb(4).to_integral_value(rounding=ROUND_HALF_UP))
+        )
+
+    def _unpack(self, buffer, currency_count: int, rate_count: int):
+        """
+        Метод разбирает записи валют и курсов из буфера
+        :return: кортеж (список объектов CurrencyDTO, список кортежей (id базовой валюты, id целевой валюты, курс))
+        """
+        currency_count = min(currency_count, self.max_currencies)
+        rate_count = min(rate_count, self.max_rates)
+        currencies = [
+            self._currency_dto(*record)
+            for record in self._CURRENCY.iter_unpack(
+                buffer[self._currencies_offset:self._currencies_offset + currency_count * self._CURRENCY.size]
+            )
+        ]
+        rates = [
+            (base_id, target_id, Decimal(scaled_rate).scaleb(-4))
+            for base_id, target_id, scaled_rate in self._RATE.iter_unpack(
+                buffer[self._rates_offset:self._rates_offset + rate_count * self._RATE.size]
+            )
+        ]
+        return currencies, rates
+
+    @staticmethod
+    def _currency_dto(currency_id: int, code: bytes, sign: bytes, name: bytes) -> CurrencyDTO:
+        """
+        :return: объект класса CurrencyDTO из полей записи валюты
+        """
+        return CurrencyDTO.model_construct(
+            currency_id=currency_id,
+            code=code.rstrip(b"\0").decode(errors="replace"),
+            sign=sign.rstrip(b"\0").decode(errors="replace"),
+            name=name.rstrip(b"\0").decode(errors="replace"),
+        )
+
+    def _buffer(self) -> memoryview | None:
+        """
+        Метод подключается к блоку разделяемой памяти, создавая его при первом обращении на сервере
+        :return: буфер разделяемой памяти или None, если общая таблица не используется
+        """
+        if self._shm is not None:
+            return self._shm.buf
+        if not self._enabled:
+            return None
+
+        try:
+            try:
+                shm = SharedMemory(name=self.name, create=True, size=self.size)
+            except FileExistsError:
+                shm = SharedMemory(name=self.name)
+        except OSError:
+            self._enabled = False
+            return None
+        # блок общий для всех воркеров и не должен удаляться при завершении одного из них
+        resource_tracker.unregister(shm._name, "shared_memory")
+        if shm.size < self.size:
+            # блок создан с другими max_currencies / max_rates
+            shm.close()
+            self._enabled = False
+            return None
+
+        self._shm = shm
+        return shm.buf
+
+    @contextmanager
+    def _writer_lock(self):
+        """
+        Межпроцессная блокировка писателей
+        """
+        with open(os.path.join(tempfile.gettempdir(), f"{self.name}.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+shared_rate_table = SharedRateTable(
+    name=settings.shared_rate_table_name,
+    max_currencies=settings.shared_rate_table_max_currencies,
+    max_rates=settings.shared_rate_table_max_rates,
+)
@@ -2,8 +2,14 @@ __all__ = (
     "currencies_router",
     "exchange_rates_router",
     "exchange_router",
+    "internal_router",
+    "subscriptions_router",
+    "ReadYourWritesMiddleware",
 )
 
 from src.controller.currencies_controller import router as currencies_router
 from src.controller.exchange_rates_controller import router as exchange_rates_router
 from src.controller.exchange_controller import router as exchange_router
+from src.controller.internal_controller import router as internal_router
+from src.controller.subscriptions_controller import router as subscriptions_router
+from src.controller.read_your_writes import ReadYourWritesMiddleware
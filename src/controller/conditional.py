@@ -0,0 +1,44 @@
+from fastapi import Request, Response
+
+from src.cache import data_version
+
+
+def get_etag() -> str | None:
+    """
+    Функция возвращает ETag текущей версии данных валют и обменных курсов (src.cache.data_version).
+    Вызывается до чтения данных: если данные изменятся во время чтения, ETag ответа будет старым,
+    и следующий условный запрос получит полный ответ, а не 304
+    :return: ETag в кавычках или None, если изменения других процессов не отслеживаются и ETag не выдаётся
+    """
+    return data_version.etag()
+
+
+def is_not_modified(request: Request, etag: str | None) -> bool:
+    """
+    Функция проверяет заголовок запроса If-None-Match (слабое сравнение, как требует RFC 9110)
+    :param request: объект запроса
+    :param etag: ETag текущей версии данных или None
+    :return: True, если у клиента уже есть эта версия и можно ответить 304
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is None or etag is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def not_modified_response(etag: str) -> Response:
+    """
+    :param etag: ETag текущей версии данных
+    :return: ответ 304 Not Modified без тела
+    """
+    return Response(status_code=304, headers={"ETag": etag})
+
+
+def etag_headers(etag: str | None) -> dict[str, str]:
+    """
+    :param etag: ETag текущей версии данных или None
+    :return: заголовки ответа с ETag или пустой словарь, если ETag не выдаётся
+    """
+    return {} if etag is None else {"ETag": etag}
@@ -1,9 +1,13 @@
-from typing import Annotated, Optional
-from fastapi import APIRouter, Form, Path, Depends, HTTPException
+from typing import Annotated, Literal, Optional
+from fastapi import APIRouter, Form, Path, Depends, HTTPException, Query, Request, Response
 
-from src.dao import DaoCurrencyRepository, dao_currency_repository
+from src.cache import rendered_pages
+from src.controller.conditional import get_etag, is_not_modified, not_modified_response, etag_headers
+from src.controller.pagination import get_page_limit, set_next_page_link
+from src.controller.responses import dto_response, render_page, rendered_page_response
+from src.dao import DaoCurrencyRepository, dao_currency_repository, dao_currency_read_repository
+from src.dto import CurrencyDTO
 from src.exception import CurrencyException
-from src.model import Currency
 from src.service import CurrencyService, currency_service
 
 
@@ -12,24 +16,43 @@ router = APIRouter(tags=["currencies"])
 
 @router.get("/currencies")
 async def get_all_currencies(
-    dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_repository),
-    currency_service_obj: CurrencyService = Depends(currency_service),
+    request: Request,
+    http_response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    after_id: Optional[int] = Query(None),
+    dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_read_repository),
 ):
-    all_currencies_list = await dao_currency_obj.find_all()
-    if isinstance(all_currencies_list, list):
-        response = [currency_service_obj.get_currency_dto(currency) for currency in all_currencies_list]
-        return response
-    else:
-        response = all_currencies_list
-        raise HTTPException(
-            status_code=response.code,
-            detail={"message": response.message}
-        )
+    etag = get_etag()
+    if is_not_modified(request=request, etag=etag):
+        return not_modified_response(etag=etag)
+
+    limit = get_page_limit(limit)
+    page_key = ("currencies", limit, after_id)
+    page = rendered_pages.get(key=page_key, etag=etag)
+    if page is None:
+        response = await dao_currency_obj.find_all(limit=limit, after_id=after_id)
+        if isinstance(response, list):
+            page = render_page(etag=etag, content=response, last_id=response[-1].currency_id if response else None)
+            rendered_pages.put(key=page_key, page=page)
+        else:
+            raise HTTPException(
+                status_code=response.code,
+                detail={"message": response.message}
+            )
+
+    set_next_page_link(
+        request=request,
+        response=http_response,
+        limit=limit,
+        page_size=page.page_size,
+        last_id=page.last_id,
+    )
+    return rendered_page_response(request=request, page=page, http_response=http_response)
 
 
 @router.get("/currency")
 async def get_currency_by_empty_code(
-    dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_repository),
+    dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_read_repository),
 ):
     response = await dao_currency_obj.find_by_code(code="")
 
@@ -41,14 +64,19 @@ async def get_currency_by_empty_code(
 
 @router.get("/currency/{code}")
 async def get_currency_by_code(
+    request: Request,
+    http_response: Response,
     code: Annotated[str, Path(max_length=3)],
-    dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_repository),
-    currency_service_obj: CurrencyService = Depends(currency_service),
+    dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_read_repository),
 ):
+    etag = get_etag()
+    if is_not_modified(request=request, etag=etag):
+        return not_modified_response(etag=etag)
+
     response = await dao_currency_obj.find_by_code(code=code)
-    if isinstance(response, Currency):
-        currency = currency_service_obj.get_currency_dto(response)
-        return currency
+    if isinstance(response, CurrencyDTO):
+        http_response.headers.update(etag_headers(etag))
+        return dto_response(content=response, http_response=http_response)
     else:
         raise CurrencyException(
             message=response.message,
@@ -62,16 +90,35 @@ async def create_currency(
     code: Annotated[Optional[str], Form(max_length=3)] = "",
     sign: Annotated[Optional[str], Form(max_length=5)] = "",
     dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_repository),
-    currency_service_obj: CurrencyService = Depends(currency_service),
 ):
     response = await dao_currency_obj.create_currency(
         currency_name=name,
         currency_code=code,
         currency_sign=sign,
     )
-    if isinstance(response, Currency):
-        currency = currency_service_obj.get_currency_dto(response)
-        return currency
+    if isinstance(response, CurrencyDTO):
+        return dto_response(content=response, status_code=201)
+    else:
+        raise CurrencyException(
+            message=response.message,
+            status_code=response.code
+        )
+
+
+@router.post("/currencies/import")
+async def import_currencies(
+    request: Request,
+    file_format: Annotated[Literal["csv", "ndjson"], Query(alias="format")] = "csv",
+    dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_repository),
+    currency_service_obj: CurrencyService = Depends(currency_service),
+):
+    response = await currency_service_obj.import_currencies(
+        chunks=request.stream(),
+        file_format=file_format,
+        dao_currency_obj=dao_currency_obj,
+    )
+    if isinstance(response, dict):
+        return response
     else:
         raise CurrencyException(
             message=response.message,
@@ -83,12 +130,10 @@ async def create_currency(
 async def delete_currency(
     code: Annotated[Optional[str], Form(max_length=3)] = "",
     dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_repository),
-    currency_service_obj: CurrencyService = Depends(currency_service),
 ):
     response = await dao_currency_obj.delete_currency(code=code)
-    if isinstance(response, Currency):
-        currency = currency_service_obj.get_currency_dto(response)
-        return currency
+    if isinstance(response, CurrencyDTO):
+        return dto_response(content=response)
     else:
         raise CurrencyException(
             message=response.message,
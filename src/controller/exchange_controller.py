@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Depends, Query
+import datetime
+from typing import Optional
 
-from src.dao import DaoCurrencyRepository, DaoExchangeRepository, dao_currency_repository, dao_exchange_repository
-from src.service import ExchangeService, exchange_service, CurrencyService, currency_service
+from fastapi import APIRouter, Depends, Query, Request
+
+from src.controller.responses import dto_response
+from src.dao import DaoExchangeRepository, dao_exchange_read_repository
+from src.service import ExchangeService, exchange_service
 from src.exception import ExchangerateException
 from src.dto import ExchangeResponse
 
@@ -14,25 +18,50 @@ async def get_exchange(
     currency_from: str = Query(..., alias="from"),
     currency_to: str = Query(..., alias="to"),
     amount: float = Query(...),
+    at: Optional[datetime.datetime] = Query(None),
     exchange_service_obj: ExchangeService = Depends(exchange_service),
-    dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_repository),
-    dao_exchange_obj: DaoExchangeRepository = Depends(dao_exchange_repository),
-    currency_service_obj: CurrencyService = Depends(currency_service),
+    dao_exchange_obj: DaoExchangeRepository = Depends(dao_exchange_read_repository),
 ):
     response = await exchange_service_obj.convert_currency(
         currency_from=currency_from,
         currency_to=currency_to,
         amount=amount,
-        dao_currency_obj=dao_currency_obj,
-        dao_exchange_obj=dao_exchange_obj
+        dao_exchange_obj=dao_exchange_obj,
+        at=at,
     )
 
     if isinstance(response, ExchangeResponse):
         exchange = await exchange_service_obj.get_exchange_dto(
             exchange_obj=response,
-            currency_service_obj=currency_service_obj
         )
-        return exchange
+        return dto_response(content=exchange)
+    else:
+        raise ExchangerateException(
+            message=response.message,
+            status_code=response.code
+        )
+
+
+@router.post("/exchange/batch")
+async def get_exchange_batch(
+    request: Request,
+    exchange_service_obj: ExchangeService = Depends(exchange_service),
+    dao_exchange_obj: DaoExchangeRepository = Depends(dao_exchange_read_repository),
+):
+    items = exchange_service_obj.parse_batch(await request.body())
+    if isinstance(items, list):
+        response = await exchange_service_obj.convert_currency_batch(
+            items=items,
+            dao_exchange_obj=dao_exchange_obj,
+        )
+    else:
+        response = items
+
+    if isinstance(response, list):
+        exchange_list = exchange_service_obj.get_batch_response(
+            results=response,
+        )
+        return dto_response(content=exchange_list)
     else:
         raise ExchangerateException(
             message=response.message,
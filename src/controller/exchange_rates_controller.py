@@ -1,43 +1,174 @@
+import datetime
 import decimal
-from typing import Annotated, Optional
+from contextlib import aclosing
+from typing import Annotated, AsyncGenerator, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Path, Form
+from fastapi import APIRouter, Depends, HTTPException, Path, Form, Query, Request, Response
+from fastapi.responses import JSONResponse
 
+from src.cache import rendered_pages
+from src.controller.conditional import get_etag, is_not_modified, not_modified_response, etag_headers
+from src.controller.pagination import get_page_limit, set_next_page_link
+from src.controller.responses import dto_response, dto_stream_response, render_page, rendered_page_response
 from src.dao import DaoExchangeRepository, dao_exchange_repository, DaoCurrencyRepository, dao_currency_repository
+from src.dao import dao_exchange_read_repository, dao_currency_read_repository, ExchangeRateRow
 from src.exception import ExchangerateException
-from src.model import ExchangeRate
-from src.service import exchange_rate_service, ExchangeRateService, CurrencyService, currency_service
+from src.dto import ErrorResponse, ExchangeRateDTO, ExchangeRateOhlcDTO
+from src.model import ExchangeRate, db_helper, settings
+from src.service import exchange_rate_service, ExchangeRateService, exchange_service, ExchangeService
 
 router = APIRouter(tags=["exchange_rates"])
 
 
+async def _stream_exchange_rate_dto_lists(
+    after_id: int | None,
+    exchange_rate_service_obj: ExchangeRateService,
+) -> AsyncGenerator[list[ExchangeRateDTO] | ErrorResponse, None]:
+    """
+    Функция по частям читает все обменные курсы для потокового ответа. Сессия БД открывается здесь, а не берётся
+    из зависимости: зависимости с yield завершаются до отправки тела потокового ответа (FastAPI >= 0.106),
+    а серверный курсор читается всё время отправки. Сессия закрывается, когда генератор закрывают
+    :param after_id: айди курса, после которого начинается список, или None
+    :param exchange_rate_service_obj: здесь передается зависимость на объект класса ExchangeRateService
+    :return: асинхронный генератор списков объектов класса ExchangeRateDTO; при ошибке последним идёт ErrorResponse
+    """
+    async with db_helper.read_session() as session:
+        row_chunks = DaoExchangeRepository(session=session).stream_all(
+            chunk_size=settings.exchange_rates_stream_chunk_size,
+            after_id=after_id,
+        )
+        # вложенные генераторы закрываются до сессии, чтобы курсор не пережил её соединение
+        async with aclosing(row_chunks), aclosing(exchange_rate_service_obj.stream_exchange_rate_dto_lists(
+            chunks=row_chunks,
+            dao_currency_obj=DaoCurrencyRepository(session=session),
+        )) as chunks:
+            async for chunk in chunks:
+                yield chunk
+
+
 @router.get("/exchangeRates")
 async def get_all_exchange_rates(
+    request: Request,
+    http_response: Response,
+    limit: Optional[int] = Query(None, ge=1),
+    after_id: Optional[int] = Query(None),
+    stream: Optional[Literal["ndjson", "json"]] = Query(None),
+    dao_exchange_obj: DaoExchangeRepository = Depends(dao_exchange_read_repository),
+    exchange_rate_service_obj: ExchangeRateService = Depends(exchange_rate_service),
+    dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_read_repository),
+):
+    etag = get_etag()
+    if is_not_modified(request=request, etag=etag):
+        return not_modified_response(etag=etag)
+
+    if stream is not None:
+        # весь список одним потоком; первая часть читается до отправки заголовков, чтобы ошибку БД вернуть кодом ответа
+        chunks = _stream_exchange_rate_dto_lists(after_id=after_id, exchange_rate_service_obj=exchange_rate_service_obj)
+        first_chunk = await anext(chunks, [])
+        if isinstance(first_chunk, ErrorResponse):
+            await chunks.aclose()
+            raise HTTPException(
+                status_code=first_chunk.code,
+                detail={"message": first_chunk.message}
+            )
+        http_response.headers.update(etag_headers(etag))
+        return dto_stream_response(
+            first_chunk=first_chunk,
+            chunks=chunks,
+            stream_format=stream,
+            http_response=http_response,
+        )
+
+    limit = get_page_limit(limit)
+    page_key = ("exchangeRates", limit, after_id)
+    page = rendered_pages.get(key=page_key, etag=etag)
+    if page is None:
+        response = await dao_exchange_obj.find_all(limit=limit, after_id=after_id)
+        if isinstance(response, list):
+            response = await exchange_rate_service_obj.get_exchange_rate_dto_list(
+                exchange_rates=response,
+                dao_currency_obj=dao_currency_obj,
+            )
+
+        if isinstance(response, list):
+            page = render_page(
+                etag=etag,
+                content=response,
+                last_id=response[-1].exchange_rate_id if response else None,
+            )
+            rendered_pages.put(key=page_key, page=page)
+        else:
+            raise HTTPException(
+                status_code=response.code,
+                detail={"message": response.message}
+            )
+
+    set_next_page_link(
+        request=request,
+        response=http_response,
+        limit=limit,
+        page_size=page.page_size,
+        last_id=page.last_id,
+    )
+    return rendered_page_response(request=request, page=page, http_response=http_response)
+
+
+@router.get("/exchangeRates/matrix")
+async def get_cross_rate_matrix(
+    request: Request,
+    codes: Optional[str] = Query(None),
+    dao_exchange_obj: DaoExchangeRepository = Depends(dao_exchange_read_repository),
+    exchange_rate_service_obj: ExchangeRateService = Depends(exchange_rate_service),
+):
+    etag = get_etag()
+    if is_not_modified(request=request, etag=etag):
+        return not_modified_response(etag=etag)
+
+    codes_list = [code.strip() for code in codes.split(",") if code.strip()] if codes else None
+    response = await exchange_rate_service_obj.get_cross_rate_matrix(
+        codes=codes_list,
+        dao_exchange_obj=dao_exchange_obj,
+    )
+    if isinstance(response, dict):
+        # матрица может быть большой, поэтому отдаём её сразу через json без jsonable_encoder
+        return JSONResponse(content=response, headers=etag_headers(etag))
+    else:
+        raise ExchangerateException(
+            message=response.message,
+            status_code=response.code
+        )
+
+
+@router.post("/exchangeRates/bulk")
+async def upsert_exchange_rates(
+    request: Request,
     dao_exchange_obj: DaoExchangeRepository = Depends(dao_exchange_repository),
     exchange_rate_service_obj: ExchangeRateService = Depends(exchange_rate_service),
     dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_repository),
-    currency_service_obj: CurrencyService = Depends(currency_service),
+    exchange_service_obj: ExchangeService = Depends(exchange_service),
 ):
-    all_exchangerates_list = await dao_exchange_obj.find_all()
-    if isinstance(all_exchangerates_list, list):
-        response = [await exchange_rate_service_obj.get_exchange_rate_dto(
-            exchange_rate=exchange_rate,
-            currency_service_obj=currency_service_obj,
+    items = exchange_service_obj.parse_batch(await request.body())
+    if isinstance(items, list):
+        response = await exchange_rate_service_obj.upsert_exchange_rates(
+            items=items,
+            dao_exchange_obj=dao_exchange_obj,
             dao_currency_obj=dao_currency_obj,
-        ) for exchange_rate in all_exchangerates_list
-        ]
-        return response
+        )
+    else:
+        response = items
+
+    if isinstance(response, list):
+        return dto_response(content=response)
     else:
-        response = all_exchangerates_list
-        raise HTTPException(
-            status_code=response.code,
-            detail={"message": response.message}
+        raise ExchangerateException(
+            message=response.message,
+            status_code=response.code
         )
 
 
 @router.get("/exchangeRate")
 async def get_exchange_rates_by_empty_code(
-    dao_exchange_obj: DaoExchangeRepository = Depends(dao_exchange_repository),
+    dao_exchange_obj: DaoExchangeRepository = Depends(dao_exchange_read_repository),
 ):
     response = await dao_exchange_obj.find_by_codes(base_currency_code="", target_currency_code="")
 
@@ -49,25 +180,64 @@ async def get_exchange_rates_by_empty_code(
 
 @router.get("/exchangeRate/{currency_codes}")
 async def get_exchange_rates_by_currency_codes(
+    request: Request,
+    http_response: Response,
     currency_codes: Annotated[str, Path(max_length=6)],
-    dao_exchange_obj: DaoExchangeRepository = Depends(dao_exchange_repository),
+    dao_exchange_obj: DaoExchangeRepository = Depends(dao_exchange_read_repository),
     exchange_rate_service_obj: ExchangeRateService = Depends(exchange_rate_service),
-    dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_repository),
-    currency_service_obj: CurrencyService = Depends(currency_service),
+    dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_read_repository),
 ):
+    etag = get_etag()
+    if is_not_modified(request=request, etag=etag):
+        return not_modified_response(etag=etag)
+
     base_currency_code = currency_codes[:3]
     target_currency_code = currency_codes[3:]
     response = await dao_exchange_obj.find_by_codes(
         base_currency_code=base_currency_code,
-        target_currency_code=target_currency_code
+        target_currency_code=target_currency_code,
+        rows_only=True,
     )
-    if isinstance(response, ExchangeRate):
-        exchange_rate = await exchange_rate_service_obj.get_exchange_rate_dto(
+    if isinstance(response, ExchangeRateRow):
+        response = await exchange_rate_service_obj.get_exchange_rate_dto(
             exchange_rate=response,
-            currency_service_obj=currency_service_obj,
             dao_currency_obj=dao_currency_obj,
         )
-        return exchange_rate
+
+    if isinstance(response, ExchangeRateDTO):
+        http_response.headers.update(etag_headers(etag))
+        return dto_response(content=response, http_response=http_response)
+    else:
+        raise ExchangerateException(
+            message=response.message,
+            status_code=response.code
+        )
+
+
+@router.get("/exchangeRate/{currency_codes}/ohlc")
+async def get_exchange_rate_ohlc(
+    currency_codes: Annotated[str, Path(max_length=6)],
+    interval: Literal["minute", "hour", "day"] = Query("hour"),
+    limit: Optional[int] = Query(None, ge=1),
+    start: Optional[datetime.datetime] = Query(None, alias="from"),
+    end: Optional[datetime.datetime] = Query(None, alias="to"),
+    dao_exchange_obj: DaoExchangeRepository = Depends(dao_exchange_read_repository),
+    exchange_rate_service_obj: ExchangeRateService = Depends(exchange_rate_service),
+    dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_read_repository),
+):
+    response = await exchange_rate_service_obj.get_ohlc(
+        base_currency_code=currency_codes[:3],
+        target_currency_code=currency_codes[3:],
+        interval=interval,
+        limit=get_page_limit(limit) or settings.page_max_limit,
+        start=start,
+        end=end,
+        dao_exchange_obj=dao_exchange_obj,
+        dao_currency_obj=dao_currency_obj,
+    )
+
+    if isinstance(response, ExchangeRateOhlcDTO):
+        return response
     else:
         raise ExchangerateException(
             message=response.message,
@@ -83,7 +253,6 @@ async def create_exchange_rate(
     dao_exchange_obj: DaoExchangeRepository = Depends(dao_exchange_repository),
     exchange_rate_service_obj: ExchangeRateService = Depends(exchange_rate_service),
     dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_repository),
-    currency_service_obj: CurrencyService = Depends(currency_service),
 ):
     response = await dao_exchange_obj.create_exchange_rate(
         base_currency_code=baseCurrencyCode,
@@ -92,12 +261,13 @@ async def create_exchange_rate(
         dao_currency_obj=dao_currency_obj,
     )
     if isinstance(response, ExchangeRate):
-        exchange_rate = await exchange_rate_service_obj.get_exchange_rate_dto(
+        response = await exchange_rate_service_obj.get_exchange_rate_dto(
             exchange_rate=response,
-            currency_service_obj=currency_service_obj,
             dao_currency_obj=dao_currency_obj,
         )
-        return exchange_rate
+
+    if isinstance(response, ExchangeRateDTO):
+        return dto_response(content=response, status_code=201)
     else:
         raise ExchangerateException(
             message=response.message,
@@ -112,7 +282,6 @@ async def get_exchange_rates_by_currency_codes(
     dao_exchange_obj: DaoExchangeRepository = Depends(dao_exchange_repository),
     exchange_rate_service_obj: ExchangeRateService = Depends(exchange_rate_service),
     dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_repository),
-    currency_service_obj: CurrencyService = Depends(currency_service),
 ):
     base_currency_code = currency_codes[:3]
     target_currency_code = currency_codes[3:]
@@ -124,12 +293,13 @@ async def get_exchange_rates_by_currency_codes(
     )
 
     if isinstance(response, ExchangeRate):
-        exchange_rate = await exchange_rate_service_obj.get_exchange_rate_dto(
+        response = await exchange_rate_service_obj.get_exchange_rate_dto(
             exchange_rate=response,
-            currency_service_obj=currency_service_obj,
             dao_currency_obj=dao_currency_obj,
         )
-        return exchange_rate
+
+    if isinstance(response, ExchangeRateDTO):
+        return dto_response(content=response)
     else:
         raise ExchangerateException(
             message=response.message,
@@ -143,7 +313,6 @@ async def get_exchange_rates_by_currency_codes(
     dao_exchange_obj: DaoExchangeRepository = Depends(dao_exchange_repository),
     exchange_rate_service_obj: ExchangeRateService = Depends(exchange_rate_service),
     dao_currency_obj: DaoCurrencyRepository = Depends(dao_currency_repository),
-    currency_service_obj: CurrencyService = Depends(currency_service),
 ):
     base_currency_code = currency_codes[:3]
     target_currency_code = currency_codes[3:]
@@ -154,12 +323,13 @@ async def get_exchange_rates_by_currency_codes(
     )
 
     if isinstance(response, ExchangeRate):
-        exchange_rate = await exchange_rate_service_obj.get_exchange_rate_dto(
+        response = await exchange_rate_service_obj.get_exchange_rate_dto(
             exchange_rate=response,
-            currency_service_obj=currency_service_obj,
             dao_currency_obj=dao_currency_obj,
         )
-        return exchange_rate
+
+    if isinstance(response, ExchangeRateDTO):
+        return dto_response(content=response)
     else:
         raise ExchangerateException(
             message=response.message,
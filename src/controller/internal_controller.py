@@ -0,0 +1,22 @@
+from fastapi import APIRouter
+
+from src.cache import quote_cache, cache_backend, rendered_pages, rate_broadcaster
+from src.model import db_helper
+
+
+router = APIRouter(tags=["internal"])
+
+
+@router.get("/internal/cache")
+async def get_cache_stats():
+    return {
+        "quotes": quote_cache.stats(),
+        "backend": cache_backend.stats(),
+        "pages": rendered_pages.stats(),
+        "subscriptions": rate_broadcaster.stats(),
+    }
+
+
+@router.get("/internal/pool")
+async def get_pool_stats():
+    return db_helper.pool_stats()
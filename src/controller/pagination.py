@@ -0,0 +1,39 @@
+from fastapi import Request, Response
+
+from src.model import settings
+
+
+def get_page_limit(limit: int | None) -> int | None:
+    """
+    Функция возвращает размер страницы списка: переданный limit, но не больше settings.page_max_limit,
+    или settings.page_default_limit, если limit не передан. По умолчанию page_default_limit не задан,
+    и без limit возвращается весь список, как до появления пагинации
+    :param limit: размер страницы из параметров запроса
+    :return: размер страницы или None - весь список
+    """
+    if limit is None:
+        return settings.page_default_limit
+    return min(limit, settings.page_max_limit)
+
+
+def set_next_page_link(
+    request: Request,
+    response: Response,
+    limit: int | None,
+    page_size: int,
+    last_id: int | None,
+) -> None:
+    """
+    Функция добавляет в ответ заголовок Link со ссылкой на следующую страницу списка (rel="next").
+    Страница неполная - значит она последняя, и ссылка не добавляется
+    :param request: объект запроса
+    :param response: объект ответа
+    :param limit: размер страницы или None - весь список
+    :param page_size: сколько элементов в текущей странице
+    :param last_id: айди последнего элемента текущей страницы
+    :return: None
+    """
+    if limit is None or page_size < limit or last_id is None:
+        return
+    next_url = request.url.include_query_params(limit=limit, after_id=last_id)
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
@@ -0,0 +1,62 @@
+import math
+import time
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.model import db_helper
+
+
+LAST_WRITE_COOKIE = "last_write"
+
+
+def parse_last_write(cookie_header: str | None) -> float | None:
+    """
+    Функция читает из заголовка Cookie время последней записи клиента
+    :param cookie_header: значение заголовка Cookie или None
+    :return: время (time.time()) или None, если cookie нет или значение некорректно
+    """
+    if not cookie_header:
+        return None
+    try:
+        last_write_at = float(cookie_parser(cookie_header).get(LAST_WRITE_COOKIE, ""))
+    except ValueError:
+        return None
+    return last_write_at if math.isfinite(last_write_at) else None
+
+
+class ReadYourWritesMiddleware:
+    """
+    Middleware, который даёт клиенту читать свои изменения, даже если реплики отстают.
+    Ответ на запрос, в котором был commit в основную БД, выставляет cookie last_write со временем записи.
+    Пока с этого времени не прошло db_read_your_writes_seconds, запросы с этим cookie читают из основной БД,
+    на каком бы воркере или сервере они ни выполнялись, а запросы других клиентов по-прежнему идут на реплики.
+    Время берётся по часам сервера (time.time()), поэтому часы серверов приложения должны быть синхронизированы
+    """
+
+    def __init__(self, app: ASGIApp):
+        """
+        :param app: ASGI-приложение
+        """
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or db_helper.read_your_writes_seconds <= 0 or not db_helper.replica_engines:
+            await self.app(scope, receive, send)
+            return
+
+        cookie_header = next((value.decode("latin-1") for name, value in scope["headers"] if name == b"cookie"), None)
+        consistency = db_helper.start_request(last_write_at=parse_last_write(cookie_header))
+
+        async def send_with_cookie(message: Message) -> None:
+            if message["type"] == "http.response.start" and consistency.committed_at is not None:
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Set-Cookie",
+                    f"{LAST_WRITE_COOKIE}={consistency.committed_at:.6f}; "
+                    f"Max-Age={math.ceil(db_helper.read_your_writes_seconds)}; Path=/; HttpOnly; SameSite=Lax",
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
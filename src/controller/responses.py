@@ -0,0 +1,161 @@
+from typing import Any, AsyncGenerator, AsyncIterator, Literal
+
+import pydantic_core
+from fastapi import Request, Response
+from fastapi.responses import StreamingResponse
+
+from src.cache import RenderedPage
+from src.dto import ErrorResponse
+from src.model import settings
+
+
+class DTOResponse(Response):
+    """
+    JSON-ответ из объектов DTO (и списков, словарей с ними). Тело сериализуется сразу в bytes
+    сериализатором pydantic-core (на Rust) с псевдонимами полей (id, baseCurrency, ...), без промежуточного
+    jsonable_encoder FastAPI и без повторной валидации объектов DTO. Результат тот же, что у JSONResponse
+    """
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return pydantic_core.to_json(content, by_alias=True)
+
+
+def dto_response(content: Any, http_response: Response | None = None, status_code: int = 200) -> DTOResponse:
+    """
+    Функция создаёт ответ DTOResponse. Заголовки, заданные в параметре маршрута Response (Link, ETag),
+    переносятся в него, так как FastAPI не переносит их в возвращённый маршрутом объект ответа
+    :param content: объект DTO, список или словарь с объектами DTO
+    :param http_response: объект Response из параметров маршрута или None
+    :param status_code: код ответа
+    :return: объект класса DTOResponse
+    """
+    response = DTOResponse(content=content, status_code=status_code)
+    if http_response is not None:
+        response.headers.raw.extend(http_response.headers.raw)
+    return response
+
+
+def render_page(etag: str | None, content: list, last_id: int | None) -> RenderedPage:
+    """
+    Функция сериализует страницу списка DTO для кэша готовых страниц (src.cache.rendered_pages)
+    :param etag: ETag версии данных, прочитанной до запроса страницы из БД, или None, если ETag не выдаётся
+    :param content: список объектов DTO
+    :param last_id: айди последнего элемента страницы или None, если страница пустая
+    :return: объект класса RenderedPage
+    """
+    return RenderedPage(etag=etag, body=DTOResponse(content=content).body, page_size=len(content), last_id=last_id)
+
+
+def accepts_gzip(request: Request) -> bool:
+    """
+    Функция проверяет, принимает ли клиент ответ в gzip (заголовок Accept-Encoding, q=0 - не принимает)
+    :param request: объект запроса
+    :return: True, если ответ можно сжать gzip
+    """
+    qualities = {}
+    for item in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
+
+
+def rendered_page_response(request: Request, page: RenderedPage, http_response: Response) -> Response:
+    """
+    Функция создаёт ответ из готовой страницы без повторной сериализации. Если клиент принимает gzip,
+    отдаётся сжатое тело со слабым ETag (W/), так как байты ответа отличаются от несжатого
+    :param request: объект запроса
+    :param page: объект класса RenderedPage
+    :param http_response: объект Response из параметров маршрута (заголовок Link)
+    :return: объект класса Response
+    """
+    gzip_body = None
+    if accepts_gzip(request):
+        gzip_body = page.gzip_body(
+            min_size=settings.rendered_pages_gzip_min_size,
+            compress_level=settings.rendered_pages_gzip_level,
+        )
+    if gzip_body is not None:
+        response = Response(content=gzip_body, media_type="application/json")
+        response.headers["Content-Encoding"] = "gzip"
+        if page.etag is not None:
+            response.headers["ETag"] = f"W/{page.etag}"
+    else:
+        response = Response(content=page.body, media_type="application/json")
+        if page.etag is not None:
+            response.headers["ETag"] = page.etag
+    response.headers["Vary"] = "Accept-Encoding"
+    response.headers.raw.extend(http_response.headers.raw)
+    return response
+
+
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "json": "application/json"}
+
+
+async def _encode_stream(
+    first_chunk: list,
+    chunks: AsyncGenerator[list | ErrorResponse, None],
+    stream_format: Literal["ndjson", "json"],
+) -> AsyncIterator[bytes]:
+    """
+    Функция сериализует части списка DTO по мере их получения: в NDJSON (по объекту в строке)
+    или в один массив JSON, который дописывается частями
+    :param first_chunk: первая часть, уже прочитанная до отправки заголовков
+    :param chunks: асинхронный генератор остальных частей, закрывается по окончании или обрыве ответа
+    :param stream_format: "ndjson" или "json"
+    :return: асинхронный итератор частей тела ответа
+    """
+    try:
+        if stream_format == "json":
+            yield b"["
+        separator = b""
+        chunk = first_chunk
+        while chunk is not None:
+            if isinstance(chunk, ErrorResponse):
+                # заголовки ответа уже отправлены: соединение обрывается, и клиент получает незавершённое тело
+                raise RuntimeError(chunk.message)
+            if chunk and stream_format == "json":
+                # массив из части без скобок дописывается к общему массиву через запятую
+                yield separator + pydantic_core.to_json(chunk, by_alias=True)[1:-1]
+                separator = b","
+            elif chunk:
+                yield b"".join(pydantic_core.to_json(item, by_alias=True) + b"\n" for item in chunk)
+            chunk = await anext(chunks, None)
+        if stream_format == "json":
+            yield b"]"
+    finally:
+        # при обрыве соединения итератор частей закрывается сразу, а с ним - курсор и сессия БД
+        await chunks.aclose()
+
+
+def dto_stream_response(
+    first_chunk: list,
+    chunks: AsyncGenerator[list | ErrorResponse, None],
+    stream_format: Literal["ndjson", "json"],
+    http_response: Response | None = None,
+) -> StreamingResponse:
+    """
+    Функция создаёт потоковый ответ из частей списка DTO. Каждая часть отправляется клиенту сразу
+    после сериализации, поэтому память не зависит от длины списка
+    :param first_chunk: первая часть списка объектов DTO
+    :param chunks: асинхронный генератор остальных частей; ErrorResponse обрывает ответ
+    :param stream_format: "ndjson" (application/x-ndjson) или "json" (application/json)
+    :param http_response: объект Response из параметров маршрута или None
+    :return: объект класса StreamingResponse
+    """
+    response = StreamingResponse(
+        content=_encode_stream(first_chunk=first_chunk, chunks=chunks, stream_format=stream_format),
+        media_type=STREAM_MEDIA_TYPES[stream_format],
+    )
+    if http_response is not None:
+        response.headers.raw.extend(http_response.headers.raw)
+    return response
@@ -0,0 +1,120 @@
+import asyncio
+from typing import AsyncIterator, Optional
+
+from fastapi import APIRouter, Query, WebSocket
+from fastapi.responses import StreamingResponse
+
+from src.cache import RateSubscription, rate_broadcaster
+from src.dto import ErrorResponse
+from src.exception import ExchangerateException
+from src.model import settings
+
+
+router = APIRouter(tags=["subscriptions"])
+
+
+def parse_pairs(pairs: str | None) -> frozenset[str] | None | ErrorResponse:
+    """
+    Функция разбирает список валютных пар подписки
+    :param pairs: коды валютных пар через запятую (например "USDEUR,GBPRUB") или None
+    :return: множество кодов пар, None - подписка на все пары, или ErrorResponse
+    """
+    if not pairs:
+        return None
+    pair_set = frozenset(pair.strip() for pair in pairs.split(",") if pair.strip())
+    if not pair_set or any(len(pair) != 6 for pair in pair_set):
+        return ErrorResponse(code=400, message="Неверный код валютной пары")
+    return pair_set
+
+
+async def _sse_events(pairs: frozenset[str] | None) -> AsyncIterator[bytes]:
+    """
+    Функция отдаёт сообщения подписки в формате Server-Sent Events, пока клиент не отключится
+    или не будет отключён как медленный. Если изменений нет, раз в settings.rate_subscription_keepalive
+    секунд отправляется комментарий, чтобы соединение не закрыли прокси
+    :param pairs: коды валютных пар или None - все пары
+    :return: асинхронный итератор частей тела ответа
+    """
+    subscription = rate_broadcaster.subscribe(pairs=pairs)
+    try:
+        while True:
+            try:
+                rate_event = await asyncio.wait_for(
+                    subscription.queue.get(),
+                    timeout=settings.rate_subscription_keepalive,
+                )
+            except asyncio.TimeoutError:
+                yield b": ping\n\n"
+                continue
+            if rate_event is None:
+                return
+            yield rate_event.sse
+    finally:
+        rate_broadcaster.unsubscribe(subscription)
+
+
+@router.get("/exchangeRates/events")
+async def subscribe_exchange_rates_sse(pairs: Optional[str] = Query(None)):
+    pair_set = parse_pairs(pairs)
+    if isinstance(pair_set, ErrorResponse):
+        raise ExchangerateException(
+            message=pair_set.message,
+            status_code=pair_set.code
+        )
+    return StreamingResponse(
+        content=_sse_events(pairs=pair_set),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _send_events(websocket: WebSocket, subscription: RateSubscription) -> None:
+    """
+    Функция отправляет сообщения подписки в WebSocket, пока подписку не отключат как медленную
+    :param websocket: соединение WebSocket
+    :param subscription: объект класса RateSubscription
+    :return: None
+    """
+    while True:
+        rate_event = await subscription.queue.get()
+        if rate_event is None:
+            return
+        await websocket.send_text(rate_event.text)
+
+
+async def _wait_disconnect(websocket: WebSocket) -> None:
+    """
+    Функция читает входящие сообщения WebSocket (они не используются) до отключения клиента
+    :param websocket: соединение WebSocket
+    :return: None
+    """
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+@router.websocket("/exchangeRates/ws")
+async def subscribe_exchange_rates_ws(websocket: WebSocket, pairs: Optional[str] = Query(None)):
+    pair_set = parse_pairs(pairs)
+    if isinstance(pair_set, ErrorResponse):
+        # 1008 - policy violation: соединение отклоняется до установки
+        await websocket.close(code=1008, reason=pair_set.message)
+        return
+
+    await websocket.accept()
+    subscription = rate_broadcaster.subscribe(pairs=pair_set)
+    sender = asyncio.create_task(_send_events(websocket=websocket, subscription=subscription))
+    receiver = asyncio.create_task(_wait_disconnect(websocket=websocket))
+    try:
+        await asyncio.wait((sender, receiver), return_when=asyncio.FIRST_COMPLETED)
+        client_disconnected = receiver.done()
+    finally:
+        rate_broadcaster.unsubscribe(subscription)
+        sender.cancel()
+        receiver.cancel()
+        await asyncio.gather(sender, receiver, return_exceptions=True)
+
+    if subscription.dropped and not client_disconnected:
+        # 1013 - try again later: клиент может переподключиться и перечитать курсы
+        await websocket.close(code=1013, reason="Клиент не успевает получать сообщения")
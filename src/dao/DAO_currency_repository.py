@@ -1,8 +1,13 @@
+import json
+from typing import AsyncIterable
+
+import asyncpg
 from fastapi import Depends
-from sqlalchemy import select, Result
+from sqlalchemy import select, delete, Result, Row
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
-from src.dto import ErrorResponse
+from src.cache import events, currency_registry, cache_backend, currency_key
+from src.dto import ErrorResponse, CurrencyDTO
 from src.model import Currency, db_helper
 
 
@@ -14,72 +19,158 @@ class DaoCurrencyRepository:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def find_all(self) -> list[Currency] | ErrorResponse:
+    async def find_all_rows(self) -> list[Row] | ErrorResponse:
         """
-        Метод возвращает список объектов класса Currency или объект ошибки ErrorResponse
-        :return: list[Currency] или ErrorResponse
+        Метод одним запросом возвращает данные всех валют. Используется для загрузки справочника валют,
+        поэтому всегда читает из основной БД (db_helper.primary_session)
+        :return: список строк (id, code, full_name, sign) или ErrorResponse
         """
         try:
-            stmt = select(Currency).order_by(Currency.id)
-            result: Result = await self.session.execute(stmt)
-            list_all_currencies = result.scalars().all()
-            return list(list_all_currencies)
+            stmt = select(Currency.id, Currency.code, Currency.full_name, Currency.sign)
+            async with db_helper.primary_session(self.session) as session:
+                result: Result = await session.execute(stmt)
+                return list(result.all())
         except SQLAlchemyError:
             response = ErrorResponse(code=500, message=f"База данных недоступна")
             return response
 
-    async def find_by_id(self, currency_id: int) -> Currency | ErrorResponse:
+    async def find_all(self, limit: int | None, after_id: int | None = None) -> list[CurrencyDTO] | ErrorResponse:
+        """
+        Метод возвращает страницу списка объектов класса CurrencyDTO из справочника валют
+        (по возрастанию id, начиная после after_id) или объект ошибки ErrorResponse
+        :param limit: размер страницы или None - все валюты
+        :param after_id: айди последней валюты предыдущей страницы или None для первой страницы
+        :return: list[CurrencyDTO] или ErrorResponse
         """
-        Метод возвращает найденный объект класса Currency если он найден в БД, иначе объект ErrorResponse
+        response = await currency_registry.ensure_loaded(dao_currency_obj=self)
+        if isinstance(response, ErrorResponse):
+            return response
+        return currency_registry.page(limit=limit, after_id=after_id)
+
+    async def find_by_id(self, currency_id: int) -> CurrencyDTO | ErrorResponse:
+        """
+        Метод возвращает найденный в справочнике валют объект класса CurrencyDTO, иначе объект ErrorResponse
         :param currency_id: айди валюты
-        :return: объект класса Currency или ErrorResponse
+        :return: объект класса CurrencyDTO или ErrorResponse
         """
-        try:
-            currency = await self.session.get(Currency, currency_id)
-            if isinstance(currency, Currency):
-                return currency
-            else:
-                response = ErrorResponse(code=404, message=f"Валюта с id {currency_id} не найдена")
-                return response
-        except SQLAlchemyError:
-            response = ErrorResponse(code=500, message=f"База данных недоступна")
+        response = await currency_registry.ensure_loaded(dao_currency_obj=self)
+        if isinstance(response, ErrorResponse):
             return response
 
-    async def find_by_code(self, code: str) -> Currency | ErrorResponse:
+        currency = currency_registry.get_by_id(currency_id)
+        if isinstance(currency, CurrencyDTO):
+            return currency
+        else:
+            response = ErrorResponse(code=404, message=f"Валюта с id {currency_id} не найдена")
+            return response
+
+    async def find_by_ids(self, currency_ids: set[int]) -> dict[int, CurrencyDTO] | ErrorResponse:
+        """
+        Метод возвращает валюты из справочника по их айди. Айди берутся из обменных курсов,
+        поэтому такие валюты точно есть в БД: если какой-то валюты нет в справочнике,
+        значит её добавил другой процесс, и справочник перечитывается из БД
+        :param currency_ids: множество айди валют
+        :return: словарь {айди валюты: объект класса CurrencyDTO} или ErrorResponse
+        """
+        for _ in range(2):
+            response = await currency_registry.ensure_loaded(dao_currency_obj=self)
+            if isinstance(response, ErrorResponse):
+                return response
+
+            currencies = {currency_id: currency_registry.get_by_id(currency_id) for currency_id in currency_ids}
+            missing_ids = [currency_id for currency_id, currency in currencies.items() if currency is None]
+            if not missing_ids:
+                return currencies
+            currency_registry.invalidate()
+
+        response = ErrorResponse(code=404, message=f"Валюта с id {missing_ids[0]} не найдена")
+        return response
+
+    async def find_by_code(self, code: str) -> CurrencyDTO | ErrorResponse:
         """
-        Метод возвращает найденный объект класса Currency если он найден в БД, иначе объект ErrorResponse
+        Метод возвращает найденный объект класса CurrencyDTO (см. find_by_codes), иначе объект ErrorResponse
         :param code: код валюты
-        :return: объект класса Currency или ErrorResponse
+        :return: объект класса CurrencyDTO или ErrorResponse
+        """
+        if code == "":
+            response = ErrorResponse(code=400, message="Код валюты отсутствует в адресе")
+            return response
+
+        currencies = await self.find_by_codes(codes=[code])
+        if isinstance(currencies, ErrorResponse):
+            return currencies
+
+        currency = currencies.get(code)
+        if isinstance(currency, CurrencyDTO):
+            return currency
+        else:
+            response = ErrorResponse(code=404, message=f"Валюта “{code}” не найдена")
+            return response
+
+    async def find_by_codes(self, codes: list[str]) -> dict[str, CurrencyDTO] | ErrorResponse:
         """
+        Метод возвращает валюты по кодам из справочника валют. Валюты, которых нет в справочнике
+        (их мог добавить другой сервер после загрузки справочника), ищутся в кэше cache_backend,
+        а при промахе - одним запросом к БД. Отсутствие валюты тоже кэшируется, поэтому повторные
+        запросы несуществующего кода не обращаются к БД
+        :param codes: список кодов валют
+        :return: словарь {код: объект класса CurrencyDTO} только для найденных валют или ErrorResponse
+        """
+        response = await currency_registry.ensure_loaded(dao_currency_obj=self)
+        if isinstance(response, ErrorResponse):
+            return response
+
+        currencies = {}
+        missing_codes = {}
+        for code in codes:
+            currency = currency_registry.get_by_code(code)
+            if currency is None:
+                missing_codes[currency_key(code)] = code
+            else:
+                currencies[code] = currency
+        if not missing_codes:
+            return currencies
+
+        async def load(keys: list[str]) -> dict[str, bytes]:
+            stmt = select(Currency.id, Currency.code, Currency.full_name, Currency.sign).where(
+                Currency.code.in_([missing_codes[key] for key in keys])
+            )
+            # значения попадают в кэш, общий для всех клиентов, поэтому читаются из основной БД
+            async with db_helper.primary_session(self.session) as session:
+                result: Result = await session.execute(stmt)
+            loaded = {key: b"null" for key in keys}
+            for currency_id, code, full_name, sign in result.all():
+                loaded[currency_key(code)] = json.dumps(
+                    {"currency_id": currency_id, "name": full_name, "code": code, "sign": sign}
+                ).encode()
+            return loaded
+
         try:
-            stmt = select(Currency).where(Currency.code == code)
-            result: Result = await self.session.execute(stmt)
-            if isinstance(result, Result):
-                currency = result.scalar()
-                if isinstance(currency, Currency):
-                    return currency
-                else:
-                    if code == "":
-                        response = ErrorResponse(code=400, message="Код валюты отсутствует в адресе")
-                    else:
-                        response = ErrorResponse(code=404, message=f"Валюта “{code}” не найдена")
-                    return response
+            values = await cache_backend.get_many_or_load(list(missing_codes), load)
         except SQLAlchemyError:
             response = ErrorResponse(code=500, message=f"База данных недоступна")
             return response
 
+        for value in values:
+            data = json.loads(value) if value is not None else None
+            if data is not None:
+                currency = CurrencyDTO(**data)
+                currency_registry.add(currency)
+                currencies[currency.code] = currency
+        return currencies
+
     async def create_currency(
         self,
         currency_name: str,
         currency_code: str,
         currency_sign: str,
-    ) -> Currency | ErrorResponse:
+    ) -> CurrencyDTO | ErrorResponse:
         """
-        Метод записывает новую валюту в БД
+        Метод записывает новую валюту в БД и добавляет её в справочник валют
         :param currency_name: имя валюты
         :param currency_code: код валюты
         :param currency_sign: символ валюты
-        :return: объект класса Currency | ErrorResponse
+        :return: объект класса CurrencyDTO | ErrorResponse
         """
 
         if not all((currency_name, currency_code, currency_sign)):
@@ -92,7 +183,14 @@ class DaoCurrencyRepository:
             try:
                 await self.session.commit()
                 await self.session.refresh(new_currency)
-                return new_currency
+                currency = CurrencyDTO.model_construct(
+                    currency_id=new_currency.id,
+                    name=new_currency.full_name,
+                    code=new_currency.code,
+                    sign=new_currency.sign,
+                )
+                events.currency_created(currency)
+                return currency
             except IntegrityError:
                 response = ErrorResponse(code=409, message=f"Валюта с таким кодом “{currency_code}” уже существует")
                 return response
@@ -101,21 +199,75 @@ class DaoCurrencyRepository:
             response = ErrorResponse(code=500, message=f"База данных недоступна")
             return response
 
-    async def delete_currency(self, code: str) -> Currency | ErrorResponse:
+    async def import_currencies(self, records: AsyncIterable[tuple[int, str, str, str]]) -> dict | ErrorResponse:
         """
-        Метод для удаления валюты из таблицы
-        :param code: код валюты
-        :return: объект класса Currency | ErrorResponse
+        Метод массово добавляет валюты. Записи потоком передаются в БД по протоколу COPY во временную таблицу,
+        затем одна команда INSERT ... SELECT ... ON CONFLICT (code) DO NOTHING переносит в таблицу currencies
+        валюты с новыми кодами в порядке записей (из повторяющихся в записях кодов берётся первый).
+        Всё выполняется в одной транзакции asyncpg: команды идут напрямую в соединение asyncpg, мимо SQLAlchemy,
+        а транзакцию сессии адаптер asyncpg открывает только при первой команде SQLAlchemy, поэтому без
+        явной транзакции каждая команда фиксировалась бы сразу и временная таблица удалялась бы до COPY
+        :param records: асинхронный итератор кортежей (номер записи, код, имя, символ валюты)
+        :return: словарь {"inserted": добавлено валют, "skipped": пропущено записей с уже существующим
+        или повторяющимся кодом} или ErrorResponse
         """
-        if code == "":
-            response = ErrorResponse(code=400, message="Код валюты отсутствует в адресе")
+        try:
+            connection = await self.session.connection()
+            raw_connection = await connection.get_raw_connection()
+            driver_connection = raw_connection.driver_connection
+            # при выходе из блока без ошибки - COMMIT (временная таблица удаляется), при ошибке - ROLLBACK
+            async with driver_connection.transaction():
+                await driver_connection.execute(
+                    "CREATE TEMPORARY TABLE currencies_import "
+                    "(record_number bigint, code text, full_name text, sign text) ON COMMIT DROP"
+                )
+                copy_status = await driver_connection.copy_records_to_table(
+                    "currencies_import",
+                    records=records,
+                    columns=("record_number", "code", "full_name", "sign"),
+                )
+                inserted_rows = await driver_connection.fetch(
+                    "INSERT INTO currencies (code, full_name, sign) "
+                    "SELECT code, full_name, sign FROM ("
+                    "    SELECT DISTINCT ON (code) record_number, code, full_name, sign "
+                    "    FROM currencies_import ORDER BY code, record_number"
+                    ") AS first_records ORDER BY record_number "
+                    "ON CONFLICT (code) DO NOTHING "
+                    "RETURNING id, code, full_name, sign"
+                )
+            # транзакция asyncpg уже зафиксирована; commit только закрывает транзакцию сессии SQLAlchemy
+            await self.session.commit()
+        except (SQLAlchemyError, asyncpg.PostgresError):
+            await self.session.rollback()
+            response = ErrorResponse(code=500, message=f"База данных недоступна")
             return response
 
+        for currency_id, code, full_name, sign in inserted_rows:
+            events.currency_created(CurrencyDTO.model_construct(
+                currency_id=currency_id, name=full_name, code=code, sign=sign
+            ))
+
+        copied = int(copy_status.split()[-1])   # ответ сервера на COPY - строка вида "COPY 100"
+        return {"inserted": len(inserted_rows), "skipped": copied - len(inserted_rows)}
+
+    async def delete_currency(self, code: str) -> CurrencyDTO | ErrorResponse:
+        """
+        Метод для удаления валюты из таблицы. Валюта удаляется одним запросом DELETE по коду,
+        её обменные курсы удаляет БД (ON DELETE CASCADE)
+        :param code: код валюты
+        :return: объект класса CurrencyDTO | ErrorResponse
+        """
         currency = await self.find_by_code(code=code)
-        if isinstance(currency, Currency):
+        if isinstance(currency, CurrencyDTO):
             try:
-                await self.session.delete(currency)
+                stmt = delete(Currency).where(Currency.code == code)
+                result: Result = await self.session.execute(stmt)
                 await self.session.commit()
+                events.currency_deleted(code)
+                if result.rowcount == 0:
+                    # валюту уже удалил другой запрос или процесс
+                    response = ErrorResponse(code=404, message=f"Валюта “{code}” не найдена")
+                    return response
                 return currency
 
             except SQLAlchemyError:
@@ -127,3 +279,7 @@ class DaoCurrencyRepository:
 
 async def dao_currency_repository(session: AsyncSession = Depends(db_helper.session_dependency)):
     return DaoCurrencyRepository(session=session)
+
+
+async def dao_currency_read_repository(session: AsyncSession = Depends(db_helper.read_session_dependency)):
+    return DaoCurrencyRepository(session=session)
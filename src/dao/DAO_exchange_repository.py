@@ -1,33 +1,228 @@
+import datetime
 import decimal
+import json
+from typing import AsyncIterator, Collection, NamedTuple
 
 from fastapi import Depends
-from sqlalchemy import select, Result, and_
+from sqlalchemy import select, Result, Row, and_, or_, true, literal_column, bindparam, func
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio import AsyncResult, AsyncSession
+from sqlalchemy.orm import aliased
 
-from src.dto import ErrorResponse
-from src.model import ExchangeRate, Currency, db_helper
+from src.cache import events, cache_backend, change_notifier, exchange_rate_key
+from src.dto import ErrorResponse, CurrencyDTO
+from src.model import ExchangeRate, ExchangeRateHistory, ExchangeRateOhlc, Currency, db_helper
+from src.money import quantize_rate
 from src.dao.DAO_currency_repository import DaoCurrencyRepository
 
 
+class ExchangeRateRow(NamedTuple):
+    """
+    Данные обменного курса из кэша, в том же виде, что и строка запроса DaoExchangeRepository._select_rows
+    """
+    id: int
+    base_currency_id: int
+    target_currency_id: int
+    rate: decimal.Decimal
+
+
 class DaoExchangeRepository:
     """
     Класс для выполнения основных операций в БД над таблицей ExchangeRate
     """
 
+    OHLC_INTERVALS = ("minute", "hour", "day")
+
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def find_all(self) -> list[ExchangeRate] | ErrorResponse:
+    async def find_all(self, limit: int | None, after_id: int | None = None) -> list[Row] | ErrorResponse:
+        """
+        Метод возвращает страницу списка обменных курсов или объект ошибки ErrorResponse.
+        Пагинация по ключу: курсы по возрастанию id, начиная после after_id, поэтому запрос читает
+        только строки страницы по индексу первичного ключа, как бы ни была велика таблица.
+        Валюты курсов не загружаются: их DTO берутся из справочника валют по base_currency_id и target_currency_id,
+        поэтому число запросов к БД не зависит от числа обменных курсов
+        :param limit: размер страницы или None - все курсы
+        :param after_id: айди последнего курса предыдущей страницы или None для первой страницы
+        :return: список строк (id, base_currency_id, target_currency_id, rate) или ErrorResponse
+        """
+        try:
+            stmt = self._select_rows().order_by(ExchangeRate.id).limit(limit)
+            if after_id is not None:
+                stmt = stmt.where(ExchangeRate.id > after_id)
+            result: Result = await self.session.execute(stmt)
+            return list(result.all())
+        except SQLAlchemyError:
+            response = ErrorResponse(code=500, message=f"База данных недоступна")
+            return response
+
+    async def stream_all(
+        self,
+        chunk_size: int,
+        after_id: int | None = None,
+    ) -> AsyncIterator[list[Row] | ErrorResponse]:
+        """
+        Метод по частям возвращает все обменные курсы по возрастанию id, начиная после after_id.
+        Строки читаются серверным курсором по chunk_size штук, поэтому в памяти одновременно находится
+        только одна часть, как бы ни была велика таблица. Курсор живёт в транзакции сессии, поэтому сессия
+        должна оставаться открытой, пока части не прочитаны до конца
+        :param chunk_size: число строк в одной части
+        :param after_id: айди курса, после которого начинать, или None, чтобы начать с первого курса
+        :return: асинхронный итератор списков строк (id, base_currency_id, target_currency_id, rate);
+        при ошибке последним элементом идёт ErrorResponse
+        """
+        try:
+            stmt = self._select_rows().order_by(ExchangeRate.id).execution_options(yield_per=chunk_size)
+            if after_id is not None:
+                stmt = stmt.where(ExchangeRate.id > after_id)
+            result: AsyncResult = await self.session.stream(stmt)
+            async for rows in result.partitions():
+                yield rows
+        except SQLAlchemyError:
+            yield ErrorResponse(code=500, message=f"База данных недоступна")
+
+    @staticmethod
+    def _select_rows():
+        """
+        Метод возвращает запрос только нужных для DTO столбцов обменного курса.
+        Результат - строки (кортежи), а не объекты ExchangeRate: они не попадают в identity map сессии
+        и не отслеживаются ею, поэтому чтение больших списков дешевле по процессору и памяти
+        :return: объект запроса Select
+        """
+        return select(
+            ExchangeRate.id,
+            ExchangeRate.base_currency_id,
+            ExchangeRate.target_currency_id,
+            ExchangeRate.rate,
+        )
+
+    async def find_all_rows(self) -> list[Row] | ErrorResponse:
+        """
+        Метод одним запросом возвращает все обменные курсы вместе с данными их валют.
+        Используется для загрузки графа обменных курсов, поэтому всегда читает из основной БД
+        (db_helper.primary_session)
+        :return: список строк (rate, id, code, full_name, sign базовой валюты, то же для целевой валюты)
+        или ErrorResponse
+        """
+        try:
+            base_currency = aliased(Currency)
+            target_currency = aliased(Currency)
+            stmt = (
+                select(
+                    ExchangeRate.rate,
+                    base_currency.id, base_currency.code, base_currency.full_name, base_currency.sign,
+                    target_currency.id, target_currency.code, target_currency.full_name, target_currency.sign,
+                )
+                .join(base_currency, ExchangeRate.base_currency_id == base_currency.id)
+                .join(target_currency, ExchangeRate.target_currency_id == target_currency.id)
+            )
+            async with db_helper.primary_session(self.session) as session:
+                result: Result = await session.execute(stmt)
+                return list(result.all())
+        except SQLAlchemyError:
+            response = ErrorResponse(code=500, message=f"База данных недоступна")
+            return response
+
+    async def find_rows_at(self, at: datetime.datetime, codes: Collection[str]) -> list[Row] | ErrorResponse:
         """
-        Метод возвращает список объектов класса ExchangeRate или объект ошибки ErrorResponse
-        :return: list[ExchangeRate] или ErrorResponse
+        Метод одним запросом возвращает обменные курсы, действовавшие в момент at, вместе с данными их валют,
+        только для пар, в которых хотя бы одна валюта из codes. Пары берутся из истории курсов (DISTINCT
+        по парам с записями не позже at), то есть проверяются только пары, у которых история есть. Для каждой пары
+        последняя строка истории не позже at читается отдельным LATERAL-подзапросом ORDER BY effective_at DESC
+        LIMIT 1 по индексу ix_exchangerates_history_pair_effective_at. Удалённые к этому моменту курсы пропускаются
+        :param at: момент времени
+        :param codes: коды валют
+        :return: список строк в том же виде, что и у find_all_rows, или ErrorResponse
         """
         try:
-            stmt = select(ExchangeRate).order_by(ExchangeRate.id)
+            currency_ids = select(Currency.id).where(Currency.code.in_(codes))
+            pairs = (
+                select(ExchangeRateHistory.base_currency_id, ExchangeRateHistory.target_currency_id)
+                .where(or_(
+                    ExchangeRateHistory.base_currency_id.in_(currency_ids),
+                    ExchangeRateHistory.target_currency_id.in_(currency_ids),
+                ))
+                .where(ExchangeRateHistory.effective_at <= at)
+                .distinct()
+                .subquery()
+            )
+            latest = (
+                select(ExchangeRateHistory.rate)
+                .where(
+                    ExchangeRateHistory.base_currency_id == pairs.c.base_currency_id,
+                    ExchangeRateHistory.target_currency_id == pairs.c.target_currency_id,
+                    ExchangeRateHistory.effective_at <= at,
+                )
+                .order_by(ExchangeRateHistory.effective_at.desc(), ExchangeRateHistory.id.desc())
+                .limit(1)
+                .lateral()
+            )
+            base_currency = aliased(Currency)
+            target_currency = aliased(Currency)
+            stmt = (
+                select(
+                    latest.c.rate,
+                    base_currency.id, base_currency.code, base_currency.full_name, base_currency.sign,
+                    target_currency.id, target_currency.code, target_currency.full_name, target_currency.sign,
+                )
+                .select_from(pairs)
+                .join(latest, true())
+                .join(base_currency, base_currency.id == pairs.c.base_currency_id)
+                .join(target_currency, target_currency.id == pairs.c.target_currency_id)
+                .where(latest.c.rate.is_not(None))
+            )
             result: Result = await self.session.execute(stmt)
-            list_all_exchangerates = result.scalars().all()
-            return list(list_all_exchangerates)
+            return list(result.all())
+        except SQLAlchemyError:
+            response = ErrorResponse(code=500, message=f"База данных недоступна")
+            return response
+
+    async def find_ohlc(
+        self,
+        base_currency: CurrencyDTO,
+        target_currency: CurrencyDTO,
+        interval: str,
+        limit: int,
+        start: datetime.datetime | None = None,
+        end: datetime.datetime | None = None,
+    ) -> list[Row] | ErrorResponse:
+        """
+        Метод возвращает последние limit свечей обменного курса в интервале времени [start, end).
+        Свечи читаются готовыми по индексу unique_ohlc_bucket, без агрегации истории курсов
+        :param base_currency: объект класса CurrencyDTO базовой валюты
+        :param target_currency: объект класса CurrencyDTO целевой валюты
+        :param interval: "minute", "hour" или "day"
+        :param limit: максимальное число свечей
+        :param start: начало интервала времени или None
+        :param end: конец интервала времени или None
+        :return: список строк (bucket_start, open, high, low, close) по возрастанию времени или ErrorResponse
+        """
+        stmt = (
+            select(
+                ExchangeRateOhlc.bucket_start,
+                ExchangeRateOhlc.open,
+                ExchangeRateOhlc.high,
+                ExchangeRateOhlc.low,
+                ExchangeRateOhlc.close,
+            )
+            .where(
+                ExchangeRateOhlc.base_currency_id == base_currency.currency_id,
+                ExchangeRateOhlc.target_currency_id == target_currency.currency_id,
+                ExchangeRateOhlc.interval == interval,
+            )
+            .order_by(ExchangeRateOhlc.bucket_start.desc())
+            .limit(limit)
+        )
+        if start is not None:
+            stmt = stmt.where(ExchangeRateOhlc.bucket_start >= start)
+        if end is not None:
+            stmt = stmt.where(ExchangeRateOhlc.bucket_start < end)
+
+        try:
+            result: Result = await self.session.execute(stmt)
+            return list(reversed(result.all()))
         except SQLAlchemyError:
             response = ErrorResponse(code=500, message=f"База данных недоступна")
             return response
@@ -53,12 +248,16 @@ class DaoExchangeRepository:
         self,
         base_currency_code: str,
         target_currency_code: str,
-    ) -> ExchangeRate | ErrorResponse:
+        rows_only: bool = False,
+    ) -> ExchangeRate | Row | ExchangeRateRow | ErrorResponse:
         """
-        Метод возвращает найденный объект класса ExchangeRate если он найден в БД, иначе объект ErrorResponse
+        Метод возвращает найденный объект класса ExchangeRate если он найден в БД, иначе объект ErrorResponse.
+        Коды валют переводятся в айди через справочник валют, поэтому запрос идёт только к таблице обменных курсов
         :param base_currency_code: код базовой валюты в адресе запроса
         :param target_currency_code: код целевой валюты в адресе запроса
-        :return: объект класса ExchangeRate или ErrorResponse
+        :param rows_only: вернуть данные курса (id, base_currency_id, target_currency_id, rate) вместо объекта
+        ExchangeRate - для чтения, без создания объекта в сессии. Такие данные кэшируются в cache_backend
+        :return: объект класса ExchangeRate, строка с данными курса или ErrorResponse
         """
 
         if (not base_currency_code or not target_currency_code
@@ -69,33 +268,97 @@ class DaoExchangeRepository:
             )
             return response
 
-        try:
-            stmt = (select(ExchangeRate).where(and_(
-                    ExchangeRate.base_currency_id == select(Currency.id).where(
-                        Currency.code == base_currency_code),
-                    ExchangeRate.target_currency_id == select(Currency.id).where(
-                        Currency.code == target_currency_code))
-            ))
+        dao_currency_obj = DaoCurrencyRepository(session=self.session)
+        currencies = await dao_currency_obj.find_by_codes(codes=[base_currency_code, target_currency_code])
+        if isinstance(currencies, ErrorResponse):
+            return currencies
+        base_currency = currencies.get(base_currency_code)
+        target_currency = currencies.get(target_currency_code)
 
-            result: Result = await self.session.execute(stmt)
-            if isinstance(result, Result):
-                exchange_rate = result.scalar()
-                if isinstance(exchange_rate, ExchangeRate):
-                    return exchange_rate
+        exchange_rate = None
+        try:
+            if base_currency is not None and target_currency is not None:
+                if rows_only:
+                    exchange_rate = await self._find_row_cached(base_currency, target_currency)
                 else:
-                    if base_currency_code == "" or target_currency_code == "":
-                        response = ErrorResponse(code=400, message="Коды валют пары отсутствуют в адресе")
-                    else:
-                        response = ErrorResponse(
-                            code=404,
-                            message=f"Обменный курс для пары “{base_currency_code}{target_currency_code}” не найден"
-                        )
-                    return response
+                    stmt = select(ExchangeRate).where(and_(
+                        ExchangeRate.base_currency_id == base_currency.currency_id,
+                        ExchangeRate.target_currency_id == target_currency.currency_id,
+                    ))
+                    result: Result = await self.session.execute(stmt)
+                    exchange_rate = result.scalar()
+
+            if exchange_rate is not None:
+                return exchange_rate
+            else:
+                response = ErrorResponse(
+                    code=404,
+                    message=f"Обменный курс для пары “{base_currency_code}{target_currency_code}” не найден"
+                )
+                return response
 
         except SQLAlchemyError:
             response = ErrorResponse(code=500, message=f"База данных недоступна")
             return response
 
+    async def _find_row_cached(
+        self,
+        base_currency: CurrencyDTO,
+        target_currency: CurrencyDTO,
+    ) -> ExchangeRateRow | Row | None:
+        """
+        Метод возвращает данные обменного курса из кэша cache_backend, а при промахе читает их из БД.
+        Отсутствие курса тоже кэшируется. Запись кэша с айди других валют (валюту удалили и добавили заново
+        с тем же кодом) считается промахом.
+        Курсы кэшируются, только если записи кэша удаляются изменениями всех процессов: кэш общий (redis)
+        или уведомления подключены. Иначе кэш в памяти процесса отдавал бы курс, изменённый другим воркером
+        или сервером, до истечения cache_ttl, поэтому курс читается из БД
+        :param base_currency: объект класса CurrencyDTO базовой валюты
+        :param target_currency: объект класса CurrencyDTO целевой валюты
+        :return: объект класса ExchangeRateRow (строка запроса, если курс не кэшируется) или None, если курса нет
+        """
+        if not cache_backend.shared and not change_notifier.enabled:
+            return await self._find_row(base_currency, target_currency)
+
+        key = exchange_rate_key(base_currency.code, target_currency.code)
+        currency_ids = [base_currency.currency_id, target_currency.currency_id]
+
+        async def load() -> bytes:
+            # значение попадает в кэш, общий для всех клиентов, поэтому читается из основной БД
+            async with db_helper.primary_session(self.session) as session:
+                row = await self._find_row(base_currency, target_currency, session=session)
+            if row is None:
+                return json.dumps({"currency_ids": currency_ids, "id": None, "rate": None}).encode()
+            return json.dumps({"currency_ids": currency_ids, "id": row.id, "rate": str(row.rate)}).encode()
+
+        data = json.loads(await cache_backend.get_or_load(key, load))
+        if data["currency_ids"] != currency_ids:
+            cache_backend.delete([key])
+            data = json.loads(await cache_backend.get_or_load(key, load))
+        if data["id"] is None:
+            return None
+        return ExchangeRateRow(data["id"], *currency_ids, decimal.Decimal(data["rate"]))
+
+    async def _find_row(
+        self,
+        base_currency: CurrencyDTO,
+        target_currency: CurrencyDTO,
+        session: AsyncSession | None = None,
+    ) -> Row | None:
+        """
+        Метод читает из БД данные обменного курса
+        :param base_currency: объект класса CurrencyDTO базовой валюты
+        :param target_currency: объект класса CurrencyDTO целевой валюты
+        :param session: сессия для чтения или None - сессия этого объекта
+        :return: строка (id, base_currency_id, target_currency_id, rate) или None, если курса нет
+        """
+        stmt = self._select_rows().where(and_(
+            ExchangeRate.base_currency_id == base_currency.currency_id,
+            ExchangeRate.target_currency_id == target_currency.currency_id,
+        ))
+        result: Result = await (session or self.session).execute(stmt)
+        return result.first()
+
     async def create_exchange_rate(
         self,
         base_currency_code: str,
@@ -112,9 +375,13 @@ class DaoExchangeRepository:
         :return: объект класса ExchangeRate | ErrorResponse
         """
 
-        if not all((base_currency_code, target_currency_code, rate)):
+        if not all((base_currency_code, target_currency_code)) or rate is None or rate == "":
             response = ErrorResponse(code=400, message="Отсутствует нужное поле формы")
             return response
+        rate = quantize_rate(rate)
+        if rate is None:
+            response = ErrorResponse(code=400, message="Некорректный обменный курс")
+            return response
 
         try:
             base_currency = await dao_currency_obj.find_by_code(
@@ -124,9 +391,9 @@ class DaoExchangeRepository:
                 code=target_currency_code
             )
 
-            if isinstance(base_currency, Currency) and isinstance(target_currency, Currency):
-                base_currency_id = base_currency.id
-                target_currency_id = target_currency.id
+            if isinstance(base_currency, CurrencyDTO) and isinstance(target_currency, CurrencyDTO):
+                base_currency_id = base_currency.currency_id
+                target_currency_id = target_currency.currency_id
 
                 new_exchange_rate = ExchangeRate(
                     base_currency_id=base_currency_id,
@@ -134,9 +401,17 @@ class DaoExchangeRepository:
                     rate=rate
                     )
                 self.session.add(new_exchange_rate)
+                await self._record_rates([{
+                    "base_currency_id": base_currency_id,
+                    "target_currency_id": target_currency_id,
+                    "rate": new_exchange_rate.rate,
+                }])
                 try:
                     await self.session.commit()
                     await self.session.refresh(new_exchange_rate)
+                    events.exchange_rate_created(
+                        base_currency, target_currency, new_exchange_rate.rate, exchange_rate_id=new_exchange_rate.id
+                    )
                     return new_exchange_rate
                 except IntegrityError:
                     response = ErrorResponse(
@@ -170,9 +445,13 @@ class DaoExchangeRepository:
         :param rate: обменный курс
         :return: объект класса ExchangeRate | ErrorResponse
         """
-        if isinstance(rate, str) and rate == "":
+        if rate is None or isinstance(rate, str) and rate == "":
             response = ErrorResponse(code=400, message="Отсутствует нужное поле формы")
             return response
+        rate = quantize_rate(rate)
+        if rate is None:
+            response = ErrorResponse(code=400, message="Некорректный обменный курс")
+            return response
 
         try:
             exchange_rate = await self.find_by_codes(
@@ -182,7 +461,15 @@ class DaoExchangeRepository:
             if isinstance(exchange_rate, ExchangeRate):
                 exchange_rate.rate = rate
                 self.session.add(exchange_rate)
+                await self._record_rates([{
+                    "base_currency_id": exchange_rate.base_currency_id,
+                    "target_currency_id": exchange_rate.target_currency_id,
+                    "rate": exchange_rate.rate,
+                }])
                 await self.session.commit()
+                events.exchange_rate_updated(
+                    base_currency_code, target_currency_code, exchange_rate.rate, exchange_rate_id=exchange_rate.id
+                )
                 return exchange_rate
             else:
                 return exchange_rate
@@ -190,6 +477,72 @@ class DaoExchangeRepository:
             response = ErrorResponse(code=500, message=f"База данных недоступна")
             return response
 
+    async def upsert_exchange_rates(
+        self,
+        exchange_rates: list[tuple[CurrencyDTO, CurrencyDTO, decimal.Decimal]],
+    ) -> list[tuple[int, decimal.Decimal, bool]] | ErrorResponse:
+        """
+        Метод добавляет новые и изменяет существующие обменные курсы одной командой
+        INSERT ... ON CONFLICT (unique_id) DO UPDATE в одной транзакции
+        (SQLAlchemy сам разбивает большой список на многострочные VALUES).
+        Пары валют в списке не должны повторяться. В той же транзакции новые значения курсов записываются
+        в историю и в свечи
+        :param exchange_rates: список кортежей (базовая валюта, целевая валюта, обменный курс)
+        :return: список кортежей (id, rate, inserted) в том же порядке, inserted = True для нового курса,
+        или ErrorResponse
+        """
+        if not exchange_rates:
+            return []
+
+        table = ExchangeRate.__table__
+        stmt = insert(table)
+        stmt = (
+            stmt.on_conflict_do_update(constraint="unique_id", set_={"rate": stmt.excluded.rate})
+            .returning(
+                table.c.base_currency_id,
+                table.c.target_currency_id,
+                table.c.id,
+                table.c.rate,
+                # xmax = 0 только у строки, которую эта команда вставила, а не изменила
+                literal_column("xmax = 0").label("inserted"),
+            )
+        )
+        params = [
+            {
+                "base_currency_id": base_currency.currency_id,
+                "target_currency_id": target_currency.currency_id,
+                "rate": rate,
+            }
+            for base_currency, target_currency, rate in exchange_rates
+        ]
+
+        try:
+            result: Result = await self.session.execute(stmt, params)
+            rows_by_pair = {
+                (base_currency_id, target_currency_id): (exchange_rate_id, rate, inserted)
+                for base_currency_id, target_currency_id, exchange_rate_id, rate, inserted in result.all()
+            }
+            await self._record_rates(params)
+            await self.session.commit()
+        except SQLAlchemyError:
+            await self.session.rollback()
+            response = ErrorResponse(code=500, message=f"База данных недоступна")
+            return response
+
+        # RETURNING не гарантирует порядок строк, поэтому результат сопоставляется по паре валют
+        rows = [
+            rows_by_pair[(base_currency.currency_id, target_currency.currency_id)]
+            for base_currency, target_currency, _ in exchange_rates
+        ]
+        for (base_currency, target_currency, _), (exchange_rate_id, rate, inserted) in zip(exchange_rates, rows):
+            if inserted:
+                events.exchange_rate_created(base_currency, target_currency, rate, exchange_rate_id=exchange_rate_id)
+            else:
+                events.exchange_rate_updated(
+                    base_currency.code, target_currency.code, rate, exchange_rate_id=exchange_rate_id
+                )
+        return rows
+
     async def delete_exchange_rate(
         self,
         base_currency_code: str,
@@ -209,7 +562,15 @@ class DaoExchangeRepository:
             )
             if isinstance(exchange_rate, ExchangeRate):
                 await self.session.delete(exchange_rate)
+                await self._record_rates([{
+                    "base_currency_id": exchange_rate.base_currency_id,
+                    "target_currency_id": exchange_rate.target_currency_id,
+                    "rate": None,
+                }])
                 await self.session.commit()
+                events.exchange_rate_deleted(
+                    base_currency_code, target_currency_code, exchange_rate_id=exchange_rate.id
+                )
                 return exchange_rate
             else:
                 return exchange_rate
@@ -217,6 +578,52 @@ class DaoExchangeRepository:
             response = ErrorResponse(code=500, message=f"База данных недоступна")
             return response
 
+    async def _record_rates(self, rates: list[dict]) -> None:
+        """
+        Метод записывает новые значения курсов в историю и обновляет свечи всех интервалов одной командой
+        INSERT ... ON CONFLICT (unique_ohlc_bucket) DO UPDATE. Выполняется в транзакции, в которой записываются
+        сами курсы, время берётся из БД (now() - время начала транзакции)
+        :param rates: список словарей с ключами "base_currency_id", "target_currency_id", "rate";
+        rate = None - курс удалён, такая запись попадает только в историю
+        :return: None
+        """
+        await self.session.execute(insert(ExchangeRateHistory.__table__), rates)
+
+        ohlc_params = [
+            {**rate, "interval": interval}
+            for rate in rates if rate["rate"] is not None
+            for interval in self.OHLC_INTERVALS
+        ]
+        if not ohlc_params:
+            return
+
+        table = ExchangeRateOhlc.__table__
+        rate = bindparam("rate", type_=table.c.open.type)
+        stmt = insert(table).values(
+            base_currency_id=bindparam("base_currency_id"),
+            target_currency_id=bindparam("target_currency_id"),
+            interval=bindparam("interval"),
+            # начало интервала по UTC независимо от часового пояса сессии
+            bucket_start=func.timezone("UTC", func.date_trunc(bindparam("interval"), func.timezone("UTC", func.now()))),
+            open=rate,
+            high=rate,
+            low=rate,
+            close=rate,
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint="unique_ohlc_bucket",
+            set_={
+                "high": func.greatest(table.c.high, stmt.excluded.high),
+                "low": func.least(table.c.low, stmt.excluded.low),
+                "close": stmt.excluded.close,
+            },
+        )
+        await self.session.execute(stmt, ohlc_params)
+
 
 async def dao_exchange_repository(session: AsyncSession = Depends(db_helper.session_dependency)):
     return DaoExchangeRepository(session=session)
+
+
+async def dao_exchange_read_repository(session: AsyncSession = Depends(db_helper.read_session_dependency)):
+    return DaoExchangeRepository(session=session)
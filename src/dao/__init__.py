@@ -1,13 +1,19 @@
 __all__ = (
     "DaoCurrencyRepository",
     "DaoExchangeRepository",
+    "ExchangeRateRow",
     "dao_currency_repository",
     "dao_exchange_repository",
+    "dao_currency_read_repository",
+    "dao_exchange_read_repository",
 
 )
 
 
 from src.dao.DAO_currency_repository import DaoCurrencyRepository
 from src.dao.DAO_exchange_repository import DaoExchangeRepository
+from src.dao.DAO_exchange_repository import ExchangeRateRow
 from src.dao.DAO_currency_repository import dao_currency_repository
 from src.dao.DAO_exchange_repository import dao_exchange_repository
+from src.dao.DAO_currency_repository import dao_currency_read_repository
+from src.dao.DAO_exchange_repository import dao_exchange_read_repository
@@ -4,6 +4,8 @@ __all__ = (
     "CurrencyDTO",
     "ExchangeRateDTO",
     "ExchangeDTO",
+    "OhlcDTO",
+    "ExchangeRateOhlcDTO",
 )
 
 
@@ -12,3 +14,5 @@ from src.dto.exchange_response import ExchangeResponse
 from src.dto.currency_dto import CurrencyDTO
 from src.dto.exchange_rate_dto import ExchangeRateDTO
 from src.dto.exchange_dto import ExchangeDTO
+from src.dto.ohlc_dto import OhlcDTO
+from src.dto.ohlc_dto import ExchangeRateOhlcDTO
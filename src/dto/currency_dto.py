@@ -3,7 +3,8 @@ from pydantic import BaseModel, Field
 
 class CurrencyDTO(BaseModel):
     """
-    Класс для передачи данных о валюте
+    Класс для передачи данных о валюте. Объекты неизменяемые, поэтому один объект
+    из справочника валют (src.cache.currency_registry) используется во всех ответах
     """
 
     currency_id: int = Field(..., serialization_alias="id")
@@ -13,3 +14,4 @@ class CurrencyDTO(BaseModel):
 
     class Config:
         arbitrary_types_allowed = True
+        frozen = True
@@ -4,8 +4,8 @@ class ExchangeResponse:
     """
     def __init__(self, base_currency, target_currency, rate, amount, converted_amount):
         """
-        :param base_currency: объект с данными базовой валюты (объект класса Currency)
-        :param target_currency: объект с данными целевой валюты (объект класса Currency)
+        :param base_currency: объект с данными базовой валюты (объект класса CurrencyDTO)
+        :param target_currency: объект с данными целевой валюты (объект класса CurrencyDTO)
         :param rate: обменный курс
         :param amount: количество базовой валюты
         :param converted_amount: полученное количество целевой валюты
@@ -0,0 +1,28 @@
+import datetime
+
+from pydantic import BaseModel, Field
+from src.dto import CurrencyDTO
+
+
+class OhlcDTO(BaseModel):
+    """
+    Класс для передачи данных об одной свече обменного курса
+    """
+    bucket_start: datetime.datetime = Field(..., serialization_alias="bucketStart")
+    open: float = Field(..., serialization_alias="open")
+    high: float = Field(..., serialization_alias="high")
+    low: float = Field(..., serialization_alias="low")
+    close: float = Field(..., serialization_alias="close")
+
+
+class ExchangeRateOhlcDTO(BaseModel):
+    """
+    Класс для передачи данных о свечах обменного курса за интервал времени
+    """
+    base_currency: CurrencyDTO = Field(..., serialization_alias="baseCurrency")
+    target_currency: CurrencyDTO = Field(..., serialization_alias="targetCurrency")
+    interval: str = Field(..., serialization_alias="interval")
+    candles: list[OhlcDTO] = Field(..., serialization_alias="candles")
+
+    class Config:
+        arbitrary_types_allowed = True
@@ -0,0 +1,53 @@
+"""
+Консольная команда для массового импорта валют из файла CSV или NDJSON (например, справочник ISO 4217).
+Файл читается потоком и передаётся в БД по протоколу COPY, валюты с уже существующим кодом пропускаются.
+Запуск из корня проекта:
+python -m src.import_currencies currencies.csv
+python -m src.import_currencies currencies.ndjson --format ndjson
+"""
+import argparse
+import asyncio
+import time
+
+from src.dao import DaoCurrencyRepository
+from src.dto import ErrorResponse
+from src.model import db_helper
+from src.service import CurrencyService
+
+
+async def read_file(path: str, chunk_size: int = 1024 * 1024):
+    """
+    Функция читает файл кусками
+    :param path: путь к файлу
+    :param chunk_size: размер куска в байтах
+    :return: асинхронный итератор кусков файла
+    """
+    with open(path, "rb") as file:
+        while chunk := file.read(chunk_size):
+            yield chunk
+
+
+async def main(path: str, file_format: str) -> None:
+    started_at = time.perf_counter()
+    async with db_helper.session_factory() as session:
+        response = await CurrencyService.import_currencies(
+            chunks=read_file(path),
+            file_format=file_format,
+            dao_currency_obj=DaoCurrencyRepository(session=session),
+        )
+    await db_helper.engine.dispose()
+
+    if isinstance(response, ErrorResponse):
+        raise SystemExit(f"Ошибка {response.code}: {response.message}")
+    print(
+        f"Добавлено: {response['inserted']}, пропущено: {response['skipped']}, с ошибкой: {response['failed']}, "
+        f"время: {time.perf_counter() - started_at:.2f} с"
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Массовый импорт валют из файла CSV или NDJSON")
+    parser.add_argument("path", help="путь к файлу")
+    parser.add_argument("--format", choices=("csv", "ndjson"), default="csv", help="формат файла (по умолчанию csv)")
+    args = parser.parse_args()
+    asyncio.run(main(path=args.path, file_format=args.format))
@@ -1,17 +1,40 @@
+from contextlib import asynccontextmanager
+
 import uvicorn
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 
+from src.cache import cache_backend, change_notifier, currency_registry
+from src.dao import DaoCurrencyRepository
 from src.exception import CurrencyException, ExchangerateException
+from src.model import db_helper
 from src.controller import currencies_router
 from src.controller import exchange_rates_router
 from src.controller import exchange_router
+from src.controller import internal_router
+from src.controller import subscriptions_router
+from src.controller import ReadYourWritesMiddleware
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # справочник валют загружается при старте; если БД недоступна, он загрузится при первом запросе
+    async with db_helper.session_factory() as session:
+        await currency_registry.ensure_loaded(dao_currency_obj=DaoCurrencyRepository(session=session))
+    # приём и рассылка уведомлений об изменениях между узлами, если задан notifications_transport
+    change_notifier.start()
+    yield
+    await change_notifier.stop()
+    await cache_backend.close()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(ReadYourWritesMiddleware)
 app.include_router(currencies_router)
 app.include_router(exchange_rates_router)
 app.include_router(exchange_router)
+app.include_router(internal_router)
+app.include_router(subscriptions_router)
 
 
 @app.exception_handler(CurrencyException)
@@ -2,6 +2,8 @@ __all__ = (
     "Base",
     "Currency",
     "ExchangeRate",
+    "ExchangeRateHistory",
+    "ExchangeRateOhlc",
     "db_helper",
     "settings",
 
@@ -10,5 +12,7 @@ __all__ = (
 from src.model.database import Base
 from src.model.models import Currency
 from src.model.models import ExchangeRate
+from src.model.models import ExchangeRateHistory
+from src.model.models import ExchangeRateOhlc
 from src.model.database import db_helper
 from src.model.config import settings
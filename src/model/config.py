@@ -19,6 +19,44 @@ class Settings(BaseSettings):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
     db_echo: bool = False
-
+    db_replica_urls: list[str] = []     # URL реплик только для чтения (JSON-список), пустой список - все запросы к основной БД
+    db_replica_selection: str = "round_robin"   # выбор реплики: "round_robin" или "least_busy"
+    db_read_your_writes_seconds: float = 0.0    # сколько секунд после записи чтение идёт из основной БД, 0 - не переключать
+    db_pool_size: int = 5           # число постоянно открытых соединений в пуле (на каждый воркер uvicorn)
+    db_max_overflow: int = 10       # сколько соединений сверх db_pool_size можно открыть при нагрузке
+    db_pool_timeout: float = 30.0   # сколько секунд ждать свободного соединения из пула
+    db_pool_pre_ping: bool = False  # проверять ли соединение перед выдачей из пула
+    db_pool_recycle: int = -1       # через сколько секунд переоткрывать соединение, -1 - не переоткрывать
+    db_prepared_statement_cache_size: int = 100     # кэш подготовленных запросов asyncpg на соединение, 0 - выключен
+
+    exchange_max_hops: int = 3      # максимальное число обменов в цепочке при расчёте кросс-курса
+    exchange_pivot_currencies: list[str] = ["USD", "EUR", "RUB"]   # опорные валюты для кросс-курса в порядке приоритета
+    rate_graph_ttl: float = 60.0    # через сколько секунд граф обменных курсов перечитывается из БД
+    exchange_batch_max_items: int = 100_000     # максимальное число элементов в пакетном расчёте /exchange/batch
+    exchange_matrix_max_codes: int = 200    # максимальное число валют в матрице кросс-курсов /exchangeRates/matrix
+    quote_cache_max_size: int = 1024    # максимальное число пар валют в кэше курсов конвертации
+    quote_cache_ttl: float = 300.0      # время жизни записи в кэше курсов конвертации в секундах
+    currency_registry_ttl: float = 300.0    # через сколько секунд справочник валют перечитывается из БД
+    page_default_limit: int | None = None   # размер страницы /currencies и /exchangeRates без limit, None - весь список
+    page_max_limit: int = 1000      # максимальный размер страницы списков
+    exchange_rates_stream_chunk_size: int = 1000    # сколько курсов читается из БД за раз при потоковой выдаче
+    rendered_pages_max_size: int = 256  # сколько готовых страниц списков хранить для текущей версии данных
+    rendered_pages_gzip_min_size: int = 1024    # готовые страницы меньше этого размера в байтах не сжимаются gzip
+    rendered_pages_gzip_level: int = 6  # степень сжатия gzip готовых страниц от 1 до 9
+    shared_rate_table_name: str = ""    # имя таблицы курсов в разделяемой памяти для воркеров, "" - не использовать
+    shared_rate_table_max_currencies: int = 1024    # сколько валют помещается в общую таблицу
+    shared_rate_table_max_rates: int = 16384        # сколько обменных курсов помещается в общую таблицу
+    cache_backend: str = "memory"   # кэш чтения валют, курсов и расчётов: "memory" (в процессе) или "redis"
+    cache_redis_url: str = "redis://localhost:6379/0"   # адрес сервера с протоколом Redis для cache_backend="redis"
+    cache_key_prefix: str = "currency_exchange:"    # префикс ключей на сервере кэша
+    cache_ttl: float = 60.0         # время жизни записи в кэше в секундах
+    cache_max_size: int = 10_000    # максимальное число записей в кэше в памяти процесса
+    cache_timeout: float = 1.0      # сколько секунд ждать сервер кэша, после этого запрос идёт в БД
+    notifications_transport: str = ""   # уведомления об изменениях между узлами: "postgres" (LISTEN/NOTIFY), "" - нет
+    notifications_channel: str = "currency_exchange_changes"    # канал LISTEN/NOTIFY
+    notifications_backoff_initial: float = 0.5  # первая задержка перед переподключением к каналу в секундах
+    notifications_backoff_max: float = 30.0     # максимальная задержка перед переподключением в секундах
+    rate_subscription_queue_size: int = 100     # сколько сообщений копится для подписчика, затем он отключается
+    rate_subscription_keepalive: float = 15.0   # через сколько секунд без изменений отправлять подписчику пинг
 
 settings = Settings()
@@ -1,9 +1,16 @@
+import time
 from asyncio import current_task
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from itertools import count
+from typing import AsyncIterator
 
+from sqlalchemy import event
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, async_scoped_session, AsyncSession
 
 from src.model.config import settings
+from src.model.pool import MeasuredQueuePool
 
 
 class Base(DeclarativeBase):
@@ -12,12 +19,67 @@ class Base(DeclarativeBase):
     id: Mapped[int] = mapped_column(primary_key=True)
 
 
+class RequestConsistency:
+    """
+    Состояние read-your-writes одного запроса клиента: нужно ли читать из основной БД, потому что клиент недавно
+    сам записал данные (время его последней записи пришло в cookie), и время commit в основную БД в этом запросе
+    """
+
+    __slots__ = ("read_from_primary", "committed_at")
+
+    def __init__(self, read_from_primary: bool):
+        """
+        :param read_from_primary: читать ли в этом запросе из основной БД
+        """
+        self.read_from_primary = read_from_primary
+        self.committed_at: float | None = None
+
+
+# состояние текущего запроса; задаётся в начале обработки запроса (src.controller.read_your_writes)
+_request_consistency: ContextVar[RequestConsistency | None] = ContextVar("request_consistency", default=None)
+
+
 class DataBaseHelper:
-    def __init__(self, url: str, echo: bool = False):
-        self.engine = create_async_engine(
-            url=url,
+    def __init__(
+        self,
+        url: str,
+        echo: bool = False,
+        replica_urls: list[str] = (),
+        replica_selection: str = "round_robin",
+        read_your_writes_seconds: float = 0.0,
+        pool_size: int = 5,
+        max_overflow: int = 10,
+        pool_timeout: float = 30.0,
+        pool_pre_ping: bool = False,
+        pool_recycle: int = -1,
+        prepared_statement_cache_size: int = 100,
+    ):
+        """
+        :param url: URL основной БД
+        :param echo: выводить ли SQL-запросы в лог
+        :param replica_urls: URL реплик только для чтения
+        :param replica_selection: выбор реплики для чтения: "round_robin" (по очереди) или "least_busy"
+        (реплика с наименьшим числом открытых сессий)
+        :param read_your_writes_seconds: сколько секунд после своей записи в основную БД клиент читает тоже из неё,
+        чтобы сразу видеть свои изменения, даже если реплики отстают (см. start_request)
+        :param pool_size: число постоянно открытых соединений в пуле каждого движка (основная БД и каждая реплика)
+        :param max_overflow: сколько соединений сверх pool_size можно открыть при нагрузке
+        :param pool_timeout: сколько секунд ждать свободного соединения, прежде чем вернуть ошибку
+        :param pool_pre_ping: проверять ли соединение перед выдачей из пула
+        :param pool_recycle: через сколько секунд переоткрывать соединение, -1 - не переоткрывать
+        :param prepared_statement_cache_size: размер кэша подготовленных запросов asyncpg на соединение, 0 - без кэша
+        """
+        self._engine_options = dict(
             echo=echo,
+            poolclass=MeasuredQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_pre_ping=pool_pre_ping,
+            pool_recycle=pool_recycle,
+            connect_args={"prepared_statement_cache_size": prepared_statement_cache_size},
         )
+        self.engine = create_async_engine(url=url, **self._engine_options)
         self.session_factory = async_sessionmaker(
             bind=self.engine,
             autoflush=False,
@@ -25,6 +87,85 @@ class DataBaseHelper:
             expire_on_commit=False,
         )
 
+        self.replica_engines = [
+            create_async_engine(url=replica_url, **self._engine_options) for replica_url in replica_urls
+        ]
+        self.replica_session_factories = [
+            async_sessionmaker(
+                bind=replica_engine,
+                autoflush=False,
+                autocommit=False,
+                expire_on_commit=False,
+            )
+            for replica_engine in self.replica_engines
+        ]
+        self.replica_selection = replica_selection
+        self.replica_sessions_in_use = [0] * len(self.replica_engines)
+        self._replica_counter = count()
+
+        self.read_your_writes_seconds = read_your_writes_seconds
+        if read_your_writes_seconds > 0:
+            event.listen(self.engine.sync_engine, "commit", self._on_primary_commit)
+
+    def start_request(self, last_write_at: float | None) -> RequestConsistency:
+        """
+        Метод задаёт состояние read-your-writes запроса клиента. Вызывается в начале обработки запроса,
+        в той же задаче asyncio, в которой выполняются зависимости и обработчик маршрута
+        :param last_write_at: время (time.time()) последней записи этого клиента в основную БД или None
+        :return: объект класса RequestConsistency; после ответа его committed_at - время записи в этом запросе
+        """
+        read_from_primary = last_write_at is not None and time.time() - last_write_at < self.read_your_writes_seconds
+        consistency = RequestConsistency(read_from_primary=read_from_primary)
+        _request_consistency.set(consistency)
+        return consistency
+
+    @staticmethod
+    def _on_primary_commit(connection) -> None:
+        """
+        Обработчик события commit в основной БД: запоминает время записи в состоянии текущего запроса.
+        SQLAlchemy вызывает его в той же задаче asyncio (контекст передаётся в greenlet), что и запрос
+        """
+        consistency = _request_consistency.get()
+        if consistency is not None:
+            consistency.committed_at = time.time()
+
+    def choose_replica(self) -> int | None:
+        """
+        Метод выбирает реплику для чтения
+        :return: номер реплики или None, если читать нужно из основной БД
+        (реплик нет или клиент недавно сам записал данные, см. start_request)
+        """
+        if not self.replica_engines:
+            return None
+        consistency = _request_consistency.get()
+        if consistency is not None and (consistency.read_from_primary or consistency.committed_at is not None):
+            return None
+        if self.replica_selection == "least_busy":
+            in_use = self.replica_sessions_in_use
+            return min(range(len(in_use)), key=in_use.__getitem__)
+        return next(self._replica_counter) % len(self.replica_engines)
+
+    def pool_stats(self) -> dict:
+        """
+        Метод возвращает состояние пулов соединений основной БД и реплик
+        :return: словарь {"primary": {...}, "replicas": [{...}, ...]}
+        """
+        replicas = []
+        for replica_engine, sessions_in_use in zip(self.replica_engines, self.replica_sessions_in_use):
+            replicas.append({**self._get_pool_stats(replica_engine), "sessionsInUse": sessions_in_use})
+        return {"primary": self._get_pool_stats(self.engine), "replicas": replicas}
+
+    @staticmethod
+    def _get_pool_stats(engine) -> dict:
+        """
+        :param engine: движок SQLAlchemy
+        :return: счётчики пула или текстовое состояние, если пул другого класса
+        """
+        pool = engine.pool
+        if isinstance(pool, MeasuredQueuePool):
+            return pool.stats()
+        return {"status": pool.status()}
+
     async def get_scoped_session(self):
         session = async_scoped_session(
             session_factory=self.session_factory,
@@ -37,10 +178,62 @@ class DataBaseHelper:
             yield session
             await session.close()
 
+    @asynccontextmanager
+    async def read_session(self) -> AsyncIterator[AsyncSession]:
+        """
+        Сессия для запросов только на чтение: из реплики, если они настроены, иначе из основной БД.
+        Используется там, где сессия должна жить дольше зависимости FastAPI (например, в потоковом ответе)
+        """
+        replica = self.choose_replica()
+        if replica is None:
+            async with self.session_factory() as session:
+                yield session
+            return
+
+        self.replica_sessions_in_use[replica] += 1
+        try:
+            async with self.replica_session_factories[replica]() as session:
+                yield session
+        finally:
+            self.replica_sessions_in_use[replica] -= 1
+
+    @asynccontextmanager
+    async def primary_session(self, session: AsyncSession) -> AsyncIterator[AsyncSession]:
+        """
+        Сессия основной БД для чтения данных, которые сохраняются в памяти процесса или в общем кэше
+        (справочник валют, граф курсов, записи cache_backend). Прочитанные с отстающей реплики, они отдавались бы
+        всем клиентам до следующей перезагрузки
+        :param session: сессия запроса; если она уже подключена к основной БД, используется она
+        """
+        if session.bind is self.engine:
+            yield session
+            return
+        async with self.session_factory() as primary_session:
+            yield primary_session
+
+    async def read_session_dependency(self) -> AsyncSession:
+        """
+        Зависимость FastAPI с сессией только на чтение, см. read_session
+        """
+        async with self.read_session() as session:
+            yield session
+
     async def scoped_session_dependency(self) -> AsyncSession:
         session = self.get_scoped_session()
         yield session
         session.close()
 
 
-db_helper = DataBaseHelper(url=settings.data_base_url, echo=settings.db_echo)
+db_helper = DataBaseHelper(
+    url=settings.data_base_url,
+    echo=settings.db_echo,
+    replica_urls=settings.db_replica_urls,
+    replica_selection=settings.db_replica_selection,
+    read_your_writes_seconds=settings.db_read_your_writes_seconds,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_timeout=settings.db_pool_timeout,
+    pool_pre_ping=settings.db_pool_pre_ping,
+    pool_recycle=settings.db_pool_recycle,
+    prepared_statement_cache_size=settings.db_prepared_statement_cache_size,
+)
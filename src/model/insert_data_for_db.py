@@ -1,7 +1,7 @@
 import asyncio
 from sqlalchemy import select
 from src.model.database import Base, db_helper
-from src.model.models import Currency, ExchangeRate
+from src.model.models import Currency, ExchangeRate, ExchangeRateHistory
 import decimal
 
 
@@ -110,6 +110,10 @@ class CreateTablesDataBase:
                                             rate=rate
                                             )
                 exchangerates_list.append(exchangerate)
+                exchangerates_list.append(ExchangeRateHistory(base_currency_id=base_currency_id,
+                                                              target_currency_id=target_currency_id,
+                                                              rate=rate
+                                                              ))
 
             async with session_factory() as session:
                 session.add_all(exchangerates_list)
@@ -1,6 +1,7 @@
+import datetime
 import decimal
 
-from sqlalchemy import String, ForeignKey, Numeric, UniqueConstraint
+from sqlalchemy import String, ForeignKey, Numeric, UniqueConstraint, DateTime, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.model.database import Base
@@ -48,3 +49,45 @@ class ExchangeRate(Base):
     )
 
     __table_args__ = (UniqueConstraint('base_currency_id', 'target_currency_id', name='unique_id'),)
+
+
+class ExchangeRateHistory(Base):
+    """
+    История обменных курсов: при каждом добавлении, изменении и удалении курса добавляется строка
+    со значением курса и временем, с которого оно действует. Строки не изменяются и не удаляются.
+    rate = NULL - курс с этого момента удалён
+    """
+    __tablename__ = "exchangerates_history"
+
+    base_currency_id: Mapped[int] = mapped_column(ForeignKey("currencies.id", ondelete='CASCADE'))
+    target_currency_id: Mapped[int] = mapped_column(ForeignKey("currencies.id", ondelete='CASCADE'))
+    rate: Mapped[decimal.Decimal | None] = mapped_column(Numeric(precision=12, scale=4), nullable=True)
+    effective_at: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index('ix_exchangerates_history_pair_effective_at', 'base_currency_id', 'target_currency_id', 'effective_at'),
+    )
+
+
+class ExchangeRateOhlc(Base):
+    """
+    Свечи обменного курса: значения курса на открытии (open), максимальное (high), минимальное (low)
+    и на закрытии (close) интервала interval ("minute", "hour" или "day"), начинающегося в bucket_start (UTC).
+    Обновляются при каждой записи курса в той же транзакции
+    """
+    __tablename__ = "exchangerates_ohlc"
+
+    base_currency_id: Mapped[int] = mapped_column(ForeignKey("currencies.id", ondelete='CASCADE'))
+    target_currency_id: Mapped[int] = mapped_column(ForeignKey("currencies.id", ondelete='CASCADE'))
+    interval: Mapped[str] = mapped_column(String(6))
+    bucket_start: Mapped[datetime.datetime] = mapped_column(DateTime(timezone=True))
+    open: Mapped[decimal.Decimal] = mapped_column(Numeric(precision=12, scale=4))
+    high: Mapped[decimal.Decimal] = mapped_column(Numeric(precision=12, scale=4))
+    low: Mapped[decimal.Decimal] = mapped_column(Numeric(precision=12, scale=4))
+    close: Mapped[decimal.Decimal] = mapped_column(Numeric(precision=12, scale=4))
+
+    __table_args__ = (
+        UniqueConstraint(
+            'base_currency_id', 'target_currency_id', 'interval', 'bucket_start', name='unique_ohlc_bucket'
+        ),
+    )
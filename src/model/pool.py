@@ -0,0 +1,63 @@
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class MeasuredQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений SQLAlchemy, который дополнительно считает выдачи соединений, выдачи при исчерпанном лимите
+    (открыты все pool_size + max_overflow соединений, ждать приходится, если свободных среди них нет),
+    время таких выдач и отказы по pool_timeout.
+    Счётчики нужны, чтобы подбирать размер пула под число воркеров uvicorn
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def _do_get(self):
+        self.checkouts += 1
+        # все pool_size + max_overflow соединения открыты - новое не откроется, соединение выдаётся только из очереди.
+        # Пустоту очереди здесь проверять нельзя: в асинхронном пуле соединение забирается из очереди не сразу
+        if not (self._max_overflow > -1 and self._overflow >= self._max_overflow):
+            try:
+                return super()._do_get()
+            except exc.TimeoutError:
+                self.timeouts += 1
+                raise
+
+        self.waits += 1
+        started_at = time.monotonic()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.monotonic() - started_at
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def stats(self) -> dict:
+        """
+        Метод возвращает состояние пула и счётчики ожиданий
+        :return: словарь со счётчиками
+        """
+        return {
+            "size": self.size(),
+            "maxOverflow": self._max_overflow,
+            "timeout": self._timeout,
+            "checkedIn": self.checkedin(),
+            "checkedOut": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "waitSecondsTotal": round(self.wait_seconds_total, 6),
+            "waitSecondsMax": round(self.wait_seconds_max, 6),
+            "timeouts": self.timeouts,
+        }
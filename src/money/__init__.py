@@ -0,0 +1,16 @@
+__all__ = (
+    "SCALE",
+    "Rate",
+    "div_round",
+    "to_micros",
+    "from_micros",
+    "quantize_rate",
+)
+
+
+from src.money.fixed_point import SCALE
+from src.money.fixed_point import Rate
+from src.money.fixed_point import div_round
+from src.money.fixed_point import to_micros
+from src.money.fixed_point import from_micros
+from src.money.fixed_point import quantize_rate
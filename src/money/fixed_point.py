@@ -0,0 +1,152 @@
+"""
+Здесь описана арифметика денежных величин в целых числах с фиксированной точкой.
+Суммы и курсы хранятся в микро-единицах (1 единица = 1 000 000 микро-единиц), поэтому
+расчёт перевода сводится к умножению целых чисел и одному делению с явно заданным режимом округления.
+Глобальный контекст модуля decimal не используется, поэтому расчёты безопасны при конкурентных запросах.
+Режимы округления - те же строковые константы, что и в модуле decimal
+"""
+from decimal import (
+    Decimal,
+    ROUND_CEILING,
+    ROUND_DOWN,
+    ROUND_FLOOR,
+    ROUND_HALF_DOWN,
+    ROUND_HALF_EVEN,
+    ROUND_HALF_UP,
+    ROUND_UP,
+)
+from typing import NamedTuple
+
+
+SCALE = 1_000_000   # число микро-единиц в одной единице
+
+
+def div_round(numerator: int, denominator: int, rounding: str = ROUND_HALF_EVEN) -> int:
+    """
+    Функция делит одно целое число на другое с округлением до целого
+    :param numerator: делимое
+    :param denominator: делитель (не равен 0)
+    :param rounding: режим округления (ROUND_HALF_EVEN, ROUND_HALF_UP, ROUND_HALF_DOWN,
+    ROUND_DOWN, ROUND_UP, ROUND_FLOOR, ROUND_CEILING)
+    :return: округлённое частное
+    """
+    if denominator < 0:
+        numerator, denominator = -numerator, -denominator
+
+    quotient, remainder = divmod(numerator, denominator)    # quotient округлён вниз (к минус бесконечности)
+    if remainder == 0 or rounding == ROUND_FLOOR:
+        return quotient
+    if rounding == ROUND_CEILING:
+        return quotient + 1
+    if rounding == ROUND_DOWN:
+        return quotient + (quotient < 0)
+    if rounding == ROUND_UP:
+        return quotient + (quotient >= 0)
+
+    twice_remainder = 2 * remainder
+    if twice_remainder != denominator:
+        return quotient + (twice_remainder > denominator)
+    if rounding == ROUND_HALF_EVEN:
+        return quotient + quotient % 2
+    if rounding == ROUND_HALF_UP:
+        return quotient + (quotient >= 0)
+    if rounding == ROUND_HALF_DOWN:
+        return quotient + (quotient < 0)
+    raise ValueError(f"Неизвестный режим округления {rounding}")
+
+
+def to_micros(value: Decimal | int | float | str, rounding: str = ROUND_HALF_EVEN) -> int:
+    """
+    Функция переводит число в микро-единицы
+    :param value: число. Decimal и str переводятся точно, float - по его точному двоичному значению
+    :param rounding: режим округления, если у числа больше 6 знаков в дробной части
+    :return: число в микро-единицах
+    """
+    if isinstance(value, int):
+        return value * SCALE
+    if isinstance(value, str):
+        value = Decimal(value)
+    numerator, denominator = value.as_integer_ratio()
+    return div_round(numerator * SCALE, denominator, rounding)
+
+
+def from_micros(micros: int) -> int | float:
+    """
+    Функция переводит число из микро-единиц обратно в обычное число
+    :param micros: число в микро-единицах
+    :return: int, если число целое, иначе float
+    """
+    if micros % SCALE == 0:
+        return micros // SCALE
+    return micros / SCALE
+
+
+def quantize_rate(value: Decimal | int | float | str) -> Decimal | None:
+    """
+    Функция округляет обменный курс так же, как PostgreSQL при записи в столбец Numeric(12, 4), и проверяет его.
+    Курс 0 (в том числе после округления) записывать нельзя: обратный курс и пути через него делили бы на 0
+    :param value: обменный курс
+    :return: курс с 4 знаками в дробной части или None, если это не число или курс не в интервале (0, 10 ** 8)
+    """
+    try:
+        rate = Decimal(str(value)).quantize(Decimal("1.0000"), ROUND_HALF_UP)
+        if not Decimal(0) < rate < Decimal(10 ** 8):
+            return None
+    except ArithmeticError:
+        return None
+    return rate
+
+
+class Rate(NamedTuple):
+    """
+    Обменный курс в виде точной дроби numerator / denominator из целых чисел.
+    Курс из БД - это (курс в микро-единицах, SCALE), обратный курс - та же дробь наоборот,
+    а курс цепочки обменов - произведение дробей, поэтому округление выполняется один раз - при выдаче результата
+    """
+    numerator: int
+    denominator: int
+
+    @classmethod
+    def from_value(cls, value: Decimal | int | float | str) -> "Rate":
+        """
+        Метод создаёт курс из числа
+        :param value: обменный курс
+        :return: объект класса Rate
+        """
+        return cls(to_micros(value), SCALE)
+
+    def inverted(self) -> "Rate":
+        """
+        Метод возвращает обратный курс 1 / rate
+        :return: объект класса Rate
+        """
+        return Rate(self.denominator, self.numerator)
+
+    def chained(self, other: "Rate") -> "Rate":
+        """
+        Метод возвращает курс цепочки из двух обменов: сначала по этому курсу, затем по курсу other
+        :param other: объект класса Rate
+        :return: объект класса Rate
+        """
+        return Rate(self.numerator * other.numerator, self.denominator * other.denominator)
+
+    def to_micros(self, rounding: str = ROUND_HALF_EVEN) -> int:
+        """
+        Метод возвращает курс в микро-единицах (6 знаков в дробной части)
+        :param rounding: режим округления
+        :return: курс в микро-единицах
+        """
+        return div_round(self.numerator * SCALE, self.denominator, rounding)
+
+    def convert(self, amount_micros: int, places: int = 2, rounding: str = ROUND_HALF_EVEN) -> int:
+        """
+        Метод переводит сумму по курсу
+        :param amount_micros: сумма в микро-единицах
+        :param places: сколько знаков в дробной части оставить у результата
+        :param rounding: режим округления
+        :return: результат в единицах 10 ** -places (при places=2 - в сотых долях, то есть в копейках/центах)
+        """
+        return div_round(amount_micros * self.numerator * 10 ** places, self.denominator * SCALE, rounding)
+
+    def __float__(self) -> float:
+        return self.numerator / self.denominator
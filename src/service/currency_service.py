@@ -1,4 +1,9 @@
-from src.dto import CurrencyDTO
+import csv
+import json
+from typing import AsyncIterable, AsyncIterator
+
+from src.dao import DaoCurrencyRepository
+from src.dto import CurrencyDTO, ErrorResponse
 from src.model import Currency
 
 
@@ -11,7 +16,7 @@ class CurrencyService:
         :param currency: объект класса Currency
         :return: CurrencyDTO
         """
-        currency_dto_obj = CurrencyDTO(
+        currency_dto_obj = CurrencyDTO.model_construct(
             currency_id=currency.id,
             name=currency.full_name,
             code=currency.code,
@@ -20,6 +25,90 @@ class CurrencyService:
         )
         return currency_dto_obj
 
+    @staticmethod
+    async def import_currencies(
+        chunks: AsyncIterable[bytes],
+        file_format: str,
+        dao_currency_obj: DaoCurrencyRepository,
+    ) -> dict | ErrorResponse:
+        """
+        Метод массово добавляет валюты из потока CSV (колонки code, name, sign; строка заголовка необязательна)
+        или NDJSON (объекты с полями code, name, sign). Поток разбирается по мере чтения и сразу передаётся в БД,
+        поэтому весь файл в памяти не хранится
+        :param chunks: асинхронный итератор кусков файла
+        :param file_format: "csv" или "ndjson"
+        :param dao_currency_obj: здесь передается зависимость на объект класса DaoCurrencyRepository
+        :return: словарь {"inserted": ..., "skipped": ..., "failed": ...} или ErrorResponse
+        """
+        stats = {"failed": 0}
+        records = CurrencyService.parse_import(
+            lines=CurrencyService.iter_lines(chunks),
+            file_format=file_format,
+            stats=stats,
+        )
+        response = await dao_currency_obj.import_currencies(records=records)
+        if isinstance(response, ErrorResponse):
+            return response
+
+        response["failed"] = stats["failed"]
+        return response
+
+    @staticmethod
+    async def parse_import(
+        lines: AsyncIterable[bytes],
+        file_format: str,
+        stats: dict,
+    ) -> AsyncIterator[tuple[int, str, str, str]]:
+        """
+        Метод разбирает и проверяет строки файла импорта валют. Записи с ошибкой не передаются дальше,
+        а учитываются в stats["failed"]
+        :param lines: асинхронный итератор строк файла
+        :param file_format: "csv" или "ndjson"
+        :param stats: словарь со счётчиком ошибочных записей
+        :return: асинхронный итератор кортежей (номер записи, код, имя, символ валюты)
+        """
+        record_number = 0
+        async for line in lines:
+            try:
+                text = line.decode("utf-8-sig").strip()
+                if not text:
+                    continue
+                if file_format == "csv":
+                    code, name, sign = next(csv.reader([text]))
+                    if record_number == 0 and code.strip().lower() == "code":
+                        continue
+                else:
+                    item = json.loads(text)
+                    code, name, sign = item["code"], item["name"], item["sign"]
+                code, name, sign = code.strip(), name.strip(), sign.strip()
+            except (ValueError, KeyError, TypeError, AttributeError, csv.Error):
+                record_number += 1
+                stats["failed"] += 1
+                continue
+
+            record_number += 1
+            # ограничения длины совпадают со столбцами таблицы currencies
+            if not 0 < len(code) <= 3 or not 0 < len(name) <= 50 or not 0 < len(sign) <= 3:
+                stats["failed"] += 1
+                continue
+            yield record_number, code, name, sign
+
+    @staticmethod
+    async def iter_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+        """
+        Метод разбивает поток кусков файла на строки
+        :param chunks: асинхронный итератор кусков файла
+        :return: асинхронный итератор строк без символа перевода строки
+        """
+        tail = b""
+        async for chunk in chunks:
+            lines = (tail + chunk).split(b"\n")
+            tail = lines.pop()
+            for line in lines:
+                yield line
+        if tail:
+            yield tail
+
 
 async def currency_service():
     return CurrencyService()
@@ -1,44 +1,266 @@
-from src.dao import DaoCurrencyRepository
-from src.dto import ExchangeRateDTO
-from src.model import ExchangeRate, Currency
-from src.service import CurrencyService
+import datetime
+from typing import AsyncIterator
+
+from sqlalchemy import Row
+
+from src.cache import rate_graph, rate_matrix
+from src.dao import DaoCurrencyRepository, DaoExchangeRepository
+from src.dto import CurrencyDTO, ExchangeRateDTO, ErrorResponse, ExchangeRateOhlcDTO, OhlcDTO
+from src.model import ExchangeRate, settings
+from src.money import quantize_rate
 
 
 class ExchangeRateService:
 
     @staticmethod
     async def get_exchange_rate_dto(
-        exchange_rate: ExchangeRate,
-        currency_service_obj: CurrencyService,
+        exchange_rate: ExchangeRate | Row,
         dao_currency_obj: DaoCurrencyRepository,
-    ) -> ExchangeRateDTO:
+    ) -> ExchangeRateDTO | ErrorResponse:
         """
-        Метод создает DTO объект на основе объекта модели класса ExchangeRate
-        :param exchange_rate: объект класса ExchangeRate
-        :param currency_service_obj: здесь передается зависимость на объект класса CurrencyService
+        Метод создает DTO объект на основе объекта модели класса ExchangeRate или строки с теми же полями.
+        DTO валют берутся из справочника валют, без обращения к БД
+        :param exchange_rate: объект класса ExchangeRate или строка (id, base_currency_id, target_currency_id, rate)
         :param dao_currency_obj: здесь передается зависимость на объект класса DaoCurrencyRepository
-        :return: объект класса ExchangeRateDTO
+        :return: объект класса ExchangeRateDTO или ErrorResponse
         """
-
-        base_currency = await dao_currency_obj.find_by_id(
-            currency_id=exchange_rate.base_currency_id
-        )
-        target_currency = await dao_currency_obj.find_by_id(
-            currency_id=exchange_rate.target_currency_id
+        exchange_rate_dto_list = await ExchangeRateService.get_exchange_rate_dto_list(
+            exchange_rates=[exchange_rate],
+            dao_currency_obj=dao_currency_obj,
         )
+        if isinstance(exchange_rate_dto_list, ErrorResponse):
+            return exchange_rate_dto_list
+        return exchange_rate_dto_list[0]
 
-        if isinstance(base_currency, Currency) and isinstance(target_currency, Currency):
-            base_currency_dto = currency_service_obj.get_currency_dto(base_currency)
-            target_currency_dto = currency_service_obj.get_currency_dto(target_currency)
+    @staticmethod
+    async def get_exchange_rate_dto_list(
+        exchange_rates: list[ExchangeRate | Row],
+        dao_currency_obj: DaoCurrencyRepository,
+    ) -> list[ExchangeRateDTO] | ErrorResponse:
+        """
+        Метод создает список DTO объектов для обменных курсов.
+        DTO валют берутся из справочника валют, обращений к БД нет
+        :param exchange_rates: список объектов класса ExchangeRate или строк (id, base_currency_id, target_currency_id, rate)
+        :param dao_currency_obj: здесь передается зависимость на объект класса DaoCurrencyRepository
+        :return: список объектов класса ExchangeRateDTO или ErrorResponse
+        """
+        currency_ids = set()
+        for exchange_rate in exchange_rates:
+            currency_ids.add(exchange_rate.base_currency_id)
+            currency_ids.add(exchange_rate.target_currency_id)
+
+        currencies = await dao_currency_obj.find_by_ids(currency_ids=currency_ids)
+        if isinstance(currencies, ErrorResponse):
+            return currencies
 
-            exchange_rate_obj = ExchangeRateDTO(
+        # данные из БД уже проверены, поэтому DTO создаются без валидации (model_construct)
+        return [
+            ExchangeRateDTO.model_construct(
                 exchange_rate_id=exchange_rate.id,
-                base_currency=base_currency_dto,
-                target_currency=target_currency_dto,
-                rate=exchange_rate.rate,
+                base_currency=currencies[exchange_rate.base_currency_id],
+                target_currency=currencies[exchange_rate.target_currency_id],
+                rate=float(exchange_rate.rate),
             )
+            for exchange_rate in exchange_rates
+        ]
+
+    @staticmethod
+    async def stream_exchange_rate_dto_lists(
+        chunks: AsyncIterator[list[Row] | ErrorResponse],
+        dao_currency_obj: DaoCurrencyRepository,
+    ) -> AsyncIterator[list[ExchangeRateDTO] | ErrorResponse]:
+        """
+        Метод по частям создаёт DTO объекты обменных курсов из частей строк DaoExchangeRepository.stream_all
+        :param chunks: асинхронный итератор списков строк (id, base_currency_id, target_currency_id, rate)
+        :param dao_currency_obj: здесь передается зависимость на объект класса DaoCurrencyRepository
+        :return: асинхронный итератор списков объектов класса ExchangeRateDTO;
+        при ошибке последним элементом идёт ErrorResponse
+        """
+        async for chunk in chunks:
+            if isinstance(chunk, ErrorResponse):
+                yield chunk
+                return
+            exchange_rate_dto_list = await ExchangeRateService.get_exchange_rate_dto_list(
+                exchange_rates=chunk,
+                dao_currency_obj=dao_currency_obj,
+            )
+            yield exchange_rate_dto_list
+            if isinstance(exchange_rate_dto_list, ErrorResponse):
+                return
+
+    @staticmethod
+    async def upsert_exchange_rates(
+        items: list,
+        dao_exchange_obj: DaoExchangeRepository,
+        dao_currency_obj: DaoCurrencyRepository,
+    ) -> list[dict] | ErrorResponse:
+        """
+        Метод добавляет и изменяет пакет обменных курсов одной командой в БД.
+        Если пара валют повторяется в пакете, применяется её последнее значение
+        :param items: список элементов пакета - словарей с ключами "baseCurrencyCode", "targetCurrencyCode", "rate"
+        :param dao_exchange_obj: здесь передается зависимость на объект класса DaoExchangeRepository
+        :param dao_currency_obj: здесь передается зависимость на объект класса DaoCurrencyRepository
+        :return: список результатов в порядке элементов пакета или объект класса ErrorResponse
+        """
+        results: list[dict | None] = [None] * len(items)
+        indexes_by_pair: dict[tuple[str, str], int] = {}
+        exchange_rates = {}
+        for index, item in enumerate(items):
+            try:
+                base_currency_code, target_currency_code = item["baseCurrencyCode"], item["targetCurrencyCode"]
+                rate = item["rate"]
+                if (not isinstance(base_currency_code, str) or not isinstance(target_currency_code, str)
+                        or isinstance(rate, bool) or not isinstance(rate, (int, float, str))):
+                    raise TypeError
+            except (KeyError, TypeError):
+                results[index] = {"code": 400, "message": "Отсутствует нужное поле в элементе пакета"}
+                continue
+
+            rate = quantize_rate(rate)
+            if rate is None:
+                results[index] = {"code": 400, "message": "Некорректный обменный курс в элементе пакета"}
+                continue
+
+            base_currency = await dao_currency_obj.find_by_code(code=base_currency_code)
+            target_currency = await dao_currency_obj.find_by_code(code=target_currency_code)
+            for currency in (base_currency, target_currency):
+                if isinstance(currency, ErrorResponse) and currency.code == 500:
+                    return currency
+            if not isinstance(base_currency, CurrencyDTO) or not isinstance(target_currency, CurrencyDTO):
+                results[index] = {
+                    "code": 404,
+                    "message": f"Одна (или обе) валюта из валютной пары “{base_currency_code}{target_currency_code}” "
+                               f"не существует в БД",
+                }
+                continue
 
-            return exchange_rate_obj
+            pair = (base_currency_code, target_currency_code)
+            if pair in indexes_by_pair:
+                results[indexes_by_pair[pair]] = {
+                    "code": 409,
+                    "message": f"Валютная пара “{base_currency_code}{target_currency_code}” повторяется в пакете, "
+                               f"применено последнее значение",
+                }
+                del exchange_rates[indexes_by_pair[pair]]
+            indexes_by_pair[pair] = index
+            exchange_rates[index] = (base_currency, target_currency, rate)
+
+        rows = await dao_exchange_obj.upsert_exchange_rates(exchange_rates=list(exchange_rates.values()))
+        if isinstance(rows, ErrorResponse):
+            return rows
+
+        for index, (exchange_rate_id, rate, inserted) in zip(exchange_rates, rows):
+            base_currency, target_currency, _ = exchange_rates[index]
+            exchange_rate_dto = ExchangeRateDTO.model_construct(
+                exchange_rate_id=exchange_rate_id,
+                base_currency=base_currency,
+                target_currency=target_currency,
+                rate=float(rate),
+            )
+            results[index] = {
+                "code": 201 if inserted else 200,
+                "exchangeRate": exchange_rate_dto,
+            }
+
+        return results
+
+    @staticmethod
+    async def get_cross_rate_matrix(
+        codes: list[str] | None,
+        dao_exchange_obj: DaoExchangeRepository,
+    ) -> dict | ErrorResponse:
+        """
+        Метод возвращает матрицу кросс-курсов для всех валют графа обменных курсов или для переданных валют.
+        Курсы считаются по тем же путям конвертации, что и в ExchangeService.convert_currency
+        :param codes: список кодов валют или None, если нужны все валюты
+        :param dao_exchange_obj: здесь передается зависимость на объект класса DaoExchangeRepository
+        :return: словарь {"codes": [...], "rates": [[...], ...]} или объект класса ErrorResponse
+        """
+        response = await rate_graph.ensure_loaded(dao_exchange_obj=dao_exchange_obj)
+        if isinstance(response, ErrorResponse):
+            return response
+
+        if codes is not None:
+            # повторы кодов убираются с сохранением порядка, иначе матрица короче списка и валюты считаются ненайденными
+            codes = list(dict.fromkeys(codes))
+        # матрица растёт квадратично: N валют - N * N курсов в ответе
+        if len(rate_graph.codes if codes is None else codes) > settings.exchange_matrix_max_codes:
+            response = ErrorResponse(
+                code=400,
+                message=f"В матрице не может быть больше {settings.exchange_matrix_max_codes} валют, "
+                        f"передайте нужные валюты в параметре codes"
+            )
+            return response
+        matrix_codes, rates = rate_matrix.get(codes=codes)
+        if codes is not None and len(matrix_codes) != len(codes):
+            missing_codes = ", ".join(code for code in codes if code not in matrix_codes)
+            response = ErrorResponse(code=404, message=f"Обменные курсы для валют “{missing_codes}” не найдены")
+            return response
+
+        return {"codes": matrix_codes, "rates": rates}
+
+    @staticmethod
+    async def get_ohlc(
+        base_currency_code: str,
+        target_currency_code: str,
+        interval: str,
+        limit: int,
+        start: datetime.datetime | None,
+        end: datetime.datetime | None,
+        dao_exchange_obj: DaoExchangeRepository,
+        dao_currency_obj: DaoCurrencyRepository,
+    ) -> ExchangeRateOhlcDTO | ErrorResponse:
+        """
+        Метод возвращает свечи обменного курса для графиков. Время без часового пояса считается временем UTC
+        :param base_currency_code: код базовой валюты
+        :param target_currency_code: код целевой валюты
+        :param interval: "minute", "hour" или "day"
+        :param limit: максимальное число свечей
+        :param start: начало интервала времени или None
+        :param end: конец интервала времени или None
+        :param dao_exchange_obj: здесь передается зависимость на объект класса DaoExchangeRepository
+        :param dao_currency_obj: здесь передается зависимость на объект класса DaoCurrencyRepository
+        :return: объект класса ExchangeRateOhlcDTO или ErrorResponse
+        """
+        if (not base_currency_code or not target_currency_code
+                or len(base_currency_code) + len(target_currency_code) != 6):
+            response = ErrorResponse(
+                code=400,
+                message="Коды валют отсутствуют в адресе или длина двух кодов валют не равна 6"
+            )
+            return response
+
+        base_currency = await dao_currency_obj.find_by_code(code=base_currency_code)
+        if isinstance(base_currency, ErrorResponse):
+            return base_currency
+        target_currency = await dao_currency_obj.find_by_code(code=target_currency_code)
+        if isinstance(target_currency, ErrorResponse):
+            return target_currency
+
+        start, end = (
+            moment.replace(tzinfo=datetime.timezone.utc) if moment is not None and moment.tzinfo is None else moment
+            for moment in (start, end)
+        )
+        rows = await dao_exchange_obj.find_ohlc(
+            base_currency=base_currency,
+            target_currency=target_currency,
+            interval=interval,
+            limit=limit,
+            start=start,
+            end=end,
+        )
+        if isinstance(rows, ErrorResponse):
+            return rows
+
+        return ExchangeRateOhlcDTO(
+            base_currency=base_currency,
+            target_currency=target_currency,
+            interval=interval,
+            candles=[
+                OhlcDTO(bucket_start=bucket_start, open=open_rate, high=high, low=low, close=close)
+                for bucket_start, open_rate, high, low, close in rows
+            ],
+        )
 
 
 async def exchange_rate_service():
@@ -1,9 +1,13 @@
-from decimal import getcontext, Decimal
+import datetime
+import json
+import math
+import uuid
 
-from src.dao import DaoExchangeRepository, DaoCurrencyRepository
-from src.dto import ExchangeResponse, ErrorResponse, ExchangeDTO
-from src.model import ExchangeRate
-from src.service.currency_service import CurrencyService
+from src.cache import RatePath, rate_graph, quote_cache, cache_backend, quote_at_key, quote_at_version_key
+from src.dao import DaoExchangeRepository
+from src.dto import ExchangeResponse, ErrorResponse, ExchangeDTO, CurrencyDTO
+from src.model import settings
+from src.money import Rate, from_micros, to_micros
 
 
 class ExchangeService:
@@ -12,224 +16,297 @@ class ExchangeService:
     перевода определённого количества средств из одной валюты в другую
     """
 
+    # история курсов на момент времени, который старше этого, уже не меняется - такие расчёты кэшируются
+    AS_OF_CACHE_MIN_AGE = datetime.timedelta(minutes=1)
+
+    @staticmethod
     async def convert_currency(
-        self,
         currency_from: str,
         currency_to: str,
         amount: float,
-        dao_currency_obj: DaoCurrencyRepository,
         dao_exchange_obj: DaoExchangeRepository,
+        at: datetime.datetime | None = None,
     ) -> ExchangeResponse | ErrorResponse:
         """
-        Метод принимает в обработку запрос на расчёт перевода определённого количества средств из одной валюты в другую
+        Метод принимает в обработку запрос на расчёт перевода определённого количества средств из одной валюты в другую.
+        Курс ищется в графе обменных курсов: прямой курс, обратный курс или кросс-курс через любые
+        промежуточные валюты (не более settings.exchange_max_hops обменов). Найденные пути кэшируются в quote_cache.
+        БД запрашивается только для загрузки графа, если он устарел.
+        Если передан момент времени at, граф строится из истории курсов на этот момент (только пары, нужные
+        для поиска, см. find_path_at) и ищется в нём по тем же правилам.
+        Путь на момент времени старше AS_OF_CACHE_MIN_AGE кэшируется в cache_backend
         :param currency_from: из какой валюты перевод (базовая валюта)
         :param currency_to: в какую валюту перевод (целевая валюта)
         :param amount: количество базовой валюты
-        :param dao_currency_obj: здесь передается зависимость на объект класса DaoCurrencyRepository
         :param dao_exchange_obj: здесь передается зависимость на объект класса DaoExchangeRepository
+        :param at: момент времени, на который нужен курс, или None для текущих курсов.
+        Время без часового пояса считается временем UTC
         :return: объект класса ExchangeResponse или объект класса ErrorResponse
         """
-        # пробуем получить прямой курс и конвертировать
-        exchange_response = await self.get_direct_course(
-            currency_from=currency_from,
-            currency_to=currency_to,
-            amount=amount,
-            dao_currency_obj=dao_currency_obj,
-            dao_exchange_obj=dao_exchange_obj
-        )
-        if isinstance(exchange_response, ExchangeResponse):
-            return exchange_response
-
-        # пробуем получить обратный курс и конвертировать
-        exchange_response = await self.get_reverse_course(
-            currency_from=currency_from,
-            currency_to=currency_to,
-            amount=amount,
-            dao_currency_obj=dao_currency_obj,
-            dao_exchange_obj=dao_exchange_obj
-        )
-        if isinstance(exchange_response, ExchangeResponse):
-            return exchange_response
-
-        # пробуем получить кросс-курс и конвертировать
-        exchange_response = await self.get_cross_course(
-            currency_from=currency_from,
-            currency_to=currency_to,
-            amount=amount,
-            dao_currency_obj=dao_currency_obj,
-            dao_exchange_obj=dao_exchange_obj
-        )
-        if isinstance(exchange_response, ExchangeResponse):
-            return exchange_response
+        if not math.isfinite(amount):
+            response = ErrorResponse(code=400, message="Некорректное количество базовой валюты")
+            return response
 
-        # если пришли сюда и ничего не вернули, то возвращаем message Обменный курс не найден
-        return exchange_response
+        if at is not None:
+            if at.tzinfo is None:
+                at = at.replace(tzinfo=datetime.timezone.utc)
+            rate_path = await ExchangeService.find_path_at(
+                currency_from=currency_from, currency_to=currency_to, at=at, dao_exchange_obj=dao_exchange_obj
+            )
+            if isinstance(rate_path, ErrorResponse):
+                return rate_path
+        else:
+            response = await rate_graph.ensure_loaded(dao_exchange_obj=dao_exchange_obj)
+            if isinstance(response, ErrorResponse):
+                return response
+            rate_path = quote_cache.find_path(currency_from=currency_from, currency_to=currency_to)
+
+        if rate_path is None:
+            return ExchangeService.get_not_found_error(currency_from=currency_from, currency_to=currency_to)
+
+        return ExchangeService.convert_amount(rate_path=rate_path, amount=amount)
 
     @staticmethod
-    async def get_direct_course(
+    async def find_path_at(
         currency_from: str,
         currency_to: str,
-        amount: float,
-        dao_currency_obj: DaoCurrencyRepository,
+        at: datetime.datetime,
         dao_exchange_obj: DaoExchangeRepository,
-    ) -> ExchangeResponse | ErrorResponse:
+    ) -> RatePath | None | ErrorResponse:
         """
-        Метод пытается найти прямой обменный курс, если находит, то возвращает объект класса ExchangeResponse
-        или объект класса ErrorResponse - если нет прямого обменного курса
+        Метод ищет путь конвертации по курсам на момент времени.
+        Из истории читаются не все курсы, а только пары, нужные для поиска: сначала курсы валют currency_from
+        и currency_to, затем, если путь длиннее двух обменов, курсы валют, найденных на предыдущем шаге,
+        и так далее. Любой обмен на пути не длиннее max_hops находится не дальше (max_hops - 1) // 2 обменов
+        от одного из концов, поэтому шагов не больше (max_hops - 1) // 2 + 1, а путь, найденный после шага k
+        не длиннее 2 * k + 2 обменов, уже не может быть короче - на этом чтение заканчивается
         :param currency_from: из какой валюты перевод (базовая валюта)
         :param currency_to: в какую валюту перевод (целевая валюта)
-        :param amount: количество базовой валюты
-        :param dao_currency_obj: здесь передается зависимость на объект класса DaoCurrencyRepository
+        :param at: момент времени с часовым поясом
         :param dao_exchange_obj: здесь передается зависимость на объект класса DaoExchangeRepository
-        :return: объект класса ExchangeResponse или объект класса ErrorResponse
+        :return: объект класса RatePath, None - путь не найден, или ErrorResponse
         """
-        getcontext().prec = 7  # устанавливаем точность числа в 7 знаков
-        amount = Decimal(amount)
+        errors = []
 
-        # пробуем получить данные по прямому этому курсу валют
-        exchange_rate = await dao_exchange_obj.find_by_codes(
-            base_currency_code=currency_from,
-            target_currency_code=currency_to,
-        )
-        if isinstance(exchange_rate, ExchangeRate):
-            base_currency_id = exchange_rate.base_currency_id
-            target_currency_id = exchange_rate.target_currency_id
-            rate = exchange_rate.rate
-            converted_amount = Decimal(rate) * amount
-            converted_amount = str(converted_amount.quantize(Decimal('1.00')))  # округление до 2 цифр в дробной части
-            base_currency = await dao_currency_obj.find_by_id(
-                currency_id=base_currency_id,
-            )
-            target_currency = await dao_currency_obj.find_by_id(
-                currency_id=target_currency_id,
-            )
-            amount = str(amount)
-            exchange_rate = ExchangeResponse(base_currency, target_currency, rate, amount, converted_amount)
-            return exchange_rate
+        async def load() -> bytes | None:
+            rows = []
+            loaded_codes = set()
+            codes = {currency_from, currency_to}
+            rate_path = None
+            for step in range((rate_graph.max_hops - 1) // 2 + 1):
+                step_rows = await dao_exchange_obj.find_rows_at(at=at, codes=codes)
+                if isinstance(step_rows, ErrorResponse):
+                    errors.append(step_rows)
+                    return None
+                rows.extend(step_rows)
+                graph = rate_graph.from_rows(rows)
+                rate_path = graph.find_path(currency_from=currency_from, currency_to=currency_to)
+                if rate_path is not None and len(rate_path.codes) - 1 <= 2 * step + 2:
+                    break
+                loaded_codes |= codes
+                codes = set(graph.codes) - loaded_codes
+                if not codes:
+                    break
+            return json.dumps(ExchangeService.dump_rate_path(rate_path)).encode()
+
+        if at > datetime.datetime.now(datetime.timezone.utc) - ExchangeService.AS_OF_CACHE_MIN_AGE:
+            value = await load()
         else:
-            return exchange_rate
+            version = await cache_backend.get_or_load(quote_at_version_key(), ExchangeService._new_quote_at_version)
+            key = quote_at_key(currency_from, currency_to, at, version=version.decode())
+            value = await cache_backend.get_or_load(key, load)
+        if value is None:
+            return errors[0] if errors else ErrorResponse(code=500, message=f"База данных недоступна")
+        return ExchangeService.load_rate_path(json.loads(value))
 
     @staticmethod
-    async def get_reverse_course(
-        currency_from: str,
-        currency_to: str,
-        amount: float,
-        dao_currency_obj: DaoCurrencyRepository,
+    async def _new_quote_at_version() -> bytes:
+        """
+        Метод создаёт новую версию расчётов на момент времени (см. quote_at_version_key)
+        :return: случайная строка
+        """
+        return uuid.uuid4().hex.encode()
+
+    @staticmethod
+    def dump_rate_path(rate_path: RatePath | None) -> dict | None:
+        """
+        Метод создаёт JSON-совместимое представление пути конвертации для кэша
+        :param rate_path: объект класса RatePath или None
+        :return: словарь или None
+        """
+        if rate_path is None:
+            return None
+        return {
+            "base_currency": rate_path.base_currency.model_dump(),
+            "target_currency": rate_path.target_currency.model_dump(),
+            "rate": [rate_path.rate.numerator, rate_path.rate.denominator],
+            "codes": list(rate_path.codes),
+            "kind": rate_path.kind,
+        }
+
+    @staticmethod
+    def load_rate_path(data: dict | None) -> RatePath | None:
+        """
+        Метод восстанавливает путь конвертации из представления dump_rate_path
+        :param data: словарь или None
+        :return: объект класса RatePath или None
+        """
+        if data is None:
+            return None
+        return RatePath(
+            base_currency=CurrencyDTO(**data["base_currency"]),
+            target_currency=CurrencyDTO(**data["target_currency"]),
+            rate=Rate(*data["rate"]),
+            codes=tuple(data["codes"]),
+            kind=data["kind"],
+        )
+
+    @staticmethod
+    async def convert_currency_batch(
+        items: list,
         dao_exchange_obj: DaoExchangeRepository,
-    ) -> ExchangeResponse | ErrorResponse:
+    ) -> list[ExchangeResponse | ErrorResponse] | ErrorResponse:
         """
-        Метод пытается найти обратный обменный курс, если находит, то возвращает объект класса ExchangeResponse
-        или объект класса ErrorResponse - если нет обратного обменного курса
-        :param currency_from: из какой валюты перевод (базовая валюта)
-        :param currency_to: в какую валюту перевод (целевая валюта)
-        :param amount: количество базовой валюты
-        :param dao_currency_obj: здесь передается зависимость на объект класса DaoCurrencyRepository
+        Метод выполняет пакетный расчёт перевода средств. Граф обменных курсов загружается не больше одного раза
+        на весь пакет, путь конвертации для каждой пары валют ищется один раз
+        :param items: список элементов пакета - словарей с ключами "from", "to", "amount"
         :param dao_exchange_obj: здесь передается зависимость на объект класса DaoExchangeRepository
-        :return: объект класса ExchangeResponse или объект класса ErrorResponse
+        :return: список объектов ExchangeResponse или ErrorResponse в порядке элементов пакета
+        или объект класса ErrorResponse, если граф обменных курсов не удалось загрузить
         """
-        getcontext().prec = 7  # устанавливаем точность числа в 7 знаков
-        amount = Decimal(amount)
+        response = await rate_graph.ensure_loaded(dao_exchange_obj=dao_exchange_obj)
+        if isinstance(response, ErrorResponse):
+            return response
 
-        # пробуем получить данные по обратному курсу валют
-        exchange_rate = await dao_exchange_obj.find_by_codes(
-            base_currency_code=currency_to,
-            target_currency_code=currency_from,
-        )
-        if isinstance(exchange_rate, ExchangeRate):
-            base_currency_id = exchange_rate.target_currency_id  # base_currency_id в обратном курсе TargetCurrencyId
-            target_currency_id = exchange_rate.base_currency_id  # target_currency_id в обратном курсе BaseCurrencyId
-            rate = 1 / Decimal(exchange_rate.rate)
-            rate = str(rate.quantize(Decimal('1.000000')))
-            converted_amount = (Decimal(rate)) * amount
-            converted_amount = str(converted_amount.quantize(Decimal('1.00')))  # округление до 2 цифр в дробной части
-            base_currency = await dao_currency_obj.find_by_id(
-                currency_id=base_currency_id,
-            )
-            target_currency = await dao_currency_obj.find_by_id(
-                currency_id=target_currency_id,
+        rate_paths: dict[tuple[str, str], RatePath | None] = {}
+        results = []
+        for item in items:
+            try:
+                currency_from, currency_to, amount = item["from"], item["to"], item["amount"]
+                if not isinstance(currency_from, str) or not isinstance(currency_to, str) or isinstance(amount, bool):
+                    raise TypeError
+                amount = float(amount)
+                if not math.isfinite(amount):
+                    raise ValueError
+            except (KeyError, TypeError, ValueError):
+                results.append(ErrorResponse(code=400, message="Отсутствует нужное поле в элементе пакета"))
+                continue
+
+            pair = (currency_from, currency_to)
+            if pair not in rate_paths:
+                rate_paths[pair] = quote_cache.find_path(currency_from=currency_from, currency_to=currency_to)
+            rate_path = rate_paths[pair]
+
+            if rate_path is None:
+                results.append(ExchangeService.get_not_found_error(currency_from=currency_from, currency_to=currency_to))
+            else:
+                results.append(ExchangeService.convert_amount(rate_path=rate_path, amount=amount))
+
+        return results
+
+    @staticmethod
+    def parse_batch(body: bytes) -> list | ErrorResponse:
+        """
+        Метод разбирает тело запроса пакетного расчёта: JSON-массив или NDJSON (один JSON-объект в строке)
+        :param body: тело запроса
+        :return: список элементов пакета или объект класса ErrorResponse
+        """
+        try:
+            if body.lstrip().startswith(b"["):
+                items = json.loads(body)
+            else:
+                items = [json.loads(line) for line in body.splitlines() if line.strip()]
+        except ValueError:
+            response = ErrorResponse(code=400, message="Тело запроса должно быть JSON-массивом или NDJSON")
+            return response
+
+        if not isinstance(items, list):
+            response = ErrorResponse(code=400, message="Тело запроса должно быть JSON-массивом или NDJSON")
+            return response
+        if len(items) > settings.exchange_batch_max_items:
+            response = ErrorResponse(
+                code=400,
+                message=f"В пакете не может быть больше {settings.exchange_batch_max_items} элементов"
             )
-            amount = str(amount)
-            exchange_rate = ExchangeResponse(base_currency, target_currency, rate, amount, converted_amount)
-            return exchange_rate
-        else:
-            return exchange_rate
+            return response
+        return items
 
     @staticmethod
-    async def get_cross_course(
-        currency_from: str,
-        currency_to: str,
-        amount: float,
-        dao_currency_obj: DaoCurrencyRepository,
-        dao_exchange_obj: DaoExchangeRepository,
-    ) -> ExchangeResponse | ErrorResponse:
+    def convert_amount(rate_path: RatePath, amount: float) -> ExchangeResponse:
         """
-        Метод пытается найти кросс-курс через USD-валюту, если находит, то возвращает объект класса ExchangeResponse
-        или объект класса ErrorResponse - если нет обратного обменного курса
-        :param currency_from: из какой валюты перевод (базовая валюта)
-        :param currency_to: в какую валюту перевод (целевая валюта)
+        Метод рассчитывает перевод суммы по найденному пути конвертации.
+        Расчёт выполняется в целых числах (src.money), округление - до чётного, как у Decimal.quantize
+        :param rate_path: объект класса RatePath
         :param amount: количество базовой валюты
-        :param dao_currency_obj: здесь передается зависимость на объект класса DaoCurrencyRepository
-        :param dao_exchange_obj: здесь передается зависимость на объект класса DaoExchangeRepository
-        :return: объект класса ExchangeResponse или объект класса ErrorResponse
+        :return: объект класса ExchangeResponse
         """
-        getcontext().prec = 7  # устанавливаем точность числа в 7 знаков
-        amount = Decimal(amount)
-        exchange_rate_usd_base_currency = await dao_exchange_obj.find_by_codes(
-            base_currency_code="USD",
-            target_currency_code=currency_from,
+        amount_micros = to_micros(amount)
+        converted_amount = rate_path.rate.convert(amount_micros, places=2) / 100  # округление до 2 цифр в дробной части
+        rate = from_micros(rate_path.rate.to_micros())     # округление до 6 цифр в дробной части
+        exchange_response = ExchangeResponse(
+            rate_path.base_currency, rate_path.target_currency, rate, from_micros(amount_micros), converted_amount
         )
-        exchange_rate_usd_target_currency = await dao_exchange_obj.find_by_codes(
-            base_currency_code="USD",
-            target_currency_code=currency_to,
-        )
-        if (isinstance(exchange_rate_usd_base_currency, ExchangeRate)
-                and isinstance(exchange_rate_usd_target_currency, ExchangeRate)):
-            base_currency_id = exchange_rate_usd_base_currency.target_currency_id
-            target_currency_id = exchange_rate_usd_target_currency.target_currency_id
-            rate = Decimal(exchange_rate_usd_target_currency.rate) / Decimal(exchange_rate_usd_base_currency.rate)
-            converted_amount = rate * amount
-            converted_amount = str(converted_amount.quantize(Decimal('1.00')))  # округление до 2 цифр в дробной части
-            rate = str(rate.quantize(Decimal('1.000000')))
-            base_currency = await dao_currency_obj.find_by_id(
-                currency_id=base_currency_id,
-            )
-            target_currency = await dao_currency_obj.find_by_id(
-                currency_id=target_currency_id,
-            )
-            amount = str(amount)
-            exchange_response = ExchangeResponse(base_currency, target_currency, rate, amount, converted_amount)
-            return exchange_response
-        else:
-            response_code = 404
-            message = f"Ошибка {response_code} - Обменный курс {currency_from}-{currency_to} не найден"
-            exchange_response = ErrorResponse(response_code, message)
-            return exchange_response
+        return exchange_response
+
+    @staticmethod
+    def get_not_found_error(currency_from: str, currency_to: str) -> ErrorResponse:
+        """
+        Метод возвращает ошибку для пары валют, для которой не найден путь конвертации
+        :param currency_from: из какой валюты перевод (базовая валюта)
+        :param currency_to: в какую валюту перевод (целевая валюта)
+        :return: объект класса ErrorResponse
+        """
+        response_code = 404
+        message = f"Ошибка {response_code} - Обменный курс {currency_from}-{currency_to} не найден"
+        return ErrorResponse(code=response_code, message=message)
 
     @staticmethod
     async def get_exchange_dto(
             exchange_obj: ExchangeResponse,
-            currency_service_obj: CurrencyService,
     ):
         """
         Метод создает DTO объект на основе объекта класса ExchangeResponse
         :param exchange_obj: объект класса ExchangeResponse
-        :param currency_service_obj: здесь передается зависимость на объект класса CurrencyService
         :return: объект класса ExchangeDTO
         """
 
-        base_currency_dto = currency_service_obj.get_currency_dto(exchange_obj.base_currency)
-        target_currency_dto = currency_service_obj.get_currency_dto(exchange_obj.target_currency)
-
-        exchange_dto_obj = ExchangeDTO(
-            base_currency=base_currency_dto,
-            target_currency=target_currency_dto,
-            rate=exchange_obj.rate,
+        # все поля уже рассчитаны сервисом, поэтому DTO создаётся без валидации (model_construct)
+        exchange_dto_obj = ExchangeDTO.model_construct(
+            base_currency=exchange_obj.base_currency,
+            target_currency=exchange_obj.target_currency,
+            rate=float(exchange_obj.rate),
             amount=exchange_obj.amount,
             converted_amount=exchange_obj.converted_amount,
         )
 
         return exchange_dto_obj
 
+    @staticmethod
+    def get_batch_response(
+            results: list[ExchangeResponse | ErrorResponse],
+    ) -> list[ExchangeDTO | dict]:
+        """
+        Метод создает представление результатов пакетного расчёта для ответа DTOResponse
+        :param results: список объектов ExchangeResponse или ErrorResponse
+        :return: список объектов ExchangeDTO (или словарей с ошибкой) в порядке элементов пакета
+        """
+        response = []
+        for result in results:
+            if isinstance(result, ErrorResponse):
+                response.append({"code": result.code, "message": result.message})
+                continue
+
+            exchange_dto_obj = ExchangeDTO.model_construct(
+                base_currency=result.base_currency,
+                target_currency=result.target_currency,
+                rate=float(result.rate),
+                amount=result.amount,
+                converted_amount=result.converted_amount,
+            )
+            response.append(exchange_dto_obj)
+
+        return response
+
 
 async def exchange_service():
     return ExchangeService()
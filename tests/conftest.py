@@ -0,0 +1,9 @@
+import os
+
+
+# src.model.config читает параметры БД при импорте; тестам нужен только корректный URL, подключения к БД нет
+os.environ.setdefault("DB_HOST", "localhost")
+os.environ.setdefault("DB_PORT", "5432")
+os.environ.setdefault("DB_USER", "currency_user")
+os.environ.setdefault("DB_PASS", "0000")
+os.environ.setdefault("DB_NAME", "currency_exchange")
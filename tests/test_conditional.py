@@ -0,0 +1,50 @@
+from starlette.requests import Request
+
+from src.cache.data_version import DataVersion
+from src.cache.notifications import ChangeNotifier, InProcessBus, InProcessTransport
+from src.cache.shared_rate_table import SharedRateTable
+from src.controller.conditional import etag_headers, is_not_modified
+
+
+def make_request(if_none_match: str | None = None) -> Request:
+    headers = [] if if_none_match is None else [(b"if-none-match", if_none_match.encode())]
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+def test_no_etag_without_cross_process_invalidation():
+    data_version = DataVersion(
+        shared_table=SharedRateTable(name="", max_currencies=1, max_rates=1),
+        notifier=ChangeNotifier(transport=None),
+    )
+
+    assert data_version.etag() is None
+    assert etag_headers(data_version.etag()) == {}
+    assert not is_not_modified(request=make_request("*"), etag=None)
+
+
+def test_etag_changes_on_bump_and_after_max_age(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("time.time", lambda: now[0])
+    notifier = ChangeNotifier(transport=InProcessTransport(InProcessBus()))
+    data_version = DataVersion(notifier=notifier, max_age=60)
+    # пока уведомления не подключены, изменения других узлов не видны и ETag не выдаётся
+    assert data_version.etag() is None
+    notifier.connected.set()
+
+    etag = data_version.etag()
+    assert etag is not None
+    now[0] += 10
+    assert data_version.etag() == etag
+    data_version.bump()
+    bumped_etag = data_version.etag()
+    assert bumped_etag != etag
+    now[0] += 60
+    assert data_version.etag() != bumped_etag
+
+
+def test_if_none_match_uses_weak_comparison():
+    etag = '"abc.1.0.16"'
+
+    assert is_not_modified(request=make_request(f'"other", W/{etag}'), etag=etag)
+    assert not is_not_modified(request=make_request('"other"'), etag=etag)
+    assert not is_not_modified(request=make_request(), etag=etag)
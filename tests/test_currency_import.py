@@ -0,0 +1,81 @@
+import asyncio
+
+from src.service import CurrencyService
+
+
+async def iterate(items):
+    for item in items:
+        yield item
+
+
+def parse(lines: list[bytes], file_format: str) -> tuple[list[tuple], dict]:
+    stats = {"failed": 0}
+
+    async def collect() -> list[tuple]:
+        records = CurrencyService.parse_import(lines=iterate(lines), file_format=file_format, stats=stats)
+        return [record async for record in records]
+
+    return asyncio.run(collect()), stats
+
+
+def test_csv_with_header_bom_and_quoted_fields():
+    records, stats = parse([
+        "﻿code,name,sign".encode(),
+        b"USD,US Dollar,$\r",
+        b"",
+        'EUR,"Euro, single currency",€ '.encode(),
+    ], file_format="csv")
+
+    assert records == [(1, "USD", "US Dollar", "$"), (2, "EUR", "Euro, single currency", "€")]
+    assert stats == {"failed": 0}
+
+
+def test_invalid_records_are_counted_and_skipped():
+    records, stats = parse([
+        b"USD,US Dollar",
+        b"code,name,sign",
+        b"EURO,Euro,E",
+        ("RUB," + "x" * 51 + ",R").encode(),
+        b"\xff\xfe,bad,utf8",
+        b"AUD,Australian dollar,A$",
+    ], file_format="csv")
+
+    # заголовок пропускается только в первой строке, дальше это запись с неверным кодом валюты
+    assert records == [(6, "AUD", "Australian dollar", "A$")]
+    assert stats == {"failed": 5}
+
+
+def test_ndjson_records():
+    records, stats = parse([
+        b'{"code": "USD", "name": "US Dollar", "sign": "$"}',
+        b'{"code": "EUR", "name": "Euro"}',
+        b"[1, 2, 3]",
+        b"not json",
+        b'{"code": " GBP ", "name": "Pound Sterling", "sign": "\\u00a3"}',
+    ], file_format="ndjson")
+
+    assert records == [(1, "USD", "US Dollar", "$"), (5, "GBP", "Pound Sterling", "£")]
+    assert stats == {"failed": 3}
+
+
+def test_iter_lines_joins_lines_split_across_chunks():
+    chunks = iterate([b"US", b"D,a,$\nEUR,b", b",e\n", b"RUB,c,r"])
+
+    async def collect() -> list[bytes]:
+        return [line async for line in CurrencyService.iter_lines(chunks)]
+
+    assert asyncio.run(collect()) == [b"USD,a,$", b"EUR,b,e", b"RUB,c,r"]
+
+
+def test_import_passes_parsed_records_to_dao():
+    class FakeDaoCurrencyRepository:
+        async def import_currencies(self, records):
+            codes = [code async for _, code, _, _ in records]
+            return {"inserted": len(codes), "skipped": 0}
+
+    response = asyncio.run(CurrencyService.import_currencies(
+        chunks=iterate([b"code,name,sign\nUSD,US Dollar,$\nbad\nEUR,Euro,E"]),
+        file_format="csv",
+        dao_currency_obj=FakeDaoCurrencyRepository(),
+    ))
+    assert response == {"inserted": 2, "skipped": 0, "failed": 1}
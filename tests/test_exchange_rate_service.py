@@ -0,0 +1,92 @@
+import asyncio
+from decimal import Decimal
+
+from src.dto import CurrencyDTO, ErrorResponse
+from src.service import ExchangeRateService
+
+
+CURRENCIES = {
+    code: CurrencyDTO.model_construct(currency_id=currency_id, code=code, sign="¤", name=code)
+    for currency_id, code in enumerate(("USD", "EUR", "RUB"), start=1)
+}
+
+
+class FakeDaoCurrencyRepository:
+    def __init__(self, error: ErrorResponse | None = None):
+        self.error = error
+
+    async def find_by_code(self, code: str) -> CurrencyDTO | ErrorResponse:
+        if self.error is not None:
+            return self.error
+        return CURRENCIES.get(code) or ErrorResponse(code=404, message="Валюта не найдена")
+
+
+class FakeDaoExchangeRepository:
+    """
+    Пакетная запись курсов без БД: курсы пар из existing изменяются, остальные - добавляются
+    """
+
+    def __init__(self, existing: set[tuple[str, str]] = frozenset(), error: ErrorResponse | None = None):
+        self.existing = existing
+        self.error = error
+        self.calls = []
+
+    async def upsert_exchange_rates(self, exchange_rates):
+        self.calls.append([(base.code, target.code, rate) for base, target, rate in exchange_rates])
+        if self.error is not None:
+            return self.error
+        return [
+            (exchange_rate_id, rate, (base.code, target.code) not in self.existing)
+            for exchange_rate_id, (base, target, rate) in enumerate(exchange_rates, start=10)
+        ]
+
+
+def upsert(items: list, dao_exchange=None, dao_currency=None):
+    return asyncio.run(ExchangeRateService.upsert_exchange_rates(
+        items=items,
+        dao_exchange_obj=dao_exchange or FakeDaoExchangeRepository(),
+        dao_currency_obj=dao_currency or FakeDaoCurrencyRepository(),
+    ))
+
+
+def test_results_are_in_item_order_with_per_item_errors():
+    dao_exchange = FakeDaoExchangeRepository(existing={("USD", "RUB")})
+    results = upsert([
+        {"baseCurrencyCode": "USD", "targetCurrencyCode": "EUR", "rate": "0.91234"},
+        {"baseCurrencyCode": "USD", "rate": 1},
+        {"baseCurrencyCode": "USD", "targetCurrencyCode": "EUR", "rate": True},
+        {"baseCurrencyCode": "USD", "targetCurrencyCode": "RUB", "rate": 0},
+        {"baseCurrencyCode": "USD", "targetCurrencyCode": "XXX", "rate": 1},
+        {"baseCurrencyCode": "USD", "targetCurrencyCode": "RUB", "rate": 90.5},
+        "not an object",
+    ], dao_exchange=dao_exchange)
+
+    assert [result["code"] for result in results] == [201, 400, 400, 400, 404, 200, 400]
+    assert results[0]["exchangeRate"].rate == 0.9123 and results[0]["exchangeRate"].exchange_rate_id == 10
+    assert results[5]["exchangeRate"].target_currency.code == "RUB"
+    # в БД уходит одна команда с курсами, округлёнными как в столбце Numeric(12, 4)
+    assert dao_exchange.calls == [[("USD", "EUR", Decimal("0.9123")), ("USD", "RUB", Decimal("90.5000"))]]
+
+
+def test_repeated_pair_applies_last_value():
+    dao_exchange = FakeDaoExchangeRepository()
+    results = upsert([
+        {"baseCurrencyCode": "USD", "targetCurrencyCode": "EUR", "rate": 0.9},
+        {"baseCurrencyCode": "EUR", "targetCurrencyCode": "USD", "rate": 1.1},
+        {"baseCurrencyCode": "USD", "targetCurrencyCode": "EUR", "rate": 0.95},
+    ], dao_exchange=dao_exchange)
+
+    assert [result["code"] for result in results] == [409, 201, 201]
+    assert results[2]["exchangeRate"].rate == 0.95
+    assert dao_exchange.calls == [[("EUR", "USD", Decimal("1.1000")), ("USD", "EUR", Decimal("0.9500"))]]
+
+
+def test_database_errors_fail_the_whole_batch():
+    items = [{"baseCurrencyCode": "USD", "targetCurrencyCode": "EUR", "rate": 0.9}]
+    error = ErrorResponse(code=500, message="База данных недоступна")
+
+    dao_exchange = FakeDaoExchangeRepository()
+    assert upsert(items, dao_exchange=dao_exchange, dao_currency=FakeDaoCurrencyRepository(error=error)) is error
+    assert dao_exchange.calls == []
+    assert upsert(items, dao_exchange=FakeDaoExchangeRepository(error=error)) is error
+    assert upsert([]) == []
@@ -0,0 +1,117 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+from src.controller import exchange_rates_controller
+from src.controller.responses import dto_stream_response
+from src.dto import ErrorResponse
+from src.model import db_helper
+
+
+class FakeSession:
+    def __init__(self):
+        self.closed = False
+
+
+class FakeDaoExchangeRepository:
+    """
+    Части курсов без БД: каждая часть проверяет, что сессия, из которой она читается, ещё открыта
+    """
+
+    def __init__(self, session: FakeSession):
+        self.session = session
+
+    async def stream_all(self, chunk_size: int, after_id: int | None = None):
+        for chunk in ([1, 2], [3, 4], [5]):
+            assert not self.session.closed
+            yield chunk
+
+
+class FakeExchangeRateService:
+    @staticmethod
+    async def stream_exchange_rate_dto_lists(chunks, dao_currency_obj):
+        async for chunk in chunks:
+            yield [{"id": row_id} for row_id in chunk]
+
+
+def patch_session(monkeypatch) -> list[FakeSession]:
+    sessions = []
+
+    @asynccontextmanager
+    async def read_session():
+        session = FakeSession()
+        sessions.append(session)
+        try:
+            yield session
+        finally:
+            session.closed = True
+
+    monkeypatch.setattr(db_helper, "read_session", read_session)
+    monkeypatch.setattr(exchange_rates_controller, "DaoExchangeRepository", FakeDaoExchangeRepository)
+    return sessions
+
+
+def stream_chunks():
+    return exchange_rates_controller._stream_exchange_rate_dto_lists(
+        after_id=None,
+        exchange_rate_service_obj=FakeExchangeRateService(),
+    )
+
+
+def test_stream_session_lives_until_the_last_chunk(monkeypatch):
+    sessions = patch_session(monkeypatch)
+
+    async def read_body() -> bytes:
+        chunks = stream_chunks()
+        # как в маршруте: первая часть читается до создания ответа, остальные - при отправке тела
+        first_chunk = await anext(chunks)
+        assert not sessions[0].closed
+        response = dto_stream_response(first_chunk=first_chunk, chunks=chunks, stream_format="ndjson")
+        return b"".join([part async for part in response.body_iterator])
+
+    body = asyncio.run(read_body())
+    assert body.count(b"\n") == 5
+    assert len(sessions) == 1 and sessions[0].closed
+
+
+def test_stream_session_closed_when_body_is_abandoned(monkeypatch):
+    sessions = patch_session(monkeypatch)
+
+    async def abandon_body() -> None:
+        chunks = stream_chunks()
+        response = dto_stream_response(first_chunk=await anext(chunks), chunks=chunks, stream_format="json")
+        body_iterator = response.body_iterator
+        await anext(body_iterator)
+        await anext(body_iterator)
+        assert not sessions[0].closed
+        # клиент отключился: сервер закрывает итератор тела, не дочитав его
+        await body_iterator.aclose()
+
+    asyncio.run(abandon_body())
+    assert sessions[0].closed
+
+
+def test_stream_error_chunk_is_last(monkeypatch):
+    sessions = patch_session(monkeypatch)
+
+    class FailingDaoExchangeRepository(FakeDaoExchangeRepository):
+        async def stream_all(self, chunk_size: int, after_id: int | None = None):
+            yield [1]
+            yield ErrorResponse(code=500, message="База данных недоступна")
+
+    class PassErrorsService:
+        @staticmethod
+        async def stream_exchange_rate_dto_lists(chunks, dao_currency_obj):
+            async for chunk in chunks:
+                yield chunk
+
+    monkeypatch.setattr(exchange_rates_controller, "DaoExchangeRepository", FailingDaoExchangeRepository)
+
+    async def read_all() -> list:
+        return [chunk async for chunk in exchange_rates_controller._stream_exchange_rate_dto_lists(
+            after_id=None,
+            exchange_rate_service_obj=PassErrorsService(),
+        )]
+
+    chunks = asyncio.run(read_all())
+    assert chunks[0] == [1] and isinstance(chunks[-1], ErrorResponse)
+    assert sessions[0].closed
@@ -0,0 +1,123 @@
+import asyncio
+import datetime
+import decimal
+
+from src.cache import MemoryCacheBackend, events
+from src.dto import ErrorResponse
+from src.service import ExchangeService, exchange_sevrice
+
+
+CURRENCIES = {"USD": 1, "EUR": 2, "RUB": 3, "AUD": 4, "GBP": 5}
+
+
+def make_row(base_code: str, target_code: str, rate: str) -> tuple:
+    return (
+        decimal.Decimal(rate),
+        CURRENCIES[base_code], base_code, base_code, "¤",
+        CURRENCIES[target_code], target_code, target_code, "¤",
+    )
+
+
+class FakeDaoExchangeRepository:
+    """
+    Курсы на момент времени без БД: find_rows_at возвращает курсы пар, в которых есть валюта из codes
+    """
+
+    def __init__(self, rows: list[tuple]):
+        self.rows = rows
+        self.requested_codes = []
+
+    async def find_rows_at(self, at: datetime.datetime, codes):
+        self.requested_codes.append(set(codes))
+        return [row for row in self.rows if row[2] in codes or row[6] in codes]
+
+
+class FailingDaoExchangeRepository:
+    async def find_rows_at(self, at: datetime.datetime, codes):
+        return ErrorResponse(code=500, message="База данных недоступна")
+
+
+def find_path_at(dao, currency_from: str, currency_to: str):
+    # момент времени моложе AS_OF_CACHE_MIN_AGE не кэшируется, поэтому каждый вызов читает курсы заново
+    at = datetime.datetime.now(datetime.timezone.utc)
+    return asyncio.run(ExchangeService.find_path_at(
+        currency_from=currency_from, currency_to=currency_to, at=at, dao_exchange_obj=dao
+    ))
+
+
+def test_direct_and_cross_rates_read_only_pairs_of_both_currencies():
+    dao = FakeDaoExchangeRepository([
+        make_row("USD", "EUR", "0.9"),
+        make_row("EUR", "RUB", "100"),
+        make_row("GBP", "AUD", "1.9"),
+    ])
+
+    rate_path = find_path_at(dao, "USD", "EUR")
+    assert rate_path.codes == ("USD", "EUR")
+    rate_path = find_path_at(dao, "USD", "RUB")
+    assert rate_path.codes == ("USD", "EUR", "RUB")
+    assert dao.requested_codes == [{"USD", "EUR"}, {"USD", "RUB"}]
+
+
+def test_three_hops_read_neighbours_on_second_step():
+    dao = FakeDaoExchangeRepository([
+        make_row("USD", "EUR", "0.9"),
+        make_row("EUR", "GBP", "0.85"),
+        make_row("GBP", "AUD", "1.9"),
+        make_row("RUB", "AUD", "0.016"),
+    ])
+
+    rate_path = find_path_at(dao, "USD", "AUD")
+    assert rate_path.codes == ("USD", "EUR", "GBP", "AUD")
+    assert dao.requested_codes == [{"USD", "AUD"}, {"EUR", "GBP", "RUB"}]
+
+
+def test_no_path_and_database_error():
+    dao = FakeDaoExchangeRepository([make_row("USD", "EUR", "0.9")])
+
+    assert find_path_at(dao, "USD", "RUB") is None
+    assert dao.requested_codes == [{"USD", "RUB"}, {"EUR"}]
+    assert isinstance(find_path_at(FailingDaoExchangeRepository(), "USD", "RUB"), ErrorResponse)
+
+
+def test_old_moment_is_cached_until_a_currency_is_deleted(monkeypatch):
+    backend = MemoryCacheBackend(max_size=100, ttl=60)
+    monkeypatch.setattr(exchange_sevrice, "cache_backend", backend)
+    monkeypatch.setattr(events, "cache_backend", backend)
+    dao = FakeDaoExchangeRepository([make_row("USD", "EUR", "0.9"), make_row("EUR", "RUB", "100")])
+    at = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=1)
+
+    def find() -> tuple:
+        return asyncio.run(ExchangeService.find_path_at(
+            currency_from="USD", currency_to="RUB", at=at, dao_exchange_obj=dao
+        )).codes
+
+    assert find() == find() == ("USD", "EUR", "RUB")
+    # второй расчёт взят из кэша
+    assert len(dao.requested_codes) == 1
+    # история курсов EUR удалена вместе с валютой: путь через неё больше не действует
+    dao.rows = [make_row("USD", "RUB", "90")]
+    events.currency_deleted("EUR")
+    assert find() == ("USD", "RUB")
+    assert len(dao.requested_codes) == 2
+
+
+def test_parse_batch_accepts_json_array_and_ndjson():
+    items = [{"from": "USD", "to": "EUR", "amount": 10}, {"from": "EUR", "to": "RUB", "amount": "2.5"}]
+
+    assert ExchangeService.parse_batch(b' [{"from": "USD", "to": "EUR", "amount": 10},'
+                                       b' {"from": "EUR", "to": "RUB", "amount": "2.5"}]') == items
+    assert ExchangeService.parse_batch(b'{"from": "USD", "to": "EUR", "amount": 10}\r\n\n'
+                                       b'{"from": "EUR", "to": "RUB", "amount": "2.5"}\n') == items
+    assert ExchangeService.parse_batch(b"") == []
+
+
+def test_parse_batch_rejects_invalid_body_and_too_many_items(monkeypatch):
+    for body in (b"[1, 2", b'{"from": "USD"}\nnot json', b'[1]\n{"a": 1}'):
+        response = ExchangeService.parse_batch(body)
+        assert isinstance(response, ErrorResponse) and response.code == 400
+
+    monkeypatch.setattr(exchange_sevrice.settings, "exchange_batch_max_items", 2)
+    assert len(ExchangeService.parse_batch(b"[1, 2]")) == 2
+    response = ExchangeService.parse_batch(b"{}\n{}\n{}")
+    assert isinstance(response, ErrorResponse) and response.code == 400
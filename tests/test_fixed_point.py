@@ -0,0 +1,90 @@
+import asyncio
+from decimal import Decimal, ROUND_CEILING, ROUND_DOWN, ROUND_FLOOR, ROUND_HALF_DOWN, ROUND_HALF_EVEN, ROUND_HALF_UP
+from decimal import ROUND_UP
+
+import pytest
+
+from src.dao import DaoExchangeRepository
+from src.dto import ErrorResponse
+from src.money import SCALE, Rate, div_round, from_micros, quantize_rate, to_micros
+
+
+@pytest.mark.parametrize("rounding, expected", [
+    (ROUND_HALF_EVEN, [-2, -2, 2, 2]),
+    (ROUND_HALF_UP, [-3, -2, 2, 3]),
+    (ROUND_HALF_DOWN, [-2, -1, 1, 2]),
+    (ROUND_DOWN, [-2, -1, 1, 2]),
+    (ROUND_UP, [-3, -2, 2, 3]),
+    (ROUND_FLOOR, [-3, -2, 1, 2]),
+    (ROUND_CEILING, [-2, -1, 2, 3]),
+])
+def test_div_round_matches_decimal_rounding(rounding, expected):
+    # -2.5, -1.5, 1.5, 2.5
+    assert [div_round(numerator, 2, rounding) for numerator in (-5, -3, 3, 5)] == expected
+    for numerator in (-5, -3, 3, 5):
+        assert div_round(numerator, 2, rounding) == int((Decimal(numerator) / 2).quantize(Decimal(1), rounding))
+
+
+def test_div_round_negative_denominator_and_exact_division():
+    assert div_round(5, -2, ROUND_HALF_UP) == -3
+    assert div_round(-6, 3) == -2
+
+
+def test_div_round_unknown_rounding():
+    with pytest.raises(ValueError):
+        div_round(1, 2, "ROUND_SOMEHOW")
+
+
+def test_to_micros_and_from_micros():
+    assert to_micros(2) == 2 * SCALE
+    assert to_micros("0.0000005") == 0
+    assert to_micros("0.0000015") == 2
+    assert to_micros(Decimal("1.2345"), ROUND_HALF_UP) == 1_234_500
+    assert to_micros(0.1) == 100_000
+    assert from_micros(3 * SCALE) == 3 and isinstance(from_micros(3 * SCALE), int)
+    assert from_micros(1_500_000) == 1.5
+
+
+def test_rate_is_exact_fraction():
+    rate = Rate.from_value("3")
+    inverted = rate.inverted()
+
+    # 1/3 не округляется при обращении: обратно получается ровно исходный курс
+    assert inverted.inverted() == rate
+    assert inverted.chained(rate).to_micros() == SCALE
+    assert inverted.to_micros() == 333_333
+    assert inverted.to_micros(ROUND_UP) == 333_334
+    # 100 единиц по курсу 1/3 - 33.33, округление один раз в конце
+    assert inverted.convert(to_micros(100)) == 3333
+    assert Rate.from_value("0.9").chained(Rate.from_value("100")).convert(to_micros(10), places=0) == 900
+    assert float(Rate.from_value("1.5")) == 1.5
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("1.23456", Decimal("1.2346")),
+    (Decimal("0.00005"), Decimal("0.0001")),
+    (2, Decimal("2.0000")),
+    (0.1, Decimal("0.1000")),
+    ("99999999.9999", Decimal("99999999.9999")),
+])
+def test_quantize_rate_rounds_like_numeric_column(value, expected):
+    assert quantize_rate(value) == expected
+
+
+@pytest.mark.parametrize("value", ["0", 0, "0.00001", "0.00004", "-1", "100000000", "1e9", "abc", "NaN", "Infinity"])
+def test_quantize_rate_rejects_zero_negative_and_out_of_range(value):
+    assert quantize_rate(value) is None
+
+
+@pytest.mark.parametrize("rate", [Decimal("0"), Decimal("0.00001"), Decimal("-2")])
+def test_create_and_update_reject_rates_that_store_as_zero_or_negative(rate):
+    # курс проверяется до обращения к БД, поэтому сессия не нужна
+    dao = DaoExchangeRepository(session=None)
+
+    created = asyncio.run(dao.create_exchange_rate(
+        base_currency_code="USD", target_currency_code="EUR", rate=rate, dao_currency_obj=None
+    ))
+    updated = asyncio.run(dao.update_exchange_rate(base_currency_code="USD", target_currency_code="EUR", rate=rate))
+
+    for response in (created, updated):
+        assert isinstance(response, ErrorResponse) and response.code == 400
@@ -0,0 +1,160 @@
+import asyncio
+
+import pytest
+
+from src.cache.notifications import ChangeNotifier, InProcessBus, InProcessTransport, NotificationTransport
+
+
+async def wait_until(condition, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("условие не выполнилось")
+        await asyncio.sleep(0.005)
+
+
+def make_notifier(transport: NotificationTransport, max_batch: int = 100) -> tuple[ChangeNotifier, list, list]:
+    notifier = ChangeNotifier(transport=transport, backoff_initial=0.01, backoff_max=0.01, max_batch=max_batch)
+    messages, resyncs = [], []
+    notifier.on_message = lambda kind, data: messages.append((kind, data))
+    notifier.on_resync = lambda: resyncs.append(True)
+    return notifier, messages, resyncs
+
+
+class GatedTransport(InProcessTransport):
+    """
+    Транспорт, отправка через который ждёт разрешения, - чтобы прервать отправку на середине
+    """
+
+    def __init__(self, bus: InProcessBus):
+        super().__init__(bus)
+        self.gate = asyncio.Event()
+        self.sending = asyncio.Event()
+
+    async def publish(self, payload: str) -> None:
+        self.sending.set()
+        await self.gate.wait()
+        await super().publish(payload)
+
+
+def test_transport_is_abstract():
+    with pytest.raises(TypeError):
+        NotificationTransport()
+
+
+def test_publish_is_delivered_to_other_nodes_only():
+    async def scenario():
+        bus = InProcessBus()
+        sender, sender_messages, _ = make_notifier(InProcessTransport(bus))
+        receiver, receiver_messages, _ = make_notifier(InProcessTransport(bus))
+        sender.start()
+        receiver.start()
+        await sender.connected.wait()
+        await receiver.connected.wait()
+
+        sender.publish("rate_updated", base="USD", target="EUR", rate="0.9")
+        await wait_until(lambda: receiver_messages)
+        await sender.stop()
+        await receiver.stop()
+        return sender_messages, receiver_messages
+
+    sender_messages, receiver_messages = asyncio.run(scenario())
+    assert receiver_messages == [("rate_updated", {"base": "USD", "target": "EUR", "rate": "0.9"})]
+    assert sender_messages == []
+
+
+def test_publish_before_start_is_dropped():
+    async def scenario():
+        notifier, _, _ = make_notifier(InProcessTransport(InProcessBus()))
+        notifier.publish("rate_updated")
+        return notifier._outgoing
+
+    assert asyncio.run(scenario()) == []
+
+
+def test_reconnect_triggers_resync():
+    async def scenario():
+        bus = InProcessBus()
+        notifier, _, resyncs = make_notifier(InProcessTransport(bus))
+        assert not notifier.enabled
+        notifier.start()
+        await notifier.connected.wait()
+        assert resyncs == [] and notifier.enabled
+
+        bus.disconnect_all()
+        await wait_until(lambda: not notifier.enabled)
+        # resync выполняется до того, как узел снова начнёт доверять данным в памяти
+        await wait_until(lambda: notifier.enabled)
+        assert resyncs == [True]
+        await notifier.stop()
+        return resyncs, notifier.enabled
+
+    assert asyncio.run(scenario()) == ([True], False)
+
+
+def test_overflow_is_replaced_by_single_resync():
+    async def scenario():
+        bus = InProcessBus()
+        sender, _, _ = make_notifier(InProcessTransport(bus), max_batch=3)
+        receiver, receiver_messages, receiver_resyncs = make_notifier(InProcessTransport(bus))
+        receiver.start()
+        await receiver.connected.wait()
+
+        sender.start()
+        for index in range(5):
+            sender.publish("rate_updated", index=index)
+        await wait_until(lambda: receiver_resyncs)
+        await asyncio.sleep(0.05)
+        await sender.stop()
+        await receiver.stop()
+        return receiver_messages, receiver_resyncs
+
+    receiver_messages, receiver_resyncs = asyncio.run(scenario())
+    assert receiver_messages == []
+    assert receiver_resyncs == [True]
+
+
+def test_interrupted_send_is_requeued_and_delivered_after_reconnect():
+    async def scenario():
+        bus = InProcessBus()
+        transport = GatedTransport(bus)
+        sender, _, _ = make_notifier(transport)
+        receiver, receiver_messages, _ = make_notifier(InProcessTransport(bus))
+        receiver.start()
+        sender.start()
+        await sender.connected.wait()
+        await receiver.connected.wait()
+
+        for index in range(3):
+            sender.publish("rate_updated", index=index)
+        await transport.sending.wait()
+        # соединение потеряно, пока первое уведомление отправляется
+        bus.subscribers.discard(transport._queue)
+        transport._queue.put_nowait(None)
+        await wait_until(lambda: not sender.connected.is_set())
+        requeued = [message["data"]["index"] for message in sender._outgoing]
+
+        transport.gate.set()
+        await wait_until(lambda: len(receiver_messages) == 3)
+        await sender.stop()
+        await receiver.stop()
+        return requeued, receiver_messages
+
+    requeued, receiver_messages = asyncio.run(scenario())
+    assert requeued == [0, 1, 2]
+    assert [data["index"] for _, data in receiver_messages] == [0, 1, 2]
+
+
+def test_stop_keeps_unsent_messages():
+    async def scenario():
+        transport = GatedTransport(InProcessBus())
+        notifier, _, _ = make_notifier(transport)
+        notifier.start()
+        await notifier.connected.wait()
+        notifier.publish("rate_updated", index=0)
+        notifier.publish("rate_updated", index=1)
+        await transport.sending.wait()
+        await notifier.stop()
+        return [message["data"]["index"] for message in notifier._outgoing]
+
+    assert asyncio.run(scenario()) == [0, 1]
@@ -0,0 +1,89 @@
+from decimal import Decimal
+
+from src.cache.quote_cache import QuoteCache
+from src.cache.rate_graph import RateGraph
+from src.dto import CurrencyDTO
+
+
+CURRENCIES = {
+    code: CurrencyDTO.model_construct(currency_id=currency_id, code=code, sign="¤", name=code)
+    for currency_id, code in enumerate(("USD", "EUR", "RUB", "GBP"))
+}
+
+
+def make_cache(max_size: int = 10, ttl: float = 60) -> tuple[RateGraph, QuoteCache]:
+    graph = RateGraph(max_hops=3, ttl=60, pivots=["USD"])
+    graph.add_rate(CURRENCIES["USD"], CURRENCIES["EUR"], Decimal("0.9"))
+    graph.add_rate(CURRENCIES["USD"], CURRENCIES["RUB"], Decimal("90"))
+    graph.add_rate(CURRENCIES["USD"], CURRENCIES["GBP"], Decimal("0.8"))
+    return graph, QuoteCache(graph=graph, max_size=max_size, ttl=ttl)
+
+
+def cached_pairs(quotes: QuoteCache) -> set[tuple[str, str]]:
+    return set(quotes._entries)
+
+
+def fill(quotes: QuoteCache) -> None:
+    for currency_from, currency_to in (("EUR", "RUB"), ("USD", "EUR"), ("GBP", "USD"), ("RUB", "GBP")):
+        quotes.find_path(currency_from, currency_to)
+
+
+def test_changed_rate_drops_only_paths_through_it():
+    graph, quotes = make_cache()
+    fill(quotes)
+
+    graph.update_rate("USD", "EUR", Decimal("0.95"))
+    # курс пары сбрасывается в обе стороны: путь EUR -> RUB проходит по ребру EUR -> USD
+    quotes.invalidate_pair("EUR", "USD")
+    assert cached_pairs(quotes) == {("GBP", "USD"), ("RUB", "GBP")}
+    assert quotes.stats()["invalidations"] == 2
+    assert float(quotes.find_path("USD", "EUR").rate) == 0.95
+
+
+def test_new_rate_drops_its_pair_and_all_cross_rates():
+    graph, quotes = make_cache()
+    fill(quotes)
+
+    graph.add_rate(CURRENCIES["EUR"], CURRENCIES["RUB"], Decimal("100"))
+    quotes.invalidate_new_pair("EUR", "RUB")
+    assert cached_pairs(quotes) == {("USD", "EUR"), ("GBP", "USD")}
+    assert quotes.find_path("EUR", "RUB").kind == "direct"
+
+
+def test_deleted_currency_drops_paths_through_it():
+    graph, quotes = make_cache()
+    fill(quotes)
+
+    graph.remove_currency("RUB")
+    quotes.invalidate_currency("RUB")
+    assert cached_pairs(quotes) == {("USD", "EUR"), ("GBP", "USD")}
+    assert quotes.find_path("EUR", "RUB") is None
+    # индексы по курсам и валютам очищены вместе с записями
+    assert "RUB" not in quotes._keys_by_currency and ("RUB", "USD") not in quotes._keys_by_pair
+
+
+def test_graph_reload_clears_cache():
+    graph, quotes = make_cache()
+    fill(quotes)
+
+    graph.invalidate()
+    quotes.find_path("USD", "EUR")
+    assert cached_pairs(quotes) == {("USD", "EUR")}
+    assert quotes.stats()["invalidations"] == 4
+
+
+def test_lru_and_ttl_eviction(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("time.monotonic", lambda: now[0])
+    _, quotes = make_cache(max_size=2, ttl=10)
+
+    quotes.find_path("USD", "EUR")
+    quotes.find_path("USD", "RUB")
+    quotes.find_path("USD", "EUR")
+    quotes.find_path("USD", "GBP")
+    assert cached_pairs(quotes) == {("USD", "EUR"), ("USD", "GBP")}
+
+    now[0] += 11
+    quotes.find_path("USD", "EUR")
+    stats = quotes.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (1, 4, 2)
@@ -0,0 +1,120 @@
+from decimal import Decimal
+
+from src.cache.rate_graph import RateGraph
+from src.dto import CurrencyDTO
+
+
+def make_currency(currency_id: int, code: str) -> CurrencyDTO:
+    return CurrencyDTO.model_construct(currency_id=currency_id, code=code, sign="¤", name=code)
+
+
+def make_graph(rates: list[tuple[str, str, str]], max_hops: int = 3, pivots: tuple[str, ...] = ("USD",)) -> RateGraph:
+    graph = RateGraph(max_hops=max_hops, ttl=60, pivots=list(pivots))
+    currencies = {}
+    for base_code, target_code, rate in rates:
+        for code in (base_code, target_code):
+            currencies.setdefault(code, make_currency(len(currencies), code))
+        graph.add_rate(currencies[base_code], currencies[target_code], Decimal(rate))
+    return graph
+
+
+def graph_path(rates, max_hops: int) -> tuple[str, ...] | None:
+    path = make_graph(rates, max_hops=max_hops).find_path("AUD", "JPY")
+    return None if path is None else path.codes
+
+
+def test_direct_and_reverse_rates():
+    graph = make_graph([("USD", "EUR", "0.9")])
+
+    direct = graph.find_path("USD", "EUR")
+    assert direct.kind == "direct" and direct.codes == ("USD", "EUR") and float(direct.rate) == 0.9
+    reverse = graph.find_path("EUR", "USD")
+    assert reverse.kind == "reverse" and reverse.codes == ("EUR", "USD")
+    assert reverse.rate.chained(direct.rate).to_micros() == 1_000_000
+
+
+def test_own_rate_of_reverse_pair_wins_over_inverted_rate():
+    graph = make_graph([("USD", "EUR", "0.9"), ("EUR", "USD", "1.2")])
+
+    path = graph.find_path("EUR", "USD")
+    assert path.kind == "direct" and float(path.rate) == 1.2
+
+
+def test_cross_rate_through_pivot():
+    graph = make_graph([("USD", "EUR", "0.9"), ("USD", "RUB", "90")])
+
+    path = graph.find_path("EUR", "RUB")
+    assert path.kind == "cross" and path.codes == ("EUR", "USD", "RUB")
+    assert float(path.rate) == 100.0
+    assert path.base_currency.code == "EUR" and path.target_currency.code == "RUB"
+
+
+def test_breadth_first_search_finds_shortest_chain_without_pivots():
+    graph = make_graph([("AUD", "CAD", "0.9"), ("CAD", "CHF", "0.6"), ("CHF", "JPY", "160"), ("AUD", "NZD", "1.1")])
+
+    path = graph.find_path("AUD", "JPY")
+    assert path.kind == "cross" and path.codes == ("AUD", "CAD", "CHF", "JPY")
+    assert float(path.rate) == 86.4
+    assert graph.find_path("NZD", "CHF").codes == ("NZD", "AUD", "CAD", "CHF")
+
+
+def test_max_hops_limits_chain_length():
+    rates = [("AUD", "CAD", "2"), ("CAD", "CHF", "2"), ("CHF", "JPY", "2")]
+
+    assert graph_path(rates, max_hops=3) == ("AUD", "CAD", "CHF", "JPY")
+    assert graph_path(rates, max_hops=2) is None
+    # кросс-курс через опорную валюту - тоже два обмена
+    assert make_graph([("USD", "EUR", "0.9"), ("USD", "RUB", "90")], max_hops=1).find_path("EUR", "RUB") is None
+
+
+def test_same_and_unknown_currencies():
+    graph = make_graph([("USD", "EUR", "0.9")])
+
+    same = graph.find_path("USD", "USD")
+    assert same.codes == ("USD",) and same.kind == "direct" and float(same.rate) == 1.0
+    assert graph.find_path("USD", "XXX") is None
+
+
+def test_removed_rate_and_currency_are_not_used():
+    graph = make_graph([("USD", "EUR", "0.9"), ("USD", "RUB", "90"), ("EUR", "RUB", "100")])
+
+    graph.remove_rate("EUR", "RUB")
+    assert graph.find_path("EUR", "RUB").codes == ("EUR", "USD", "RUB")
+    graph.remove_currency("USD")
+    assert graph.find_path("EUR", "RUB") is None
+
+
+def test_pivots_are_tried_in_priority_order():
+    rates = [("USD", "EUR", "0.9"), ("USD", "GBP", "0.8"), ("RUB", "EUR", "0.01"), ("RUB", "GBP", "0.0085")]
+
+    assert make_graph(rates, pivots=("RUB", "USD")).find_path("EUR", "GBP").codes == ("EUR", "RUB", "GBP")
+    assert make_graph(rates, pivots=("USD", "RUB")).find_path("EUR", "GBP").codes == ("EUR", "USD", "GBP")
+
+
+def test_longer_paths_and_matrix_trees_prefer_pivots():
+    # до JPY два пути по три обмена: через AUD -> USD и через CAD -> RUB
+    rates = [
+        ("EUR", "AUD", "1.6"), ("AUD", "USD", "0.65"), ("USD", "JPY", "150"),
+        ("EUR", "CAD", "1.5"), ("CAD", "RUB", "66"), ("RUB", "JPY", "1.6"),
+    ]
+
+    for pivots, expected in (
+        (("RUB", "USD"), ("EUR", "CAD", "RUB", "JPY")),
+        (("USD", "RUB"), ("EUR", "AUD", "USD", "JPY")),
+    ):
+        graph = make_graph(rates, pivots=pivots)
+        assert graph.find_path("EUR", "JPY").codes == expected
+        # дерево кратчайших путей для матрицы выбирает тот же путь
+        previous = graph.shortest_path_tree("EUR")
+        assert (previous["JPY"], previous[previous["JPY"]]) == expected[2:0:-1]
+
+
+def test_pivot_is_not_used_as_its_own_target_and_fewer_reverse_rates_win():
+    graph = make_graph([("EUR", "USD", "1.1"), ("RUB", "EUR", "0.01"), ("GBP", "RUB", "115")], pivots=("USD", "EUR"))
+
+    assert graph.find_path("RUB", "USD").codes == ("RUB", "EUR", "USD")
+    # оба пути GBP -> EUR в два обмена через неопорные валюты равны по длине; выбирается путь без обратных курсов
+    graph = make_graph([("GBP", "AUD", "1.9"), ("AUD", "EUR", "0.6"), ("CAD", "GBP", "0.58"), ("CAD", "EUR", "0.68")],
+                       pivots=())
+    path = graph.find_path("GBP", "EUR")
+    assert path.codes == ("GBP", "AUD", "EUR") and path.kind == "cross"
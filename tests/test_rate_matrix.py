@@ -0,0 +1,54 @@
+import asyncio
+import importlib
+from decimal import Decimal
+
+from src.cache.rate_graph import RateGraph
+from src.cache.rate_matrix import RateMatrix
+from src.dto import CurrencyDTO, ErrorResponse
+
+
+# в src.service имя exchange_rate_service занято функцией-зависимостью
+exchange_rate_service = importlib.import_module("src.service.exchange_rate_service")
+
+
+def make_graph() -> RateGraph:
+    currencies = {
+        code: CurrencyDTO.model_construct(currency_id=currency_id, code=code, sign="¤", name=code)
+        for currency_id, code in enumerate(("USD", "EUR", "RUB", "GBP"))
+    }
+    graph = RateGraph(max_hops=3, ttl=60, pivots=["USD"])
+    graph.add_rate(currencies["USD"], currencies["EUR"], Decimal("0.9"))
+    graph.add_rate(currencies["USD"], currencies["RUB"], Decimal("90"))
+    graph._add_currency(currencies["GBP"])
+    return graph
+
+
+def test_matrix_rows_are_rounded_and_recomputed_after_rate_change():
+    graph = make_graph()
+    matrix = RateMatrix(graph=graph)
+
+    codes, rates = matrix.get()
+    assert codes == ["EUR", "GBP", "RUB", "USD"]
+    assert rates[0] == [1.0, None, 100.0, 1.111111]
+    assert rates[1] == [None, 1.0, None, None]
+    assert matrix.get(codes=["USD", "EUR", "XXX"]) == (["USD", "EUR"], [[1.0, 0.9], [1.111111, 1.0]])
+
+    graph.update_rate("USD", "RUB", Decimal("99"))
+    assert matrix.get(codes=["EUR", "RUB"])[1] == [[1.0, 110.0], [0.009091, 1.0]]
+
+
+def test_matrix_is_limited_by_number_of_codes(monkeypatch):
+    graph = make_graph()
+    monkeypatch.setattr(exchange_rate_service, "rate_graph", graph)
+    monkeypatch.setattr(exchange_rate_service, "rate_matrix", RateMatrix(graph=graph))
+    monkeypatch.setattr(exchange_rate_service.settings, "exchange_matrix_max_codes", 3)
+    service = exchange_rate_service.ExchangeRateService
+    # граф уже построен, поэтому DAO не нужен
+    graph._loaded_at = float("inf")
+
+    def get(codes):
+        return asyncio.run(service.get_cross_rate_matrix(codes=codes, dao_exchange_obj=None))
+
+    response = get(None)
+    assert isinstance(response, ErrorResponse) and response.code == 400
+    assert get(["USD", "EUR", "USD", "RUB"])["codes"] == ["USD", "EUR", "RUB"]
@@ -0,0 +1,54 @@
+from src.cache.rendered_pages import RenderedPage, RenderedPageCache
+
+
+def make_page(etag: str | None, body: bytes = b"[]") -> RenderedPage:
+    return RenderedPage(etag=etag, body=body, page_size=0, last_id=None)
+
+
+def test_pages_are_kept_per_data_version():
+    cache = RenderedPageCache(max_size=10, max_age=60)
+
+    assert cache.get(key="page", etag='"1"') is None
+    page = make_page('"1"')
+    cache.put(key="page", page=page)
+    assert cache.get(key="page", etag='"1"') is page
+    assert cache.get(key="page", etag='"2"') is None
+    # страница, построенная по старой версии, после смены версии не сохраняется
+    cache.put(key="page", page=page)
+    assert cache.get(key="page", etag='"2"') is None
+
+
+def test_pages_without_etag_are_not_cached():
+    cache = RenderedPageCache(max_size=10, max_age=60)
+
+    cache.put(key="page", page=make_page(None))
+    assert cache.get(key="page", etag=None) is None
+    assert cache.stats()["size"] == 0
+
+
+def test_pages_expire_after_max_age(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("time.monotonic", lambda: now[0])
+    cache = RenderedPageCache(max_size=10, max_age=60)
+    page = make_page('"1"')
+    cache.get(key="page", etag='"1"')
+    cache.put(key="page", page=page)
+
+    now[0] += 59
+    assert cache.get(key="page", etag='"1"') is page
+    now[0] += 2
+    assert cache.get(key="page", etag='"1"') is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_lru_eviction_and_gzip_body():
+    cache = RenderedPageCache(max_size=2, max_age=60)
+    cache.get(key="a", etag='"1"')
+    for key in ("a", "b", "c"):
+        cache.put(key=key, page=make_page('"1"', body=b"x" * 2000))
+
+    assert cache.get(key="a", etag='"1"') is None
+    page = cache.get(key="c", etag='"1"')
+    assert cache.stats()["evictions"] == 1
+    assert page.gzip_body(min_size=1024, compress_level=6) is page.gzip_body(min_size=1024, compress_level=6)
+    assert page.gzip_body(min_size=4096, compress_level=6) is None
@@ -0,0 +1,171 @@
+import asyncio
+import os
+from decimal import Decimal
+from multiprocessing.shared_memory import SharedMemory
+
+import pytest
+
+from src.cache.currency_registry import CurrencyRegistry
+from src.cache.quote_cache import QuoteCache
+from src.cache.rate_graph import RateGraph
+from src.cache.shared_rate_table import SharedRateTable, fcntl
+from src.dto import CurrencyDTO
+
+
+pytestmark = pytest.mark.skipif(fcntl is None, reason="общая таблица использует fcntl")
+
+
+@pytest.fixture
+def table():
+    shared_table = SharedRateTable(name=f"currency_exchange_test_{os.getpid()}", max_currencies=3, max_rates=100)
+    yield shared_table
+    if shared_table._shm is not None:
+        shared_table._shm.close()
+        SharedMemory(name=shared_table.name).unlink()
+
+
+def make_currency(currency_id: int, code: str) -> CurrencyDTO:
+    return CurrencyDTO.model_construct(currency_id=currency_id, code=code, sign="¤", name=code)
+
+
+def read_rates(table: SharedRateTable) -> dict:
+    return {(base_id, target_id): rate for base_id, target_id, rate in table.read().rates}
+
+
+def test_changes_before_load_are_ignored(table):
+    table.put_rate(1, 2, Decimal("0.9"))
+    table.put_currency(make_currency(1, "USD"))
+
+    assert table.read() is None
+
+
+def test_put_and_remove_rate_patch_single_records(table):
+    table.publish_rates([(1, 2, Decimal("0.9")), (1, 3, Decimal("90")), (2, 3, Decimal("100"))])
+
+    table.put_rate(1, 3, Decimal("91.5"))
+    table.put_rate(3, 1, Decimal("0.011"))
+    table.remove_rate(1, 2)
+    assert read_rates(table) == {(1, 3): Decimal("91.5"), (2, 3): Decimal("100"), (3, 1): Decimal("0.011")}
+
+    version = table.version()
+    table.remove_rate(1, 2)
+    assert table.version() == version
+
+
+def test_rate_key_is_matched_only_at_record_start(table):
+    # id целевой валюты первой записи и курс совпадают с началом ключа (3, 1) второй записи
+    table.publish_rates([(1, 3, Decimal("0.0001")), (2, 1, Decimal("1"))])
+
+    table.remove_rate(3, 1)
+    assert len(read_rates(table)) == 2
+
+
+def test_currency_section_overflow_clears_section(table):
+    table.publish_currencies([make_currency(1, "USD"), make_currency(2, "EUR")])
+
+    table.put_currency(make_currency(2, "EUR2"))
+    table.put_currency(make_currency(3, "RUB"))
+    snapshot = table.read()
+    assert [(currency.currency_id, currency.code) for currency in snapshot.currencies] == [
+        (1, "USD"), (2, "EUR2"), (3, "RUB")
+    ]
+
+    table.put_currency(make_currency(4, "AUD"))
+    snapshot = table.read()
+    assert snapshot.currencies == [] and snapshot.currencies_loaded_at == 0.0
+
+
+def test_changes_since_returns_patched_records(table):
+    table.publish_currencies([make_currency(1, "USD"), make_currency(2, "EUR")])
+    table.publish_rates([(1, 2, Decimal("0.9"))])
+    version = table.version()
+
+    table.put_rate(1, 2, Decimal("0.95"))
+    table.put_currency(make_currency(3, "RUB"))
+    table.put_rate(3, 1, Decimal("0.011"))
+    table.remove_rate(1, 2)
+    table.remove_currency(2)
+
+    changes = table.changes_since(version)
+    assert [change.kind for change in changes] == ["rate", "currency", "rate", "rate_removed", "currency_removed"]
+    assert [change.version for change in changes] == list(range(version + 2, table.version() + 2, 2))
+    assert (changes[0].base_currency_id, changes[0].target_currency_id, changes[0].rate) == (1, 2, Decimal("0.95"))
+    assert changes[1].currency.code == "RUB" and changes[1].currency_id == 3
+    assert (changes[3].base_currency_id, changes[3].target_currency_id) == (1, 2)
+    assert changes[4].currency_id == 2
+    assert table.changes_since(table.version()) == []
+
+
+def test_changes_since_requires_full_read_after_reset_or_overflow(table):
+    table.publish_rates([(1, 2, Decimal("0.9"))])
+    version = table.version()
+    table.put_rate(1, 2, Decimal("0.95"))
+    assert len(table.changes_since(version)) == 1
+
+    table.publish_rates([(1, 2, Decimal("1"))])
+    assert table.changes_since(version) is None
+    assert table.changes_since(0) is None
+
+    version = table.version()
+    for _ in range(table.log_size + 1):
+        table.put_rate(1, 2, Decimal("1"))
+    # журнал перезаписан по кругу - изменения после version в нём уже не все
+    assert table.changes_since(version) is None
+    assert len(table.changes_since(table.version() - 2 * table.log_size)) == table.log_size
+
+
+def test_graph_applies_changes_of_other_workers_as_deltas(table):
+    table.publish_currencies([make_currency(1, "USD"), make_currency(2, "EUR"), make_currency(3, "RUB")])
+    table.publish_rates([(1, 2, Decimal("0.9")), (1, 3, Decimal("90"))])
+    graph = RateGraph(max_hops=3, ttl=60, pivots=["USD"], shared_table=table)
+    quotes = QuoteCache(graph=graph, max_size=10, ttl=60)
+    # граф строится из общей таблицы, БД не нужна
+    asyncio.run(graph.ensure_loaded(dao_exchange_obj=None))
+    generation, topology_version = graph.generation, graph.topology_version
+    assert float(quotes.find_path("EUR", "RUB").rate) == 100.0
+
+    # другой воркер изменил курс: меняется только значение ребра, сбрасываются только записи через него
+    table.put_rate(1, 2, Decimal("0.8"))
+    asyncio.run(graph.ensure_loaded(dao_exchange_obj=None))
+    assert (graph.generation, graph.topology_version) == (generation, topology_version)
+    assert float(quotes.find_path("EUR", "RUB").rate) == 112.5
+    assert quotes.stats()["invalidations"] == 1
+
+    table.put_rate(2, 3, Decimal("100"))
+    asyncio.run(graph.ensure_loaded(dao_exchange_obj=None))
+    assert graph.topology_version == topology_version + 1 and graph.generation == generation
+    assert quotes.find_path("EUR", "RUB").kind == "direct"
+
+    # своё изменение воркер уже применил - из журнала оно не меняет граф повторно
+    graph.update_rate("USD", "RUB", Decimal("91"))
+    table.put_rate(1, 3, Decimal("91"))
+    version = graph.version
+    asyncio.run(graph.ensure_loaded(dao_exchange_obj=None))
+    assert graph.version == version
+
+    table.remove_currency(2)
+    asyncio.run(graph.ensure_loaded(dao_exchange_obj=None))
+    assert graph.codes == ["RUB", "USD"] and graph.generation == generation
+    assert quotes.find_path("EUR", "RUB") is None
+
+    # перезагрузка раздела курсов из БД - граф строится заново
+    table.publish_rates([(1, 3, Decimal("92"))])
+    asyncio.run(graph.ensure_loaded(dao_exchange_obj=None))
+    assert graph.generation == generation + 1
+
+
+def test_registry_applies_currency_changes_as_deltas(table):
+    table.publish_currencies([make_currency(1, "USD"), make_currency(2, "EUR")])
+    registry = CurrencyRegistry(ttl=60, shared_table=table)
+    asyncio.run(registry.ensure_loaded(dao_currency_obj=None))
+    usd = registry.get_by_code("USD")
+
+    table.put_currency(make_currency(3, "RUB"))
+    table.remove_currency(2)
+    table.put_rate(1, 3, Decimal("90"))
+    asyncio.run(registry.ensure_loaded(dao_currency_obj=None))
+
+    assert [currency.code for currency in registry.all()] == ["USD", "RUB"]
+    # справочник не перестроен: остальные валюты - те же объекты
+    assert registry.get_by_code("USD") is usd
+    assert not registry.is_stale